@@ -0,0 +1,290 @@
+# benchmarks/dataset.py
+"""
+Synthetic dataset for the API benchmarks (python manage.py bench_seed).
+
+Generates 'bench-user-N' users (all with the password BENCH_PASSWORD, so the
+load runner can log in as any of them), their items, owner blocks, lending
+requests and messages, at one of the SCALES below. Rows are written in
+batches with bulk_create() or raw INSERTs, and the rows the signal handlers
+would have derived from them (search index, participant rows,
+conversations, inbox counters) are written alongside, so the API sees a
+consistent database. Item calendars are rebuilt on first read, as usual.
+
+The same seed always produces the same data, so runs of different commits
+against freshly seeded databases are comparable.
+"""
+import random
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from items import search
+from items.management.commands.bench_item_search import synthetic_item
+from items.models import Availability, Item
+from lending.models import LendingParticipant, LendingRequest
+from messaging.models import Conversation, ConversationParticipant, InboxCounter, Message, MessageParticipant
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench-user-'
+BENCH_PASSWORD = 'bench-pass-2026'
+
+Scale = namedtuple('Scale', ['users', 'items', 'availabilities', 'lending_requests', 'messages'])
+
+# Named after the size of the largest table (messages)
+SCALES = {
+    '10k': Scale(users=500, items=2_000, availabilities=1_000, lending_requests=2_000, messages=10_000),
+    '1m': Scale(users=20_000, items=100_000, availabilities=50_000, lending_requests=100_000, messages=1_000_000),
+    '10m': Scale(users=100_000, items=1_000_000, availabilities=500_000, lending_requests=1_000_000, messages=10_000_000),
+}
+
+# Share of generated lending requests per status
+STATUS_WEIGHTS = {'PENDING': 30, 'APPROVED': 20, 'DENIED': 20, 'COMPLETED': 30}
+MESSAGE_TEXTS = [
+    "Is it still available?", "Can I pick it up tomorrow morning?", "Sure, see you then.",
+    "Thanks, returning it on Sunday.", "Does it come with the charger?", "Yes, it's in the box.",
+]
+# Messages per conversation, on average
+MESSAGES_PER_CONVERSATION = 25
+HISTORY = timedelta(days=365)
+
+
+def bench_usernames(count):
+    return [f"{USERNAME_PREFIX}{i}" for i in range(count)]
+
+
+def existing_dataset():
+    """Number of bench users already in the database."""
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+
+
+class DatasetGenerator:
+    """Writes one Scale of synthetic data; see the module docstring."""
+
+    def __init__(self, scale, seed=42, batch_size=10_000, log=print):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        self.now = timezone.now()
+
+    def generate(self):
+        started = time.perf_counter()
+        self.user_ids = self.timed("users", self.create_users)
+        self.item_ids, self.item_owners = self.timed("items", self.create_items)
+        self.timed("availabilities", self.create_availabilities)
+        self.timed("lending requests", self.create_lending_requests)
+        self.timed("messages", self.create_messages)
+        with connection.cursor() as cursor:
+            # Fresh statistics, so the planner sees the tables at their real size
+            cursor.execute('ANALYZE')
+        self.log(f"Dataset generated in {time.perf_counter() - started:.1f}s")
+
+    def timed(self, label, step):
+        started = time.perf_counter()
+        result = step()
+        self.log(f"  {label:<18} {time.perf_counter() - started:8.1f}s")
+        return result
+
+    def batches(self, count):
+        """(start, size) pairs covering range(count) in batch_size steps."""
+        for start in range(0, count, self.batch_size):
+            yield start, min(self.batch_size, count - start)
+
+    def timestamp(self, index, count):
+        """Spread `count` rows evenly over the last year, oldest first."""
+        return self.now - HISTORY + HISTORY * (index / max(count, 1))
+
+    def insert_rows(self, cursor, model, columns, rows):
+        """
+        Raw INSERT of `rows` into model's table; returns their ids, in order.
+        The ids are read back, not assumed to follow max(pk): a PostgreSQL
+        sequence skips the values of rolled back inserts, and hands out
+        cached ranges.
+        """
+        with transaction.atomic():
+            high_water = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            cursor.executemany(
+                f"INSERT INTO {model._meta.db_table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})",
+                rows,
+            )
+            # Sequence values only grow, and the seeder is the only writer
+            ids = list(model.objects.filter(pk__gt=high_water).order_by('pk').values_list('pk', flat=True))
+        if len(ids) != len(rows):
+            raise RuntimeError(f"Inserted {len(rows)} {model._meta.verbose_name_plural} but found {len(ids)} new rows.")
+        return ids
+
+    # ---------------------------------------------------------
+    # Tables
+    # ---------------------------------------------------------
+
+    def create_users(self):
+        # Hashed once: hashing a password per user would dominate the run
+        password = make_password(BENCH_PASSWORD)
+        for start, size in self.batches(self.scale.users):
+            User.objects.bulk_create([
+                User(username=username, password=password, location=self.rng.choice(['Westlands', 'Kilimani', 'Karen']))
+                for username in bench_usernames(start + size)[start:]
+            ])
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').values_list('pk', flat=True))
+
+    def create_items(self):
+        item_ids, owners = [], []
+        for start, size in self.batches(self.scale.items):
+            batch = [synthetic_item(self.rng, None) for _ in range(size)]
+            for item in batch:
+                item.owner_id = self.rng.choice(self.user_ids)
+            with transaction.atomic():
+                batch = Item.objects.bulk_create(batch)
+                # bulk_create skips the post_save signal, so index explicitly
+                search.index_items(batch)
+            item_ids += [item.pk for item in batch]
+            owners += [item.owner_id for item in batch]
+        return item_ids, owners
+
+    def create_availabilities(self):
+        today = self.now.date()
+        for start, size in self.batches(self.scale.availabilities):
+            blocks = []
+            for _ in range(size):
+                # Owner blocks well past the dates the lending requests use
+                begins = today + timedelta(days=self.rng.randint(400, 700))
+                blocks.append(Availability(
+                    item_id=self.rng.choice(self.item_ids),
+                    unavailable_from=begins,
+                    unavailable_to=begins + timedelta(days=self.rng.randint(1, 14)),
+                ))
+            Availability.objects.bulk_create(blocks)
+
+    def create_lending_requests(self):
+        """Raw INSERTs: bulk_create would stamp every row with the same auto_now(_add) time."""
+        table = LendingRequest._meta.db_table
+        statuses, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+        today = self.now.date()
+        # Each item's requests take consecutive weeks, so approved ones never overlap
+        weeks_used = {}
+        count = self.scale.lending_requests
+        first_id = None
+        with connection.cursor() as cursor:
+            for start, size in self.batches(count):
+                rows = []
+                for index in range(start, start + size):
+                    position = self.rng.randrange(len(self.item_ids))
+                    item_id, owner_id = self.item_ids[position], self.item_owners[position]
+                    borrower_id = self.rng.choice(self.user_ids)
+                    while borrower_id == owner_id:
+                        borrower_id = self.rng.choice(self.user_ids)
+                    status = self.rng.choices(statuses, weights)[0]
+                    created = self.timestamp(index, count)
+                    if status == 'COMPLETED':
+                        requested_from = created.date() + timedelta(days=self.rng.randint(1, 14))
+                    else:
+                        week = weeks_used.get(item_id, 0)
+                        weeks_used[item_id] = week + 1
+                        requested_from = today + timedelta(days=7 * week + 1)
+                    rows.append((
+                        item_id, borrower_id, requested_from, requested_from + timedelta(days=self.rng.randint(1, 6)),
+                        status,
+                        created + timedelta(hours=2) if status in ('APPROVED', 'COMPLETED') else None,
+                        created + timedelta(days=10) if status == 'COMPLETED' else None,
+                        created, created,
+                    ))
+                ids = self.insert_rows(cursor, LendingRequest, [
+                    'item_id', 'borrower_id', 'requested_from', 'requested_to', 'status',
+                    'approved_at', 'returned_at', 'created_at', 'updated_at',
+                ], rows)
+                first_id = first_id or ids[0]
+            if first_id is not None:
+                # The participant rows the post_save handler would have written
+                items, participants = Item._meta.db_table, LendingParticipant._meta.db_table
+                cursor.execute(
+                    f"INSERT INTO {participants} (lending_request_id, user_id, created_at, updated_at) "
+                    f"SELECT id, borrower_id, created_at, updated_at FROM {table} WHERE id >= %s "
+                    f"UNION ALL SELECT r.id, i.owner_id, r.created_at, r.updated_at FROM {table} r "
+                    f"JOIN {items} i ON i.id = r.item_id WHERE r.id >= %s AND i.owner_id <> r.borrower_id",
+                    [first_id, first_id],
+                )
+
+    def create_messages(self):
+        """
+        Messages between random pairs of users, each pair in its general
+        conversation, with the participant rows and inbox counters the
+        signal handlers would have written.
+        """
+        count = self.scale.messages
+        if not count:
+            return
+        pairs = set()
+        for _ in range(max(count // MESSAGES_PER_CONVERSATION, 1)):
+            user_a, user_b = sorted(self.rng.sample(self.user_ids, 2))
+            pairs.add((user_a, user_b))
+        pairs = sorted(pairs)
+        conversations = []
+        for start, size in self.batches(len(pairs)):
+            conversations += Conversation.objects.bulk_create([
+                Conversation(user_a_id=user_a, user_b_id=user_b, last_message_at=self.now)
+                for user_a, user_b in pairs[start:start + size]
+            ])
+        conversation_ids = [conversation.pk for conversation in conversations]
+
+        table = Message._meta.db_table
+        # (user, partner) -> [unread count, last message id, last message time]
+        counters = {}
+        last_message_at = {}
+        first_id = None
+        with connection.cursor() as cursor:
+            for start, size in self.batches(count):
+                drawn = []
+                for index in range(start, start + size):
+                    position = self.rng.randrange(len(pairs))
+                    sender, recipient = pairs[position]
+                    if self.rng.random() < 0.5:
+                        sender, recipient = recipient, sender
+                    # Older messages have mostly been read
+                    is_read = self.rng.random() < 0.3 + 0.65 * (1 - index / count)
+                    drawn.append((sender, recipient, conversation_ids[position], self.timestamp(index, count), is_read))
+                ids = self.insert_rows(
+                    cursor, Message,
+                    ['sender_id', 'recipient_id', 'conversation_id', 'content', 'time_stamp', 'is_read', 'updated_at'],
+                    [(s, r, c, self.rng.choice(MESSAGE_TEXTS), t, read, t) for s, r, c, t, read in drawn],
+                )
+                first_id = first_id or ids[0]
+                for message_id, (sender, recipient, conversation_id, sent_at, is_read) in zip(ids, drawn):
+                    last_message_at[conversation_id] = sent_at
+                    for user, partner in ((sender, recipient), (recipient, sender)):
+                        counter = counters.setdefault((user, partner), [0, None, None])
+                        counter[1:] = [message_id, sent_at]
+                        if user == recipient and not is_read:
+                            counter[0] += 1
+
+            # The participant rows the post_save handler would have written
+            participants = MessageParticipant._meta.db_table
+            cursor.execute(
+                f"INSERT INTO {participants} (message_id, user_id, time_stamp, updated_at) "
+                f"SELECT id, sender_id, time_stamp, updated_at FROM {table} WHERE id >= %s "
+                f"UNION ALL SELECT id, recipient_id, time_stamp, updated_at FROM {table} WHERE id >= %s",
+                [first_id, first_id],
+            )
+
+        for conversation in conversations:
+            conversation.last_message_at = last_message_at.get(conversation.pk, conversation.created_at)
+        Conversation.objects.bulk_update(conversations, ['last_message_at'], batch_size=self.batch_size)
+        # The participant rows the post_save handler would have written
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(conversation=conversation, user_id=user_id, last_message_at=conversation.last_message_at)
+            for conversation in conversations
+            for user_id in (conversation.user_a_id, conversation.user_b_id)
+        ], batch_size=self.batch_size)
+        InboxCounter.objects.bulk_create([
+            InboxCounter(
+                user_id=user, partner_id=partner, unread_count=unread,
+                last_message_id=last_id, last_message_at=last_at,
+            )
+            for (user, partner), (unread, last_id, last_at) in counters.items()
+        ], batch_size=self.batch_size)
@@ -0,0 +1,294 @@
+# benchmarks/load.py
+"""
+Scripted load against a running server (python manage.py bench_api).
+
+Worker threads each keep one HTTP connection open and repeatedly pick a
+scenario (by the weights in the mix) and run its requests as a random bench
+user:
+- browse:   list items, the next page, an item, its calendar, a search
+- loan:     request a loan of a random item
+- approve:  the item owner approves a loan requested earlier in the run
+- messages: poll the inbox summary, the message list and /api/sync/, and
+            now and then send a reply
+
+Every request is recorded under its route template ("GET /api/items/{id}/"),
+and summarize() reduces the samples to throughput and latency percentiles
+per endpoint: plain JSON, so results from two commits can be diffed with
+bench_compare. Only the standard library is used, so the runner can also be
+pointed at a server on another machine.
+"""
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import date, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from items.management.commands.bench_item_search import NOUNS
+from .dataset import BENCH_PASSWORD, MESSAGE_TEXTS
+
+DEFAULT_MIX = {'browse': 60, 'loan': 10, 'approve': 10, 'messages': 20}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# -------------------------------------------------------------
+# Recording
+# -------------------------------------------------------------
+
+class Recorder:
+    """Thread-safe latency samples and status counts per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)   # endpoint -> [ms]
+        self.statuses = defaultdict(Counter)  # endpoint -> status -> count
+
+    def record(self, endpoint, status, elapsed):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed * 1000)
+            self.statuses[endpoint][status] += 1
+
+
+def _summary(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if status == 'error' or int(status) >= 500)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=lambda s: str(s[0]))},
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = round(percentile(latencies, p / 100), 2)
+    return summary
+
+
+def summarize(recorder, elapsed):
+    """{'total': {...}, 'endpoints': {endpoint: {...}}} for a finished run."""
+    endpoints = {
+        endpoint: _summary(latencies, recorder.statuses[endpoint], elapsed)
+        for endpoint, latencies in sorted(recorder.latencies.items())
+    }
+    everything = [ms for latencies in recorder.latencies.values() for ms in latencies]
+    statuses = sum(recorder.statuses.values(), Counter())
+    return {
+        'total': _summary(everything, statuses, elapsed) if everything else {'requests': 0},
+        'endpoints': endpoints,
+    }
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Rows of (endpoint, metric, before, after, change %) between two results,
+    and the endpoints whose p95 latency got worse by more than `threshold` %.
+    """
+    rows, regressions = [], []
+    for endpoint, after in candidate['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if before is None:
+            continue
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = before.get(metric), after.get(metric)
+            change = round((new - old) / old * 100, 1) if old else None
+            rows.append((endpoint, metric, old, new, change))
+            if metric == 'p95_ms' and change is not None and change > threshold:
+                regressions.append(endpoint)
+    return rows, regressions
+
+
+# -------------------------------------------------------------
+# Client
+# -------------------------------------------------------------
+
+class Session:
+    """One worker's connection; records every request it makes."""
+
+    def __init__(self, base_url, recorder, tokens, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+        self.recorder = recorder
+        self.tokens = tokens
+
+    def request(self, method, path, endpoint, user=None, body=None, params=None):
+        """(status, decoded JSON or None). Logs in as `user` first if needed."""
+        status, data = self._send(method, path, endpoint, user, body, params)
+        if status == 401 and user is not None:
+            # Access token expired during a long run: log in again once
+            self.tokens.pop(user, None)
+            status, data = self._send(method, path, endpoint, user, body, params)
+        return status, data
+
+    def _send(self, method, path, endpoint, user, body, params):
+        headers = {'Accept': 'application/json'}
+        if user is not None:
+            headers['Authorization'] = f'Bearer {self.token_for(user)}'
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        url = self.prefix + path + (f'?{urlencode(params)}' if params else '')
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, url, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.recorder.record(endpoint, 'error', time.perf_counter() - started)
+            return None, None
+        self.recorder.record(endpoint, response.status, time.perf_counter() - started)
+        try:
+            return response.status, json.loads(content) if content else None
+        except ValueError:
+            return response.status, None
+
+    def token_for(self, user):
+        token = self.tokens.get(user)
+        if token is None:
+            status, data = self._send(
+                'POST', '/api/auth/token/', 'POST /api/auth/token/', None,
+                {'username': user, 'password': BENCH_PASSWORD}, None,
+            )
+            token = (data or {}).get('access', '')
+            if status == 200:
+                self.tokens[user] = token
+        return token
+
+
+# -------------------------------------------------------------
+# Scenarios
+# -------------------------------------------------------------
+
+def _results(data):
+    """The rows of a (paginated or plain) list response."""
+    if isinstance(data, dict):
+        return data.get('results') or []
+    return data or []
+
+
+def _next_path(data):
+    """Path and query of a paginated response's `next` link."""
+    if isinstance(data, dict) and data.get('next'):
+        parts = urlsplit(data['next'])
+        return parts.path, dict(parse_qsl(parts.query))
+    return None, None
+
+
+def browse(session, run, rng):
+    user = run.random_user(rng)
+    status, page = session.request('GET', '/api/items/', 'GET /api/items/', user)
+    path, params = _next_path(page)
+    if path:
+        session.request('GET', path, 'GET /api/items/?cursor=', user, params=params)
+    item_id = run.random_item(rng)
+    session.request('GET', f'/api/items/{item_id}/', 'GET /api/items/{id}/', user)
+    session.request('GET', f'/api/items/{item_id}/calendar/', 'GET /api/items/{id}/calendar/', user)
+    session.request(
+        'GET', '/api/items/search/', 'GET /api/items/search/', user,
+        params={'q': rng.choice(NOUNS)},
+    )
+
+
+def loan(session, run, rng):
+    user = run.random_user(rng)
+    # Far enough ahead to rarely collide with the generated requests
+    requested_from = date.today() + timedelta(days=rng.randint(120, 380))
+    status, data = session.request('POST', '/api/lending-requests/', 'POST /api/lending-requests/', user, body={
+        'item': run.random_item(rng),
+        'requested_from': requested_from.isoformat(),
+        'requested_to': (requested_from + timedelta(days=rng.randint(1, 5))).isoformat(),
+    })
+    if status == 201:
+        run.pending.append((data['id'], data['item_owner_username']))
+
+
+def approve(session, run, rng):
+    try:
+        lending_request_id, owner = run.pending.popleft()
+    except IndexError:
+        # Nothing requested yet in this run
+        return loan(session, run, rng)
+    session.request(
+        'POST', f'/api/lending-requests/{lending_request_id}/approve/', 'POST /api/lending-requests/{id}/approve/', owner,
+    )
+
+
+def messages(session, run, rng):
+    user = run.random_user(rng)
+    session.request('GET', '/api/messages/summary/', 'GET /api/messages/summary/', user)
+    status, page = session.request('GET', '/api/messages/', 'GET /api/messages/', user)
+    session.request('GET', '/api/sync/', 'GET /api/sync/', user)
+    rows = _results(page)
+    if rows and rng.random() < 0.25:
+        latest = rows[0]
+        partner = latest['sender'] if latest['recipient_username'] == user else latest['recipient']
+        session.request('POST', '/api/messages/', 'POST /api/messages/', user, body={
+            'recipient': partner, 'content': rng.choice(MESSAGE_TEXTS),
+        })
+
+
+SCENARIOS = {'browse': browse, 'loan': loan, 'approve': approve, 'messages': messages}
+
+
+# -------------------------------------------------------------
+# Running
+# -------------------------------------------------------------
+
+class LoadRun:
+    """
+    State shared by the workers of one run: who and what to pick from, the
+    access tokens, and the loans waiting for approval.
+    """
+
+    def __init__(self, base_url, usernames, item_ids, mix=None, seed=42):
+        self.base_url = base_url
+        self.usernames = usernames
+        self.item_ids = item_ids
+        self.mix = mix or DEFAULT_MIX
+        self.seed = seed
+        self.recorder = Recorder()
+        self.tokens = {}
+        self.pending = deque()
+
+    def random_user(self, rng):
+        return rng.choice(self.usernames)
+
+    def random_item(self, rng):
+        return rng.choice(self.item_ids)
+
+    def worker(self, number, deadline, iterations):
+        rng = random.Random(f'{self.seed}-{number}')
+        session = Session(self.base_url, self.recorder, self.tokens)
+        names, weights = list(self.mix), list(self.mix.values())
+        done = 0
+        while time.monotonic() < deadline and (iterations is None or done < iterations):
+            SCENARIOS[rng.choices(names, weights)[0]](session, self, rng)
+            done += 1
+        session.connection.close()
+
+    def run(self, concurrency=8, duration=60, iterations=None):
+        """Run the workers for `duration` seconds (or `iterations` scenarios each) and summarize."""
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self.worker, args=(number, deadline, iterations), daemon=True)
+            for number in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return summarize(self.recorder, time.perf_counter() - started)
@@ -0,0 +1,113 @@
+"""
+Run the scripted API load (benchmarks/load.py) against a running server.
+
+Usage:
+    python manage.py bench_seed --scale 10k
+    python manage.py runserver --noreload          # or gunicorn / uvicorn, in another shell
+    python manage.py bench_api --duration 60 --concurrency 8 --output results.json
+    python manage.py bench_api --mix browse=80,messages=20 --iterations 50
+
+Picks its users and items from the benchmark dataset in the database the
+server uses (same settings), prints throughput and latency percentiles per
+endpoint and, with --output, writes them as JSON together with the commit,
+dataset size and options of the run. Compare two such files with
+bench_compare.
+"""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.dataset import USERNAME_PREFIX
+from benchmarks.load import DEFAULT_MIX, PERCENTILES, SCENARIOS, LoadRun
+from items.models import Item
+from lending.models import LendingRequest
+from messaging.models import Message
+
+User = get_user_model()
+
+
+def parse_mix(value):
+    """'browse=60,loan=10' -> {'browse': 60, 'loan': 10}."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS or not weight.strip().isdigit():
+            raise CommandError(f"Invalid --mix entry {part!r}; scenarios are {', '.join(SCENARIOS)}.")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Drive scripted load against a running server and report per-endpoint throughput and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--duration', type=float, default=60, help="Seconds to run (default 60).")
+        parser.add_argument('--iterations', type=int, help="Stop each worker after this many scenarios.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads (default 8).")
+        parser.add_argument(
+            '--mix', type=parse_mix, default=DEFAULT_MIX,
+            help="Scenario weights, e.g. browse=60,loan=10,approve=10,messages=20.",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        usernames = list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True))
+        if len(usernames) < 2:
+            raise CommandError("No benchmark dataset in this database; run python manage.py bench_seed first.")
+        item_ids = list(Item.objects.filter(owner__username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+        dataset = {
+            'users': len(usernames),
+            'items': len(item_ids),
+            'lending_requests': LendingRequest.objects.count(),
+            'messages': Message.objects.count(),
+        }
+
+        started_at = datetime.now(timezone.utc)
+        self.stdout.write(
+            f"Running {options['concurrency']} workers against {options['base_url']} "
+            f"({', '.join(f'{name}={weight}' for name, weight in options['mix'].items())})..."
+        )
+        run = LoadRun(options['base_url'], usernames, item_ids, mix=options['mix'], seed=options['seed'])
+        results = run.run(options['concurrency'], options['duration'], options['iterations'])
+        results['meta'] = {
+            'commit': git_commit(),
+            'started_at': started_at.isoformat(),
+            'base_url': options['base_url'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'iterations': options['iterations'],
+            'mix': options['mix'],
+            'seed': options['seed'],
+            'dataset': dataset,
+            'python': platform.python_version(),
+        }
+
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def print_table(self, results):
+        columns = ['requests', 'errors', 'throughput_rps', 'mean_ms', *[f'p{p}_ms' for p in PERCENTILES], 'max_ms']
+        self.stdout.write(f"{'endpoint':<36}" + ''.join(f"{column:>15}" for column in columns))
+        rows = [*results['endpoints'].items(), ('total', results['total'])]
+        for endpoint, summary in rows:
+            if not summary.get('requests'):
+                continue
+            self.stdout.write(f"{endpoint:<36}" + ''.join(f"{summary[column]!s:>15}" for column in columns))
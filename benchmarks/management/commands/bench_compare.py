@@ -0,0 +1,50 @@
+"""
+Compare two bench_api result files, e.g. from the base branch and a change.
+
+Usage:
+    python manage.py bench_compare before.json after.json
+    python manage.py bench_compare before.json after.json --threshold 15
+
+Prints throughput and p50/p95/p99 latency per endpoint side by side with the
+change in percent, and exits with an error if any endpoint's p95 latency got
+worse by more than --threshold percent (default 10), so it can gate CI.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.load import compare
+
+
+class Command(BaseCommand):
+    help = "Diff two bench_api JSON results and fail on p95 latency regressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('candidate')
+        parser.add_argument('--threshold', type=float, default=10.0, help="Allowed p95 slowdown in percent.")
+
+    def handle(self, *args, **options):
+        results = []
+        for path in (options['baseline'], options['candidate']):
+            try:
+                with open(path) as source:
+                    results.append(json.load(source))
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Can't read {path}: {error}")
+        baseline, candidate = results
+        for label, result in (("before", baseline), ("after", candidate)):
+            meta = result.get('meta', {})
+            self.stdout.write(f"{label:<7} commit {meta.get('commit')} dataset {meta.get('dataset')}")
+
+        rows, regressions = compare(baseline, candidate, options['threshold'])
+        self.stdout.write(f"{'endpoint':<36}{'metric':>16}{'before':>12}{'after':>12}{'change':>10}")
+        for endpoint, metric, old, new, change in rows:
+            change = '' if change is None else f"{change:+.1f}%"
+            self.stdout.write(f"{endpoint:<36}{metric:>16}{old!s:>12}{new!s:>12}{change:>10}")
+
+        if regressions:
+            raise CommandError(
+                f"p95 latency regressed by more than {options['threshold']}% on: {', '.join(regressions)}"
+            )
+        self.stdout.write(self.style.SUCCESS("No p95 regressions over the threshold."))
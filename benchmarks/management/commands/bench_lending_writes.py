@@ -0,0 +1,106 @@
+"""
+Benchmark concurrent lending request creation against the configured database.
+
+Usage:
+    python manage.py bench_seed --scale 10k
+    python manage.py bench_lending_writes                          # 16 threads x 50 requests
+    python manage.py bench_lending_writes --threads 32 --requests 100 --output postgres.json
+
+Each thread posts new lending requests through the full API stack (middleware,
+serializer validation, signal handlers, outbox and calendar writes) with the
+in-process test client, as random bench users for random bench items. This
+is the write path that used to fail with "database is locked" on SQLite, so
+the report counts 500s separately from 400s (date conflicts, which are
+expected now and then). Run it once per DATABASES configuration (see the
+DB_* settings) and compare the JSON files with bench_compare.
+"""
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from benchmarks.dataset import USERNAME_PREFIX
+from benchmarks.load import Recorder, summarize
+from items.models import Item
+
+User = get_user_model()
+
+ENDPOINT = 'POST /api/lending-requests/'
+
+
+class Command(BaseCommand):
+    help = "Create lending requests from many threads at once and report throughput, latency and failures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=50, help="Requests per thread.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX)[:1000])
+        item_ids = list(
+            Item.objects.filter(owner__username__startswith=USERNAME_PREFIX, is_available=True).values_list('pk', flat=True)
+        )
+        if not users or not item_ids:
+            raise CommandError("No benchmark dataset in this database; run python manage.py bench_seed first.")
+
+        recorder = Recorder()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker(number):
+            rng = random.Random(f"{options['seed']}-{number}")
+            client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            # A failed request is a 500 to report, not an exception to stop on
+            client.raise_request_exception = False
+            barrier.wait()
+            try:
+                for _ in range(options['requests']):
+                    client.force_authenticate(rng.choice(users))
+                    requested_from = date.today() + timedelta(days=rng.randint(30, 3000))
+                    started = time.perf_counter()
+                    response = client.post('/api/lending-requests/', {
+                        'item': rng.choice(item_ids),
+                        'requested_from': requested_from,
+                        'requested_to': requested_from + timedelta(days=rng.randint(1, 5)),
+                    }, format='json')
+                    recorder.record(ENDPOINT, response.status_code, time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        self.stdout.write(
+            f"{options['threads']} threads x {options['requests']} lending requests on "
+            f"{connection.vendor} ({settings.DATABASES['default']['NAME']})..."
+        )
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = summarize(recorder, time.perf_counter() - started)
+        results['meta'] = {
+            'vendor': connection.vendor,
+            'options': {key: value for key, value in settings.DATABASES['default'].get('OPTIONS', {}).items()},
+            'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE'),
+            'threads': options['threads'],
+            'requests': options['requests'],
+        }
+
+        summary = results['total']
+        self.stdout.write(
+            f"created={summary['statuses'].get('201', 0)} conflicts={summary['statuses'].get('400', 0)} "
+            f"failed={summary['errors']} throughput={summary['throughput_rps']}/s "
+            f"p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True, default=str)
+            self.stdout.write(f"Results written to {options['output']}")
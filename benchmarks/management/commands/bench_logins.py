@@ -0,0 +1,115 @@
+"""
+Benchmark concurrent logins against a running server, and what they do to
+the latency of everything else.
+
+Usage:
+    python manage.py bench_seed --scale 10k
+    python manage.py runserver --noreload          # or uvicorn nas_project.asgi:application, in another shell
+    python manage.py bench_logins --threads 32 --duration 30 --output logins.json
+
+--threads workers log in as random bench users over and over (POST
+/api/auth/token/, a full password hash each) while --probes workers browse
+items as users that are already logged in. The report has login throughput,
+how many logins were shed with a 503 (PASSWORD_HASHING_QUEUE), and the
+latency of GET /api/items/ under that load, which is what a burst of
+sign-ins used to ruin. Compare runs (other PASSWORD_HASHING_* settings,
+another server, another commit) with bench_compare.
+"""
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.dataset import BENCH_PASSWORD, USERNAME_PREFIX
+from benchmarks.load import Recorder, Session, summarize
+
+User = get_user_model()
+
+LOGIN = 'POST /api/auth/token/'
+PROBE = 'GET /api/items/'
+
+
+class Command(BaseCommand):
+    help = "Log in from many threads at once and report login throughput and the latency of other requests meanwhile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--threads', type=int, default=32, help="Login workers (default 32).")
+        parser.add_argument('--probes', type=int, default=2, help="Workers browsing items meanwhile (default 2).")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run (default 30).")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        usernames = list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True)[:1000])
+        if not usernames:
+            raise CommandError("No benchmark dataset in this database; run python manage.py bench_seed first.")
+
+        recorder = Recorder()
+        tokens = {}
+        # Probes log in before the clock starts, so they only time browsing
+        warmup = Session(options['base_url'], Recorder(), tokens)
+        for username in usernames[:options['probes']]:
+            if not warmup.token_for(username):
+                raise CommandError(f"Could not log in as {username} at {options['base_url']}.")
+        deadline = time.monotonic() + options['duration']
+
+        def log_in(number):
+            rng = random.Random(f"{options['seed']}-{number}")
+            session = Session(options['base_url'], recorder, tokens)
+            while time.monotonic() < deadline:
+                status, _ = session.request(
+                    'POST', '/api/auth/token/', LOGIN, body={'username': rng.choice(usernames), 'password': BENCH_PASSWORD},
+                )
+                if status == 503:
+                    # Shed by the server: back off a little, as a client honouring Retry-After would
+                    time.sleep(0.05)
+
+        def probe(number):
+            session = Session(options['base_url'], recorder, tokens)
+            while time.monotonic() < deadline:
+                session.request('GET', '/api/items/', PROBE, usernames[number])
+                time.sleep(0.05)
+
+        self.stdout.write(
+            f"{options['threads']} login workers and {options['probes']} probes against "
+            f"{options['base_url']} for {options['duration']}s..."
+        )
+        started = time.perf_counter()
+        threads = [threading.Thread(target=log_in, args=(number,)) for number in range(options['threads'])]
+        threads += [threading.Thread(target=probe, args=(number,)) for number in range(options['probes'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = summarize(recorder, time.perf_counter() - started)
+        results['meta'] = {
+            'base_url': options['base_url'],
+            'threads': options['threads'],
+            'probes': options['probes'],
+            'duration': options['duration'],
+            # As configured for this process; pass the same environment to the server
+            'password_hashing': {
+                'iterations': settings.PASSWORD_HASH_ITERATIONS,
+                'workers': settings.PASSWORD_HASHING_WORKERS,
+                'queue': settings.PASSWORD_HASHING_QUEUE,
+            },
+        }
+
+        for endpoint in (LOGIN, PROBE):
+            summary = results['endpoints'].get(endpoint)
+            if summary:
+                statuses = summary['statuses']
+                self.stdout.write(
+                    f"{endpoint:<24} ok={statuses.get('200', 0)} shed={statuses.get('503', 0)} "
+                    f"failed={summary['errors'] - statuses.get('503', 0)} throughput={summary['throughput_rps']}/s "
+                    f"p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,34 @@
+"""
+Fill the database with the synthetic benchmark dataset (benchmarks/dataset.py).
+
+Usage:
+    python manage.py bench_seed --scale 10k
+    python manage.py bench_seed --scale 1m --seed 7 --batch-size 20000
+
+Scales are named after their number of messages: 10k, 1m and 10m (100,000
+users, 1M items, 1M lending requests, 10M messages). All bench users share
+the password benchmarks.dataset.BENCH_PASSWORD. Run it against a fresh
+scratch database (python manage.py flush first to start over); the same
+--seed always generates the same data.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.dataset import SCALES, DatasetGenerator, existing_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate the synthetic benchmark dataset (users, items, availabilities, lending requests, messages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='10k', help="Dataset size (default 10k).")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Rows per INSERT batch.")
+
+    def handle(self, *args, **options):
+        if existing_dataset():
+            raise CommandError("This database already has a benchmark dataset; flush it or use a fresh one.")
+        scale = SCALES[options['scale']]
+        self.stdout.write(f"Generating the {options['scale']} dataset: " + ", ".join(
+            f"{count:,} {table.replace('_', ' ')}" for table, count in scale._asdict().items()
+        ))
+        DatasetGenerator(scale, seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write).generate()
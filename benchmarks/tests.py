@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
+from django.test import LiveServerTestCase, TestCase
+
+from items.models import Item
+from lending.models import LendingParticipant, LendingRequest
+from messaging.models import InboxCounter, Message, MessageParticipant
+from .dataset import BENCH_PASSWORD, USERNAME_PREFIX, DatasetGenerator, Scale
+from .load import LoadRun, Recorder, compare, summarize
+
+User = get_user_model()
+
+TINY = Scale(users=6, items=20, availabilities=5, lending_requests=30, messages=200)
+
+
+def generate(scale=TINY):
+    DatasetGenerator(scale, seed=1, batch_size=50, log=lambda line: None).generate()
+
+
+class DatasetGeneratorTests(TestCase):
+
+    def test_generates_a_consistent_dataset(self):
+        generate()
+
+        self.assertEqual(User.objects.filter(username__startswith=USERNAME_PREFIX).count(), 6)
+        self.assertTrue(User.objects.first().check_password(BENCH_PASSWORD))
+        self.assertEqual(Item.objects.count(), 20)
+        self.assertEqual(Message.objects.count(), 200)
+        # What the signal handlers would have written
+        self.assertEqual(MessageParticipant.objects.count(), 400)
+        self.assertEqual(LendingParticipant.objects.count(), 2 * LendingRequest.objects.count())
+        self.assertFalse(Message.objects.filter(conversation__isnull=True).exists())
+        unread = dict(
+            Message.objects.filter(is_read=False).values('recipient').annotate(n=Count('pk')).values_list('recipient', 'n')
+        )
+        counted = dict(InboxCounter.objects.values('user').annotate(n=Sum('unread_count')).values_list('user', 'n'))
+        self.assertEqual({user: n for user, n in counted.items() if n}, unread)
+        # Approved and pending requests of one item never overlap
+        for item_id in LendingRequest.objects.values_list('item', flat=True).distinct():
+            spans = sorted(LendingRequest.objects.filter(item=item_id, status__in=['PENDING', 'APPROVED'])
+                           .values_list('requested_from', 'requested_to'))
+            for (_, end), (start, _) in zip(spans, spans[1:]):
+                self.assertLessEqual(end, start)
+
+
+class ResultsTests(TestCase):
+
+    def test_summarize_and_compare(self):
+        recorder = Recorder()
+        for ms in range(1, 101):
+            recorder.record('GET /api/items/', 200, ms / 1000)
+        recorder.record('GET /api/items/', 'error', 0.5)
+        baseline = summarize(recorder, elapsed=10)
+
+        summary = baseline['endpoints']['GET /api/items/']
+        self.assertEqual(summary['requests'], 101)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['throughput_rps'], 10.1)
+        self.assertEqual(summary['p50_ms'], 51.0)
+
+        slower = {'endpoints': {'GET /api/items/': dict(summary, p95_ms=summary['p95_ms'] * 1.5)}}
+        rows, regressions = compare(baseline, slower, threshold=10)
+        self.assertEqual(regressions, ['GET /api/items/'])
+        self.assertIn(('GET /api/items/', 'p95_ms', summary['p95_ms'], summary['p95_ms'] * 1.5, 50.0), rows)
+        self.assertEqual(compare(baseline, baseline, threshold=10)[1], [])
+
+
+class LoadRunTests(LiveServerTestCase):
+
+    def test_scenarios_run_against_the_server(self):
+        generate(Scale(users=3, items=5, availabilities=0, lending_requests=3, messages=30))
+        usernames = list(User.objects.values_list('username', flat=True))
+        run = LoadRun(self.live_server_url, usernames, list(Item.objects.values_list('pk', flat=True)),
+                      mix={'browse': 1, 'loan': 1, 'approve': 1, 'messages': 1}, seed=3)
+
+        results = run.run(concurrency=1, duration=60, iterations=12)
+
+        self.assertEqual(results['total']['errors'], 0)
+        for endpoint in ['GET /api/items/', 'GET /api/items/{id}/', 'POST /api/lending-requests/',
+                         'GET /api/messages/summary/', 'GET /api/sync/']:
+            self.assertIn(endpoint, results['endpoints'])
+        self.assertNotIn('401', results['endpoints']['GET /api/items/']['statuses'])
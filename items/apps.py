@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
+
+    def ready(self):
+        # Keep the full-text search index in sync (see items/signals.py)
+        from . import signals  # noqa: F401
@@ -0,0 +1,168 @@
+# items/bulk.py
+"""
+Streaming bulk import and export of items (POST /api/items/bulk/ and
+GET /api/items/export/).
+
+Import reads the request body line by line, validates rows in chunks with
+BulkItemSerializer(many=True) and inserts each chunk with one bulk_create.
+Export streams rows straight from a server-side cursor, so neither side ever
+holds the whole inventory in memory.
+"""
+import codecs
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from nas_project import response_cache
+from . import search
+from .models import Item
+from .serializers import BulkItemSerializer
+
+# Rows validated and inserted per database round trip
+IMPORT_CHUNK_SIZE = 500
+# Stop collecting per-row errors after this many (the counts stay exact)
+MAX_REPORTED_ERRORS = 1000
+# Rows fetched per server-side cursor round trip when exporting
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'condition', 'location', 'is_available', 'created_at', 'updated_at']
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_CONTENT_TYPES = ('text/csv',)
+
+
+# -------------------------------------------------------------
+# Import
+# -------------------------------------------------------------
+
+class RowError:
+    """Yielded instead of a row's data when the row can't even be read."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_ndjson_rows(stream):
+    """Yield (row_number, data) for each non-blank line; data is a RowError if the line isn't JSON."""
+    for row_number, raw_line in enumerate(stream, start=1):
+        try:
+            line = raw_line.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            yield row_number, RowError("Not valid UTF-8.")
+            continue
+        if not line:
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError:
+            yield row_number, RowError("Invalid JSON.")
+
+
+def iter_csv_rows(stream):
+    """
+    Yield (row_number, data) for each CSV record; the first line is the header.
+    A record can span lines, so bytes that aren't UTF-8 end the import there,
+    with a RowError for the record they are in.
+    """
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8'))
+    row_number = 0
+    try:
+        for row_number, row in enumerate(reader, start=1):
+            # Drop empty cells so optional columns fall back to their defaults
+            yield row_number, {key: value for key, value in row.items() if key and value != ''}
+    except UnicodeDecodeError:
+        yield row_number + 1, RowError("Not valid UTF-8; rows from here on were not read.")
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def _import_chunk(rows, context, report):
+    serializer = BulkItemSerializer(data=[data for _, data in rows], many=True, context=context)
+    if not serializer.is_valid():
+        # Report the bad rows, then validate the good ones again on their own.
+        # Depending on the DRF version, list errors come back as a list with
+        # one (possibly empty) entry per row or as a dict of failed indexes.
+        errors = serializer.errors
+        if not isinstance(errors, dict):
+            errors = {index: row_errors for index, row_errors in enumerate(errors) if row_errors}
+        good_rows = []
+        for index, (row_number, data) in enumerate(rows):
+            if index in errors:
+                report.add_error(row_number, errors[index])
+            else:
+                good_rows.append((row_number, data))
+        if not good_rows:
+            return
+        serializer = BulkItemSerializer(data=[data for _, data in good_rows], many=True, context=context)
+        serializer.is_valid(raise_exception=True)
+
+    with transaction.atomic():
+        items = Item.objects.bulk_create(
+            [Item(**data) for data in serializer.validated_data],
+            batch_size=IMPORT_CHUNK_SIZE,
+        )
+        # bulk_create skips post_save, so update the search index and
+        # retire cached item lists here
+        search.index_items(items)
+        response_cache.invalidate(Item)
+    report.created += len(items)
+
+
+def import_items(rows, context):
+    """Validate and insert (row_number, data) pairs in chunks; returns an ImportReport."""
+    report = ImportReport()
+    chunk = []
+    for row_number, data in rows:
+        if isinstance(data, RowError):
+            report.add_error(row_number, {'non_field_errors': [data.message]})
+            continue
+        chunk.append((row_number, data))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            _import_chunk(chunk, context, report)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, context, report)
+    return report
+
+
+# -------------------------------------------------------------
+# Export
+# -------------------------------------------------------------
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """Stream EXPORT_FIELDS tuples from the database in chunks."""
+    return queryset.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
@@ -0,0 +1,31 @@
+# items/filters.py
+"""
+Queryset filters for the item catalogue.
+"""
+from django.db.models import Exists, OuterRef
+
+from lending.models import ACTIVE_STATUSES, LendingRequest
+from .models import Availability
+
+
+def free_between(queryset, free_from, free_to):
+    """
+    Items that can be borrowed for the whole [free_from, free_to] window
+    (both ends inclusive): lendable, with no owner block and no PENDING/
+    APPROVED/ON_LOAN request overlapping it.
+
+    Compiles to a single query with two NOT EXISTS anti-joins, each probing
+    the (item, ...dates) composite indexes, instead of checking items one by one.
+    """
+    blocked = Availability.objects.filter(
+        item=OuterRef('pk'),
+        unavailable_from__lte=free_to,
+        unavailable_to__gte=free_from,
+    )
+    booked = LendingRequest.objects.filter(
+        item=OuterRef('pk'),
+        status__in=ACTIVE_STATUSES,
+        requested_from__lte=free_to,
+        requested_to__gte=free_from,
+    )
+    return queryset.filter(~Exists(blocked), ~Exists(booked), is_available=True)
@@ -0,0 +1,149 @@
+"""
+Benchmark item full-text search on a synthetic catalogue.
+
+Usage:
+    python manage.py bench_item_search                      # 1,000,000 items
+    python manage.py bench_item_search --items 100000 --queries 500 --keep
+
+Generates items owned by a throwaway 'bench-search' user, indexes them,
+runs random one- and two-word searches (with and without filters) through
+items.search and prints latency percentiles. The generated rows are deleted
+afterwards unless --keep is given. Run it against a scratch database.
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from items import search
+from items.models import Item
+
+User = get_user_model()
+
+BENCH_USERNAME = 'bench-search'
+
+NOUNS = [
+    'drill', 'hammer', 'ladder', 'saw', 'tent', 'bicycle', 'projector', 'mixer',
+    'blender', 'kayak', 'camera', 'tripod', 'speaker', 'grill', 'wheelbarrow',
+    'mower', 'sander', 'wrench', 'jack', 'generator', 'guitar', 'novel', 'atlas',
+    'stroller', 'crib', 'sewing', 'machine', 'vacuum', 'heater', 'fan', 'cooler',
+]
+ADJECTIVES = [
+    'cordless', 'electric', 'folding', 'portable', 'heavy', 'compact', 'vintage',
+    'digital', 'wooden', 'steel', 'aluminium', 'large', 'small', 'waterproof',
+]
+LOCATIONS = ['Westlands', 'Kilimani', 'Karen', 'Lavington', 'Parklands', 'Kileleshwa', 'Runda', 'Ngong']
+CONDITIONS = [choice for choice, _ in Item.CONDITION_CHOICES]
+# Filler words so descriptions have a realistic vocabulary size
+FILLER = [f"{a}{b}{c}" for a in 'bcdfgklmnprstvz' for b in 'aeiou' for c in ('n', 'r', 'l', 'sk', 'nd', 'tt')]
+
+
+def synthetic_item(rng, owner):
+    name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)}"
+    words = rng.choices(FILLER, k=rng.randint(8, 24)) + rng.choices(NOUNS + ADJECTIVES, k=3)
+    rng.shuffle(words)
+    return Item(
+        owner=owner,
+        name=name,
+        description=' '.join(words),
+        condition=rng.choice(CONDITIONS),
+        location=rng.choice(LOCATIONS),
+        is_available=rng.random() < 0.8,
+    )
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Benchmark item search latency on a synthetic catalogue (default 1M items)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1_000_000, help="Number of synthetic items to generate.")
+        parser.add_argument('--queries', type=int, default=200, help="Number of timed searches per scenario.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated items afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        owner, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        backend = search.get_backend()
+        self.stdout.write(f"Backend: {type(backend).__name__} on {connection.vendor}")
+
+        existing = Item.objects.filter(owner=owner).count()
+        to_create = max(0, options['items'] - existing)
+        if to_create:
+            self.generate(rng, owner, to_create, options['batch_size'])
+
+        scenarios = [
+            ("one word", lambda: (rng.choice(NOUNS), {})),
+            ("two words", lambda: (f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}", {})),
+            ("prefix", lambda: (rng.choice(NOUNS)[:4], {})),
+            ("word + filters", lambda: (
+                rng.choice(NOUNS),
+                {'location': rng.choice(LOCATIONS), 'condition': rng.choice(CONDITIONS), 'available': True},
+            )),
+        ]
+        for label, make_query in scenarios:
+            self.run_scenario(label, make_query, options['queries'])
+
+        if not options['keep']:
+            self.cleanup(owner, options['batch_size'])
+
+    def generate(self, rng, owner, count, batch_size):
+        self.stdout.write(f"Generating {count:,} items...")
+        started = time.perf_counter()
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            with transaction.atomic():
+                batch = Item.objects.bulk_create([synthetic_item(rng, owner) for _ in range(size)])
+                # bulk_create skips the post_save signal, so index explicitly
+                search.index_items(batch)
+            created += size
+            if created % (batch_size * 20) == 0 or created == count:
+                self.stdout.write(f"  {created:,} / {count:,}")
+        self.stdout.write(f"Generated in {time.perf_counter() - started:.1f}s")
+
+    def run_scenario(self, label, make_query, queries):
+        # Warm up caches so the first queries don't skew the numbers
+        for _ in range(5):
+            query, filters = make_query()
+            search.search_item_ids(query, filters, limit=21)
+
+        timings = []
+        for _ in range(queries):
+            query, filters = make_query()
+            started = time.perf_counter()
+            search.search_item_ids(query, filters, limit=21)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        self.stdout.write(
+            f"{label:<16} n={queries:<5} "
+            f"mean={statistics.fmean(timings):7.2f}ms "
+            f"p50={percentile(timings, 0.50):7.2f}ms "
+            f"p95={percentile(timings, 0.95):7.2f}ms "
+            f"p99={percentile(timings, 0.99):7.2f}ms "
+            f"max={timings[-1]:7.2f}ms"
+        )
+
+    def cleanup(self, owner, batch_size):
+        self.stdout.write("Removing generated items...")
+        ids = list(Item.objects.filter(owner=owner).values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            with transaction.atomic():
+                search.remove_items(chunk)
+                # Raw delete: the synthetic items have no related rows, and
+                # going through the ORM would send a signal per item.
+                with connection.cursor() as cursor:
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f"DELETE FROM items_item WHERE id IN ({placeholders})", chunk)
+        owner.delete()
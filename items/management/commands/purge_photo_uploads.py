@@ -0,0 +1,26 @@
+"""
+Delete item photo uploads that were started but never finalized.
+
+Usage:
+    python manage.py purge_photo_uploads                 # older than 24 hours
+    python manage.py purge_photo_uploads --hours 6
+
+Run it from cron: abandoned uploads otherwise keep their partial files in
+PHOTO_UPLOAD_DIR forever.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from items.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete unfinished item photo uploads and their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help="Age after which an upload is abandoned.")
+
+    def handle(self, *args, **options):
+        purged = purge_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} abandoned upload(s)."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='availability',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='availabilities', to='items.item'),
+        ),
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['item', 'unavailable_from', 'unavailable_to'], name='avail_item_dates_idx'),
+        ),
+    ]
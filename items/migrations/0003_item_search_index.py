@@ -0,0 +1,33 @@
+# Full-text search index for items (see items/search.py)
+
+from django.db import DatabaseError, migrations
+
+
+def create_search_index(apps, schema_editor):
+    from items.search import backend_class_for
+
+    connection = schema_editor.connection
+    try:
+        backend_class_for(connection)(connection.alias).create_index()
+    except DatabaseError:
+        # e.g. SQLite compiled without FTS5: search falls back to a plain scan
+        if connection.vendor != 'sqlite':
+            raise
+
+
+def drop_search_index(apps, schema_editor):
+    from items.search import backend_class_for
+
+    connection = schema_editor.connection
+    backend_class_for(connection)(connection.alias).drop_index()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0002_availability_item_dates_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
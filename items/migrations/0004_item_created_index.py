@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0003_item_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-created_at'], name='item_created_idx'),
+        ),
+    ]
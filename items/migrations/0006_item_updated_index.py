@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_item_photos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['updated_at', 'id'], name='item_updated_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model # RECOMMENDED: Import the utility function
 
@@ -22,17 +24,80 @@ class Item(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Catalogue pages are walked newest first (cursor pagination)
+            models.Index(fields=['-created_at'], name='item_created_idx'),
+            # Changes since a sync token (sync/changes.py)
+            models.Index(fields=['updated_at', 'id'], name='item_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} by {self.owner.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database so signal handlers can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 # Availability model
 class Availability(models.Model):
-    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='availabilities')
+    # No single-column index: avail_item_dates_idx below starts with item
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='availabilities', db_index=False)
     unavailable_from = models.DateField()
     unavailable_to = models.DateField()
 
     class Meta:
         verbose_name_plural = "Availabilities"
+        indexes = [
+            # Serves the owner-block overlap check in LendingRequestSerializer.validate()
+            models.Index(fields=['item', 'unavailable_from', 'unavailable_to'], name='avail_item_dates_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name}: {self.unavailable_from} to {self.unavailable_to}"
+
+
+# Item photos
+class ItemPhoto(models.Model):
+    """
+    A photo of an Item. 'image' is the cleaned original and 'thumbnails' the
+    {size: {format: name}} derivatives, both content-hashed files written by
+    nas_project/thumbnails.py. They stay empty until the uploaded file has
+    been processed.
+    """
+    # No single-column index: unique_item_photo starts with item
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image = models.ImageField(upload_to='item_photos/', blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # SHA-256 of the uploaded bytes: the same upload is stored once per item
+    content_hash = models.CharField(max_length=64, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'content_hash'], name='unique_item_photo'),
+        ]
+
+    def __str__(self):
+        return f"Photo #{self.pk} of item #{self.item_id}"
+
+
+class PhotoUpload(models.Model):
+    """
+    A resumable photo upload in progress. The bytes received so far live in
+    a temporary file (see items/uploads.py); 'received' is how many of them
+    are committed, i.e. the offset the next chunk must start at.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='photo_uploads')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='photo_uploads')
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.item.name}: {self.unavailable_from} to {self.unavailable_to}"
\ No newline at end of file
+        return f"Upload {self.pk}: {self.received}/{self.size} bytes"
@@ -0,0 +1,213 @@
+# items/search.py
+"""
+Full-text search over the item catalogue.
+
+Each database gets its own inverted index:
+- SQLite: an FTS5 virtual table 'items_item_fts' (rowid = Item.id), kept in
+  sync by the Item save/delete signal handlers in items/signals.py.
+- PostgreSQL: a GIN index over a to_tsvector() expression on items_item,
+  which PostgreSQL maintains itself.
+- Anything else: a plain icontains scan (no index, same API).
+
+The index objects are created by migration 0003_item_search_index, using the
+create_index()/drop_index() methods below.
+"""
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+
+from .models import Item
+
+FTS_TABLE = 'items_item_fts'
+PG_INDEX = 'items_item_search_idx'
+PG_VECTOR = (
+    "to_tsvector('english', coalesce(items_item.name, '') || ' ' || "
+    "coalesce(items_item.description, '') || ' ' || "
+    "coalesce(items_item.location, '') || ' ' || coalesce(items_item.condition, ''))"
+)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _filter_sql(filters):
+    """SQL conditions and params for the non-text filters (condition, location, available)."""
+    clauses, params = [], []
+    if filters.get('condition'):
+        clauses.append('items_item.condition = %s')
+        params.append(filters['condition'])
+    if filters.get('location'):
+        clauses.append('UPPER(items_item.location) LIKE UPPER(%s)')
+        params.append(f"%{filters['location']}%")
+    if filters.get('available') is not None:
+        clauses.append('items_item.is_available = %s')
+        params.append(bool(filters['available']))
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+class SearchBackend:
+    """Plain scan used when the database has no full-text support wired up."""
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        # Connections are per thread, so look it up on every use
+        return connections[self.using]
+
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def index_items(self, items):
+        pass
+
+    def remove_items(self, item_ids):
+        pass
+
+    def search(self, query, filters, limit, offset=0):
+        """Return the ids of matching items, best match first."""
+        queryset = Item.objects.using(self.using).order_by('-created_at')
+        for word in _WORD_RE.findall(query):
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        if filters.get('condition'):
+            queryset = queryset.filter(condition=filters['condition'])
+        if filters.get('location'):
+            queryset = queryset.filter(location__icontains=filters['location'])
+        if filters.get('available') is not None:
+            queryset = queryset.filter(is_available=filters['available'])
+        return list(queryset.values_list('id', flat=True)[offset:offset + limit])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 index, ranked with bm25()."""
+
+    # bm25() column weights: name, description, location, condition
+    WEIGHTS = (10.0, 1.0, 2.0, 1.0)
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(name, description, location, condition, tokenize='unicode61')"
+            )
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, description, location, condition) "
+                "SELECT id, name, description, location, condition FROM items_item"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def index_items(self, items):
+        rows = [(i.pk, i.name, i.description, i.location, i.condition) for i in items]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, description, location, condition) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove_items(self, item_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in item_ids])
+
+    def search(self, query, filters, limit, offset=0):
+        words = _WORD_RE.findall(query)
+        if not words:
+            return super().search(query, filters, limit, offset)
+        # Every word must match, as a prefix ("dril" finds "drill"). Quoting
+        # keeps FTS5 operators in user input from being interpreted.
+        match = ' '.join(f'"{word}"*' for word in words)
+        filter_sql, filter_params = _filter_sql(filters)
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT items_item.id FROM {FTS_TABLE} "
+                f"JOIN items_item ON items_item.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s{filter_sql} "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), items_item.id DESC "
+                "LIMIT %s OFFSET %s",
+                [match, *filter_params, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresFTSBackend(SearchBackend):
+    """PostgreSQL tsvector expression with a GIN index, ranked with ts_rank()."""
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON items_item USING GIN (({PG_VECTOR}))")
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+    def search(self, query, filters, limit, offset=0):
+        if not _WORD_RE.search(query):
+            return super().search(query, filters, limit, offset)
+        filter_sql, filter_params = _filter_sql(filters)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT items_item.id FROM items_item, websearch_to_tsquery('english', %s) query "
+                f"WHERE {PG_VECTOR} @@ query{filter_sql} "
+                f"ORDER BY ts_rank({PG_VECTOR}, query) DESC, items_item.id DESC "
+                "LIMIT %s OFFSET %s",
+                [query, *filter_params, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_BACKENDS = {}
+
+
+def backend_class_for(connection):
+    """The backend class matching a connection's database vendor."""
+    return {
+        'postgresql': PostgresFTSBackend,
+        'sqlite': SQLiteFTSBackend,
+    }.get(connection.vendor, SearchBackend)
+
+
+def _fts5_table_exists(connection):
+    try:
+        return FTS_TABLE in connection.introspection.table_names()
+    except DatabaseError:
+        return False
+
+
+def get_backend(using='default'):
+    """The search backend for a database alias (cached per alias)."""
+    backend = _BACKENDS.get(using)
+    if backend is None:
+        connection = connections[using]
+        backend_class = backend_class_for(connection)
+        if backend_class is SQLiteFTSBackend and not _fts5_table_exists(connection):
+            # SQLite built without FTS5 (or not migrated yet): scan, and check
+            # again next time instead of caching the fallback.
+            return SearchBackend(using)
+        backend = _BACKENDS[using] = backend_class(using)
+    return backend
+
+
+def index_items(items, using='default'):
+    """Add or refresh items in the search index (for bulk writes that skip signals)."""
+    get_backend(using).index_items(items)
+
+
+def remove_items(item_ids, using='default'):
+    get_backend(using).remove_items(item_ids)
+
+
+def search_item_ids(query, filters=None, limit=20, offset=0, using='default'):
+    """Ids of the items matching `query` and the filters, most relevant first."""
+    return get_backend(using).search(query or '', filters or {}, limit, offset)
@@ -1,17 +1,78 @@
 # items/serializers.py 
+from django.conf import settings
 from rest_framework import serializers
-from .models import Item, Availability
+from nas_project.thumbnails import ThumbnailURLsField
+from .models import Item, Availability, ItemPhoto, PhotoUpload
+
+class ItemPhotoSerializer(serializers.ModelSerializer):
+    # {"512": {"webp": url, "jpeg": url}, "128": ..., "64": ...}; empty while processing
+    thumbnails = ThumbnailURLsField()
+
+    class Meta:
+        model = ItemPhoto
+        fields = ['id', 'image', 'thumbnails', 'created_at']
+        read_only_fields = fields
+
+class PhotoUploadSerializer(serializers.ModelSerializer):
+    """A resumable upload: POST {"size": n} to start one; 'offset' is where the next chunk goes."""
+    offset = serializers.IntegerField(source='received', read_only=True)
+    size = serializers.IntegerField(min_value=1, max_value=settings.ITEM_PHOTO_MAX_BYTES)
+
+    class Meta:
+        model = PhotoUpload
+        fields = ['id', 'item', 'size', 'offset', 'created_at']
+        read_only_fields = ['id', 'item', 'offset', 'created_at']
 
 class ItemSerializer(serializers.ModelSerializer):
     owner_username = serializers.ReadOnlyField(source='owner.username') # Read-only field for owner's username
+    photos = ItemPhotoSerializer(many=True, read_only=True)
 
     class Meta:
         model = Item
-        fields = ['id', 'owner', 'owner_username', 'name', 'description', 'condition', 'location', 'is_available', 'created_at']
+        fields = ['id', 'owner', 'owner_username', 'name', 'description', 'condition', 'location', 'is_available', 'photos', 'created_at']
         read_only_fields = ['id', 'created_at', 'updated_at', 'owner_username']
+        # Relations read by the fields above; applied by EagerLoadingMixin
+        select_related = ['owner']
+        prefetch_related = ['photos']
         # Note: 'owner' will typically be set automatically on creation/update based on the logged-in user.
 
+class BulkItemSerializer(ItemSerializer):
+    """
+    ItemSerializer for POST /api/items/bulk/: every row belongs to the
+    requesting user, so 'owner' is filled in from the request instead of
+    being looked up in the database once per row.
+    """
+    owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
 class AvailabilitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Availability
-        fields = ['id', 'item', 'unavailable_from', 'unavailable_to']
\ No newline at end of file
+        fields = ['id', 'item', 'unavailable_from', 'unavailable_to']
+
+class FreeDatesFilterSerializer(serializers.Serializer):
+    """Query parameters for GET /api/items/?free_from=&free_to= (both or neither)."""
+    free_from = serializers.DateField(required=False)
+    free_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if ('free_from' in data) != ('free_to' in data):
+            raise serializers.ValidationError("Provide both 'free_from' and 'free_to'.")
+        if 'free_from' in data and data['free_to'] < data['free_from']:
+            raise serializers.ValidationError({'free_to': "'free_to' must not be before 'free_from'."})
+        return data
+
+class CalendarRangeSerializer(serializers.Serializer):
+    """Query parameters for GET /api/items/{id}/calendar/ (both optional)."""
+    # 'from' is a Python keyword, so the fields are built in get_fields()
+    def get_fields(self):
+        return {
+            'from': serializers.DateField(required=False),
+            'to': serializers.DateField(required=False),
+        }
+
+class ItemSearchSerializer(serializers.Serializer):
+    """Query parameters for GET /api/items/search/."""
+    q = serializers.CharField(required=False, allow_blank=True, default='')
+    location = serializers.CharField(required=False, allow_blank=True)
+    condition = serializers.ChoiceField(choices=Item.CONDITION_CHOICES, required=False)
+    available = serializers.BooleanField(required=False, allow_null=True, default=None)
@@ -0,0 +1,60 @@
+# items/signals.py
+"""
+Signal handlers that keep the item search index (items/search.py) in sync
+and retire cached API responses (nas_project/response_cache.py).
+Bulk writes that bypass signals must call search.index_items() and
+response_cache.invalidate() themselves.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from nas_project import response_cache
+from . import search
+from .models import Availability, Item, ItemPhoto
+
+
+# Columns stored in the index; saves touching none of them are skipped
+INDEXED_FIELDS = {'name', 'description', 'location', 'condition'}
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, using, update_fields=None, **kwargs):
+    response_cache.invalidate(Item, instance.pk)
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    search.index_items([instance], using=using)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, using, **kwargs):
+    response_cache.invalidate(Item, instance.pk)
+    search.remove_items([instance.pk], using=using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def owner_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Item (and lending request) responses show the owner's username, and
+    # nothing else about the user: other user saves (logins, profile edits)
+    # leave them cached
+    if created or 'username' in instance.get_deferred_fields():
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if loaded.get('username') == instance.username:
+        return
+    response_cache.invalidate(Item, *Item.objects.filter(owner=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ItemPhoto)
+@receiver(post_delete, sender=ItemPhoto)
+def item_photo_changed(sender, instance, **kwargs):
+    # Photos are listed in the item's responses
+    response_cache.invalidate(Item, instance.item_id)
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def availability_changed(sender, instance, **kwargs):
+    response_cache.invalidate(Availability)
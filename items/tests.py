@@ -1,3 +1,371 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from PIL import Image
+from rest_framework.routers import DefaultRouter
+from rest_framework.test import APITestCase
+
+from lending.models import LendingRequest
+from nas_project.testing import QueryCountAssertionsMixin
+from . import uploads
+from .models import Availability, Item, ItemPhoto, PhotoUpload
+from .views import AvailabilityViewSet
+
+User = get_user_model()
+
+
+def make_items(owner, count, **kwargs):
+    return Item.objects.bulk_create([
+        Item(owner=owner, name=f"Item {i}", description="A useful thing",
+             condition='Good', location='Westlands', **kwargs)
+        for i in range(count)
+    ])
+
+
+class ItemQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """List and detail endpoints must not issue one query per row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.item = make_items(self.user, 1)[0]
+
+    def test_item_list_query_count(self):
+        def add_rows():
+            for i in range(5):
+                make_items(User.objects.create_user(username=f'owner{i}'), 3)
+
+        # The page of items, then the photos of all of them
+        self.assertConstantQueries(self.client, '/api/items/', 2, add_rows)
+
+    def test_item_detail_query_count(self):
+        self.assertQueryCount(self.client, f'/api/items/{self.item.pk}/', 2)
+
+
+# AvailabilityViewSet isn't routed under /api/: the tests route it themselves
+availability_router = DefaultRouter()
+availability_router.register('availabilities', AvailabilityViewSet)
+urlpatterns = [path('api/', include(availability_router.urls))]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AvailabilityQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """List and detail endpoints must not issue one query per row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.item = make_items(self.user, 1)[0]
+        self.block = self.add_block(self.item, 1)
+
+    def add_block(self, item, days_ahead):
+        start = timezone.localdate() + timedelta(days=days_ahead)
+        return Availability.objects.create(item=item, unavailable_from=start, unavailable_to=start + timedelta(days=1))
+
+    def test_availability_list_query_count(self):
+        def add_rows():
+            for i, item in enumerate(make_items(User.objects.create_user(username='owner2'), 5)):
+                self.add_block(item, 10 + i)
+
+        # The page only: the item is shown as its id
+        self.assertConstantQueries(self.client, '/api/availabilities/', 1, add_rows)
+
+    def test_availability_detail_query_count(self):
+        self.assertQueryCount(self.client, f'/api/availabilities/{self.block.pk}/', 1)
+
+
+class ItemResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.item = make_items(self.user, 1)[0]
+        self.url = f'/api/items/{self.item.pk}/'
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get('/api/items/')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/items/')
+        # Nothing is read or serialized again
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_retire_cached_responses(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.get('/api/items/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'name': "Renamed"})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], "Renamed")
+        self.assertEqual(self.client.get('/api/items/').data['results'][0]['name'], "Renamed")
+
+        # Blocking the item's dates changes which items are free
+        free_url = '/api/items/?free_from=2030-01-01&free_to=2030-01-05'
+        self.assertEqual(len(self.client.get(free_url).data['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Availability.objects.create(item=self.item, unavailable_from='2030-01-02', unavailable_to='2030-01-03')
+        self.assertEqual(len(self.client.get(free_url).data['results']), 0)
+
+    def test_only_username_changes_retire_owner_items(self):
+        list_etag = self.client.get('/api/items/')['ETag']
+        detail_etag = self.client.get(self.url)['ETag']
+        owner = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='someone-else')
+            owner.bio = "Lends tools"
+            owner.save()
+        self.assertEqual(self.client.get('/api/items/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            owner.username = 'renamed'
+            owner.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['owner_username'], 'renamed')
+        self.assertEqual(self.client.get('/api/items/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+
+class ItemSearchTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.drill = Item.objects.create(
+            owner=self.user, name="Cordless drill", description="18V with two batteries",
+            condition='Good', location='Westlands',
+        )
+        self.bits = Item.objects.create(
+            owner=self.user, name="Drill bits", description="Masonry and wood",
+            condition='Fair', location='Karen',
+        )
+        Item.objects.create(
+            owner=self.user, name="Ladder", description="Folding aluminium ladder",
+            condition='Good', location='Westlands',
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/items/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_matches_prefixes_and_applies_filters(self):
+        self.assertCountEqual(self.search(q='dril'), [self.drill.pk, self.bits.pk])
+        self.assertEqual(self.search(q='drill', location='west'), [self.drill.pk])
+        self.assertEqual(self.search(q='drill', condition='Fair'), [self.bits.pk])
+
+    def test_index_follows_item_updates_and_deletes(self):
+        self.drill.name = "Impact driver"
+        self.drill.save()
+        self.assertEqual(self.search(q='impact'), [self.drill.pk])
+
+        self.drill.delete()
+        self.assertEqual(self.search(q='impact'), [])
+
+
+class FreeDatesFilterTests(QueryCountAssertionsMixin, APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.client.force_authenticate(self.borrower)
+        self.free, self.blocked, self.booked, self.denied = make_items(self.owner, 4)
+        make_items(self.owner, 1, is_available=False)
+
+        Availability.objects.create(item=self.blocked, unavailable_from=self.day(3), unavailable_to=self.day(5))
+        LendingRequest.objects.create(
+            item=self.booked, borrower=self.borrower, requested_from=self.day(5), requested_to=self.day(6),
+        )
+        LendingRequest.objects.create(
+            item=self.denied, borrower=self.borrower, requested_from=self.day(5), requested_to=self.day(6),
+            status='DENIED',
+        )
+
+    def day(self, offset):
+        return timezone.localdate() + timedelta(days=offset)
+
+    def free_item_ids(self, start, end):
+        url = f'/api/items/?free_from={self.day(start)}&free_to={self.day(end)}'
+        # One filtered query for the page, one for the photos of its items
+        self.assertQueryCount(self.client, url, 2)
+        return {item['id'] for item in self.client.get(url).data['results']}
+
+    def test_excludes_blocked_and_booked_items_in_one_query(self):
+        self.assertEqual(self.free_item_ids(5, 5), {self.free.pk, self.denied.pk})
+        self.assertEqual(
+            self.free_item_ids(7, 9),
+            {self.free.pk, self.blocked.pk, self.booked.pk, self.denied.pk},
+        )
+
+    def test_requires_both_dates(self):
+        response = self.client.get(f'/api/items/?free_from={self.day(1)}')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkImportExportTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def test_ndjson_import_reports_bad_rows_and_creates_the_rest(self):
+        rows = [
+            json.dumps({'name': 'Drill', 'description': 'Cordless', 'condition': 'Good', 'location': 'Karen'}),
+            '{not json',
+            json.dumps({'name': 'Saw', 'condition': 'Broken'}),
+            json.dumps({'name': 'Ladder', 'description': 'Folding', 'condition': 'Fair', 'location': 'Karen'}),
+        ]
+        response = self.client.post(
+            '/api/items/bulk/', '\n'.join(rows), content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(set(Item.objects.values_list('owner', flat=True)), {self.user.pk})
+
+        # Bulk-created items are searchable too
+        search = self.client.get('/api/items/search/', {'q': 'ladder'})
+        self.assertEqual(len(search.data['results']), 1)
+
+    def test_csv_import_and_export_round_trip(self):
+        body = "name,description,condition,location,is_available\nSaw,Hand saw,Fair,Karen,false\n"
+        response = self.client.post('/api/items/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Item.objects.get(name='Saw').is_available)
+
+        export = self.client.get('/api/items/export/', {'output': 'csv'})
+        lines = b''.join(export.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'name', 'description'])
+        self.assertEqual(len(lines), 2)
+
+    def test_rows_that_are_not_utf8_are_reported(self):
+        response = self.client.post('/api/items/bulk/', b'\xff\xfe{bad', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['row'], 1)
+
+        body = "name,description,condition,location\nSaw,Hand saw,Fair,Karen\n".encode() + b'Dr\xffill,,Good,Karen\n'
+        response = self.client.post('/api/items/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+    def test_unsupported_content_type(self):
+        response = self.client.post('/api/items/bulk/', '<items/>', content_type='application/xml')
+        self.assertEqual(response.status_code, 415)
+
+
+def png_bytes(size=(800, 600), color=(20, 120, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ItemPhotoUploadTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            PHOTO_UPLOAD_DIR=f'{media_root}/uploads',
+            THUMBNAIL_ASYNC=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.item = make_items(self.owner, 1)[0]
+        self.uploads_url = f'/api/items/{self.item.pk}/photos/uploads/'
+        self.client.force_authenticate(self.owner)
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.patch(
+            f'{self.uploads_url}{upload_id}/', chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, data, chunk_size=1000):
+        upload_id = self.client.post(self.uploads_url, {'size': len(data)}).data['id']
+        for offset in range(0, len(data), chunk_size):
+            response = self.send_chunk(upload_id, offset, data[offset:offset + chunk_size])
+            self.assertEqual(response.status_code, 200, response.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'{self.uploads_url}{upload_id}/finalize/')
+
+    def test_chunked_upload_creates_photo_with_thumbnails(self):
+        data = png_bytes()
+        upload_id = self.client.post(self.uploads_url, {'size': len(data)}).data['id']
+        self.assertEqual(self.send_chunk(upload_id, 0, data[:500]).data['offset'], 500)
+
+        # A chunk at the wrong offset is refused and tells the client where to resume
+        response = self.send_chunk(upload_id, 100, data[100:600])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 500)
+        self.assertEqual(self.client.get(f'{self.uploads_url}{upload_id}/').data['offset'], 500)
+
+        self.send_chunk(upload_id, 500, data[500:])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.uploads_url}{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(PhotoUpload.objects.exists())
+
+        photos = self.client.get(f'/api/items/{self.item.pk}/').data['photos']
+        self.assertEqual(len(photos), 1)
+        self.assertEqual(set(photos[0]['thumbnails']), {'64', '128', '512'})
+        self.assertIn('/media/thumbs/', photos[0]['image'])
+
+    def test_identical_upload_is_deduplicated(self):
+        data = png_bytes()
+        first = self.upload(data)
+        second = self.upload(data, chunk_size=4000)
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(ItemPhoto.objects.count(), 1)
+
+    def test_losing_chunk_leaves_the_file_alone(self):
+        upload = PhotoUpload.objects.get(pk=self.client.post(self.uploads_url, {'size': 4}).data['id'])
+        stale = PhotoUpload.objects.get(pk=upload.pk)
+        self.assertEqual(uploads.write_chunk(upload, 0, io.BytesIO(b'ab')), 2)
+
+        # Raced for offset 0 and lost: refused before touching the file
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.write_chunk(stale, 0, io.BytesIO(b'xyzw'))
+        self.assertEqual(raised.exception.status_code, 409)
+        with open(uploads.part_path(upload), 'rb') as part:
+            self.assertEqual(part.read(), b'ab')
+        self.assertEqual(os.listdir(settings.PHOTO_UPLOAD_DIR), [f'{upload.pk}.part'])
+
+    def test_rejects_oversized_chunks_and_non_images(self):
+        upload_id = self.client.post(self.uploads_url, {'size': 10}).data['id']
+        self.assertEqual(self.send_chunk(upload_id, 0, b'x' * 11).status_code, 400)
+        self.send_chunk(upload_id, 0, b'x' * 10)
+        response = self.client.post(f'{self.uploads_url}{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ItemPhoto.objects.exists())
+
+    def test_only_owner_can_upload(self):
+        self.client.force_authenticate(User.objects.create_user(username='other'))
+        response = self.client.post(self.uploads_url, {'size': 100})
+        self.assertEqual(response.status_code, 403)
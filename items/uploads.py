@@ -0,0 +1,177 @@
+# items/uploads.py
+"""
+Resumable, chunked item photo uploads.
+
+    POST  /api/items/{id}/photos/uploads/                 {"size": <bytes>}  -> upload id, offset 0
+    PATCH /api/items/{id}/photos/uploads/{upload}/        raw bytes, Upload-Offset: <offset>
+    GET   /api/items/{id}/photos/uploads/{upload}/        -> current offset (to resume)
+    POST  /api/items/{id}/photos/uploads/{upload}/finalize/
+
+Chunks are copied from the request stream to a temporary file of their
+own in small blocks, so neither Django nor this code ever holds a whole
+photo in memory. A chunk must start exactly at the committed offset; a
+client that lost a response asks for the offset again and resumes from
+there. Only once the whole chunk has arrived is it copied into the upload's
+file, under the upload's row lock and together with the offset check, so
+two chunks racing for one offset never both touch the file.
+
+Finalizing hashes the file: an identical photo already on the item is
+returned as is, one already processed for another item reuses its files,
+and anything else goes through the same thumbnail pipeline as profile
+pictures (nas_project/thumbnails.py), off the request thread.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from PIL import Image
+
+from nas_project import response_cache, thumbnails
+from .models import Item, ItemPhoto, PhotoUpload
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that can't be applied; carries an HTTP status."""
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def part_path(upload):
+    return os.path.join(settings.PHOTO_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def start_upload(item, owner, size):
+    os.makedirs(settings.PHOTO_UPLOAD_DIR, exist_ok=True)
+    upload = PhotoUpload.objects.create(item=item, owner=owner, size=size)
+    # Created empty; chunks are written into it in place
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream):
+    """Append the request body at `offset`. Returns the new committed offset."""
+    if offset != upload.received:
+        raise UploadError(f"Chunk must start at offset {upload.received}.", status_code=409)
+    remaining = upload.size - offset
+
+    # Received into a file of its own: a slow client holds no lock meanwhile
+    chunk_path = f"{part_path(upload)}.{uuid.uuid4().hex}"
+    written = 0
+    try:
+        with open(chunk_path, 'wb') as chunk:
+            while stream is not None:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > remaining:
+                    raise UploadError(f"Chunk goes past the declared size of {upload.size} bytes.")
+                chunk.write(block)
+
+        new_offset = offset + written
+        with transaction.atomic():
+            # Only the first of two racing chunks for the same offset is committed
+            locked = PhotoUpload.objects.select_for_update().filter(pk=upload.pk, received=offset).exists()
+            if not locked:
+                raise UploadError("Another chunk was committed at this offset.", status_code=409)
+            with open(chunk_path, 'rb') as chunk, open(part_path(upload), 'r+b') as part:
+                part.seek(offset)
+                # Drop anything left over from an earlier chunk that failed midway
+                part.truncate()
+                shutil.copyfileobj(chunk, part, COPY_BLOCK_SIZE)
+            PhotoUpload.objects.filter(pk=upload.pk).update(received=new_offset)
+    finally:
+        try:
+            os.remove(chunk_path)
+        except FileNotFoundError:
+            pass
+    upload.received = new_offset
+    return new_offset
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discard_upload(upload):
+    """Abandon an upload and delete its partial file."""
+    PhotoUpload.objects.filter(pk=upload.pk).delete()
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def finalize_upload(upload):
+    """Turn a complete upload into an ItemPhoto. Returns (photo, created)."""
+    if upload.received != upload.size:
+        raise UploadError(f"Upload incomplete: {upload.received} of {upload.size} bytes received.", status_code=409)
+    path = part_path(upload)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        discard_upload(upload)
+        raise UploadError("The uploaded file is not an image.")
+
+    content_hash = _file_hash(path)
+    # The same bytes already processed for another item: reuse its (content-hashed) files
+    processed = ItemPhoto.objects.filter(content_hash=content_hash).exclude(image='').first()
+    try:
+        with transaction.atomic():
+            # Claim the upload, so finalizing it twice at once creates one photo
+            if not PhotoUpload.objects.filter(pk=upload.pk).delete()[0]:
+                raise UploadError("This upload has already been finalized.", status_code=409)
+            photo, created = ItemPhoto.objects.get_or_create(
+                item_id=upload.item_id,
+                content_hash=content_hash,
+                defaults={
+                    'image': processed.image.name if processed else '',
+                    'thumbnails': processed.thumbnails if processed else {},
+                },
+            )
+    except IntegrityError:
+        # The same photo, uploaded twice and finalized at the same time
+        discard_upload(upload)
+        return ItemPhoto.objects.get(item_id=upload.item_id, content_hash=content_hash), False
+
+    if created and not processed:
+        # The partial file now belongs to the photo (process_photo deletes it)
+        transaction.on_commit(lambda: thumbnails.submit(process_photo, photo.pk, path))
+    else:
+        os.remove(path)
+    return photo, created
+
+
+def process_photo(photo_id, path):
+    try:
+        original, sizes = thumbnails.create_derivatives(path, crop=False)
+        ItemPhoto.objects.filter(pk=photo_id).update(image=original, thumbnails=sizes)
+        # update() skips post_save: the item's cached responses show the photo
+        item_id = ItemPhoto.objects.filter(pk=photo_id).values_list('item_id', flat=True).first()
+        if item_id is not None:
+            response_cache.invalidate(Item, item_id)
+    finally:
+        os.remove(path)
+
+
+def purge_stale_uploads(max_age=timedelta(days=1)):
+    """Delete uploads that were started but never finalized. Returns how many."""
+    stale = list(PhotoUpload.objects.filter(created_at__lt=timezone.now() - max_age))
+    for upload in stale:
+        discard_upload(upload)
+    return len(stale)
@@ -1,11 +1,258 @@
-from rest_framework import viewsets
-from .models import Item, Availability
-from .serializers import ItemSerializer, AvailabilitySerializer
+from datetime import timedelta
 
-class ItemViewSet(viewsets.ModelViewSet):
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, UnsupportedMediaType
+from rest_framework.response import Response
+from lending.calendar import clip_spans, free_spans, get_calendar, build_spans
+from lending.models import LendingRequest
+from nas_project.eager_loading import EagerLoadingMixin, setup_eager_loading
+from nas_project.pagination import CreatedAtKeysetPagination, RankedResultsPagination
+from nas_project.response_cache import CachedListMixin, CachedRetrieveMixin, model_version, object_version
+from . import bulk, uploads
+from .filters import free_between
+from .models import Item, Availability, ItemPhoto, PhotoUpload
+from .search import search_item_ids
+from .serializers import (
+    ItemSerializer, AvailabilitySerializer, CalendarRangeSerializer,
+    FreeDatesFilterSerializer, ItemSearchSerializer, ItemPhotoSerializer,
+    PhotoUploadSerializer,
+)
+
+UUID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+
+class ItemViewSet(CachedListMixin, CachedRetrieveMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Item.objects.all()  # Make sure this exists
     serializer_class = ItemSerializer
+    # Newest items first, paginated by cursor (no COUNT(*) over the catalogue)
+    pagination_class = CreatedAtKeysetPagination
+    # Only request.user's id is needed: authenticate from the token claims (users/authentication.py)
+    claims_only_user = True
+
+    def get_cache_dependencies(self):
+        # Responses show the owner's username too: items/signals.py retires
+        # the owner's items when it changes
+        if self.action == 'retrieve':
+            return [object_version(Item, self.kwargs['pk'])]
+        dependencies = [model_version(Item)]
+        if 'free_from' in self.request.query_params:
+            # Which items are free depends on blocks and bookings as well
+            dependencies += [model_version(Availability), model_version(LendingRequest)]
+        return dependencies
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # GET /api/items/?free_from=YYYY-MM-DD&free_to=YYYY-MM-DD
+        # Only items that can be borrowed for the whole window
+        if self.action == 'list':
+            params = FreeDatesFilterSerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            if params.validated_data:
+                queryset = free_between(
+                    queryset,
+                    params.validated_data['free_from'],
+                    params.validated_data['free_to'],
+                )
+        return queryset
+
+    # POST /api/items/bulk/  (Content-Type: application/x-ndjson or text/csv)
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many items owned by the requesting user from one streamed
+        NDJSON or CSV body. Rows are validated and inserted in chunks; the
+        response reports how many were created and the errors per failed row.
+        """
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type in bulk.NDJSON_CONTENT_TYPES:
+            iter_rows = bulk.iter_ndjson_rows
+        elif content_type in bulk.CSV_CONTENT_TYPES:
+            iter_rows = bulk.iter_csv_rows
+        else:
+            raise UnsupportedMediaType(content_type)
+
+        # Read the raw body line by line instead of request.data, which would
+        # parse (and hold) the whole upload at once.
+        stream = request.stream or []
+        report = bulk.import_items(iter_rows(stream), self.get_serializer_context())
+
+        response_status = status.HTTP_201_CREATED if report.created else status.HTTP_400_BAD_REQUEST
+        return Response(report.as_dict(), status=response_status)
+
+    # GET /api/items/export/?output=ndjson|csv
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the requesting user's items as NDJSON (default) or CSV, reading
+        them from the database in chunks.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            raise serializers.ValidationError({'output': "Must be 'ndjson' or 'csv'."})
+
+        rows = bulk.export_rows(Item.objects.filter(owner=request.user))
+        if output == 'csv':
+            response = StreamingHttpResponse(bulk.iter_csv(rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(bulk.iter_ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="items.{output}"'
+        return response
+
+    # GET /api/items/search/?q=&location=&condition=&available=
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Relevance-ranked full-text search over name, description, location and
+        condition, served by the database's full-text index (see items/search.py).
+        """
+        params = ItemSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        query = filters.pop('q')
+
+        paginator = RankedResultsPagination()
+        ids = paginator.paginate_results(
+            lambda limit, offset: search_item_ids(query, filters, limit=limit, offset=offset),
+            request,
+        )
+
+        # Load the page in one query and put it back in relevance order
+        items = setup_eager_loading(Item.objects.filter(pk__in=ids), ItemSerializer).in_bulk()
+        page = [items[pk] for pk in ids if pk in items]
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    # GET /api/items/{id}/calendar/?from=YYYY-MM-DD&to=YYYY-MM-DD
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        """
+        Free and busy date spans for one item, read from its materialized
+        calendar (a single row) instead of querying blocks and bookings per day.
+        """
+        item = self.get_object()
+
+        params = CalendarRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start = params.validated_data.get('from') or timezone.localdate()
+        end = params.validated_data.get('to') or start + timedelta(days=30)
+        if end < start:
+            raise serializers.ValidationError({'to': "'to' date must not be before 'from' date."})
+
+        calendar = get_calendar(item.pk)
+        blocked = clip_spans(calendar.blocked, start, end)
+        booked = clip_spans(calendar.booked, start, end)
+        busy = (
+            [{'from': s, 'to': e, 'reason': 'blocked'} for s, e in blocked]
+            + [{'from': s, 'to': e, 'reason': 'booked'} for s, e in booked]
+        )
+        busy.sort(key=lambda span: span['from'])
+
+        return Response({
+            'item': item.pk,
+            'from': start,
+            'to': end,
+            'busy': busy,
+            'free': [
+                {'from': s, 'to': e}
+                for s, e in free_spans(build_spans(blocked + booked), start, end)
+            ],
+        })
+
+    # -----------------------------------------------------------------
+    # Photos (resumable chunked uploads, see items/uploads.py)
+    # -----------------------------------------------------------------
+
+    def _owned_item(self, pk):
+        # Just the columns needed for the ownership check
+        item = get_object_or_404(Item.objects.only('pk', 'owner_id'), pk=pk)
+        if item.owner_id != self.request.user.pk:
+            raise PermissionDenied("Only the item owner can change its photos.")
+        return item
+
+    def _upload(self, pk, upload_id):
+        return get_object_or_404(PhotoUpload, pk=upload_id, item_id=pk, owner=self.request.user)
+
+    # GET /api/items/{id}/photos/
+    @action(detail=True, methods=['get'], serializer_class=ItemPhotoSerializer, pagination_class=None)
+    def photos(self, request, pk=None):
+        item = get_object_or_404(Item.objects.only('pk'), pk=pk)
+        return Response(self.get_serializer(item.photos.all(), many=True).data)
+
+    # DELETE /api/items/{id}/photos/{photo_id}/
+    @action(detail=True, methods=['delete'], url_path=r'photos/(?P<photo_id>[0-9]+)')
+    def photo(self, request, pk=None, photo_id=None):
+        item = self._owned_item(pk)
+        # The (content-hashed, possibly shared) files are left in place
+        get_object_or_404(ItemPhoto, pk=photo_id, item=item).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    # POST /api/items/{id}/photos/uploads/  {"size": <bytes>}
+    @action(detail=True, methods=['post'], url_path='photos/uploads', serializer_class=PhotoUploadSerializer)
+    def photo_uploads(self, request, pk=None):
+        """Start a resumable upload of one photo of `size` bytes."""
+        item = self._owned_item(pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = uploads.start_upload(item, request.user, serializer.validated_data['size'])
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+    # GET/PATCH/DELETE /api/items/{id}/photos/uploads/{upload_id}/
+    @action(
+        detail=True, methods=['get', 'patch', 'delete'],
+        url_path=rf'photos/uploads/(?P<upload_id>{UUID_PATTERN})',
+        serializer_class=PhotoUploadSerializer,
+    )
+    def photo_upload(self, request, pk=None, upload_id=None):
+        """
+        GET: the offset to resume from. DELETE: abandon the upload.
+        PATCH: write the raw request body at the offset given in the
+        Upload-Offset header (or ?offset=), which must be the current offset.
+        """
+        upload = self._upload(pk, upload_id)
+        if request.method == 'DELETE':
+            uploads.discard_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'PATCH':
+            raw_offset = request.headers.get('Upload-Offset', request.query_params.get('offset'))
+            try:
+                offset = int(raw_offset)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError({'offset': "Send the chunk's offset in the Upload-Offset header."})
+            try:
+                # request.stream, not request.data: the body is copied to disk
+                # block by block instead of being parsed into memory
+                uploads.write_chunk(upload, offset, request.stream)
+            except uploads.UploadError as error:
+                return Response(
+                    {'detail': error.detail, 'offset': upload.received}, status=error.status_code,
+                )
+        return Response(self.get_serializer(upload).data)
+
+    # POST /api/items/{id}/photos/uploads/{upload_id}/finalize/
+    @action(
+        detail=True, methods=['post'],
+        url_path=rf'photos/uploads/(?P<upload_id>{UUID_PATTERN})/finalize',
+        serializer_class=ItemPhotoSerializer,
+    )
+    def finalize_photo_upload(self, request, pk=None, upload_id=None):
+        """
+        Turn a complete upload into a photo of the item. Thumbnails appear once
+        it has been processed; uploading the same photo again returns the
+        existing one (200 instead of 201).
+        """
+        upload = self._upload(pk, upload_id)
+        try:
+            photo, created = uploads.finalize_upload(upload)
+        except uploads.UploadError as error:
+            return Response({'detail': error.detail}, status=error.status_code)
+        return Response(
+            self.get_serializer(photo).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
-class AvailabilityViewSet(viewsets.ModelViewSet):
+class AvailabilityViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Availability.objects.all()  # Make sure this exists
-    serializer_class = AvailabilitySerializer
\ No newline at end of file
+    serializer_class = AvailabilitySerializer
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LendingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lending'
+
+    def ready(self):
+        # Keep the materialized ItemCalendar in sync (see lending/signals.py)
+        from . import signals  # noqa: F401
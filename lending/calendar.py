@@ -0,0 +1,176 @@
+# lending/calendar.py
+"""
+Interval logic and maintenance for the materialized ItemCalendar.
+
+Spans are stored as [from, to] pairs of ISO date strings, both ends inclusive,
+sorted and merged so that no two spans overlap or touch. ISO strings sort the
+same way as the dates they represent, so lookups are a plain binary search.
+
+Maintenance strategy (wired up in lending/signals.py):
+- New blocks/bookings are merged into the stored list in place.
+- Anything that can shrink a list (deletes, date edits, status leaving the
+  active set) drops the calendar row; it is rebuilt from the source tables
+  the next time it is read.
+
+A writer that has already read and locked a calendar (lending/booking.py)
+holds it with holding_calendar(), so the span its save adds is merged into
+that row instead of reading it again.
+"""
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, timedelta
+from operator import itemgetter
+
+from django.db import transaction
+
+from items.models import Availability
+from .models import ACTIVE_STATUSES, ItemCalendar, LendingRequest
+
+ONE_DAY = timedelta(days=1)
+
+_span_start = itemgetter(0)
+_span_end = itemgetter(1)
+
+# The calendar row locked by the current writer (see holding_calendar())
+_held_calendar = ContextVar('held_calendar', default=None)
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+# -------------------------------------------------------------
+# Pure interval helpers (operate on lists of [from, to] ISO pairs)
+# -------------------------------------------------------------
+
+def merge_span(spans, start, end):
+    """Return a new span list with [start, end] merged in."""
+    start, end = date.fromisoformat(_iso(start)), date.fromisoformat(_iso(end))
+    # Spans that overlap or touch [start, end] form one contiguous run [i, j).
+    i = bisect_left(spans, (start - ONE_DAY).isoformat(), key=_span_end)
+    j = bisect_right(spans, (end + ONE_DAY).isoformat(), key=_span_start)
+    if i < j:
+        start = min(start, date.fromisoformat(spans[i][0]))
+        end = max(end, date.fromisoformat(spans[j - 1][1]))
+    return spans[:i] + [[start.isoformat(), end.isoformat()]] + spans[j:]
+
+
+def build_spans(pairs):
+    """Sort and merge an iterable of (from, to) dates into a span list."""
+    spans = []
+    for start, end in sorted((_iso(start), _iso(end)) for start, end in pairs):
+        if spans and date.fromisoformat(start) - ONE_DAY <= date.fromisoformat(spans[-1][1]):
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+
+def overlaps(spans, start, end):
+    """True if [start, end] intersects any span. O(log n)."""
+    j = bisect_right(spans, _iso(end), key=_span_start)
+    return j > 0 and spans[j - 1][1] >= _iso(start)
+
+
+def clip_spans(spans, start, end):
+    """The parts of the spans that fall inside [start, end]."""
+    start, end = _iso(start), _iso(end)
+    i = bisect_left(spans, start, key=_span_end)
+    j = bisect_right(spans, end, key=_span_start)
+    return [[max(span[0], start), min(span[1], end)] for span in spans[i:j]]
+
+
+def free_spans(busy, start, end):
+    """The gaps between sorted, merged busy spans inside [start, end]."""
+    free = []
+    cursor = date.fromisoformat(_iso(start))
+    end = date.fromisoformat(_iso(end))
+    for span_start, span_end in busy:
+        span_start, span_end = date.fromisoformat(span_start), date.fromisoformat(span_end)
+        if span_start > cursor:
+            free.append([cursor.isoformat(), min(span_start - ONE_DAY, end).isoformat()])
+        cursor = max(cursor, span_end + ONE_DAY)
+        if cursor > end:
+            break
+    if cursor <= end:
+        free.append([cursor.isoformat(), end.isoformat()])
+    return free
+
+
+# -------------------------------------------------------------
+# Calendar rows
+# -------------------------------------------------------------
+
+def rebuild_calendar(item_id):
+    """Recompute an item's calendar from Availability and LendingRequest rows."""
+    blocked = build_spans(
+        Availability.objects.filter(item_id=item_id)
+        .values_list('unavailable_from', 'unavailable_to')
+    )
+    booked = build_spans(
+        LendingRequest.objects.filter(item_id=item_id, status__in=ACTIVE_STATUSES)
+        .values_list('requested_from', 'requested_to')
+    )
+    calendar, _ = ItemCalendar.objects.update_or_create(
+        item_id=item_id, defaults={'blocked': blocked, 'booked': booked},
+    )
+    return calendar
+
+
+def get_calendar(item_id):
+    """Load an item's calendar (one query), rebuilding it if it was invalidated."""
+    calendar = ItemCalendar.objects.filter(item_id=item_id).first()
+    return calendar if calendar is not None else rebuild_calendar(item_id)
+
+
+def lock_calendar(item_id):
+    """
+    Load an item's calendar with its row locked until the end of the
+    transaction (SELECT ... FOR UPDATE), rebuilding it if it was invalidated.
+    """
+    calendar = ItemCalendar.objects.select_for_update().filter(item_id=item_id).first()
+    return calendar if calendar is not None else rebuild_calendar(item_id)
+
+
+@contextmanager
+def holding_calendar(calendar):
+    """Spans added to calendar's item within the block are merged into `calendar` (locked by the caller)."""
+    token = _held_calendar.set(calendar)
+    try:
+        yield calendar
+    finally:
+        _held_calendar.reset(token)
+
+
+def invalidate_calendar(item_id):
+    """Drop the stored calendar; the next get_calendar() rebuilds it."""
+    calendar = _held_calendar.get()
+    if calendar is not None and calendar.item_id == item_id:
+        # The held row is gone: merging into it would write nothing
+        _held_calendar.set(None)
+    ItemCalendar.objects.filter(item_id=item_id).delete()
+
+
+def _add_span(item_id, field, start, end):
+    calendar = _held_calendar.get()
+    if calendar is not None and calendar.item_id == item_id:
+        setattr(calendar, field, merge_span(getattr(calendar, field), start, end))
+        calendar.save(update_fields=[field, 'updated_at'])
+        return
+    with transaction.atomic():
+        calendar = ItemCalendar.objects.select_for_update().filter(item_id=item_id).first()
+        if calendar is None:
+            # Nothing stored yet: the rebuild picks up the new row as well.
+            rebuild_calendar(item_id)
+            return
+        setattr(calendar, field, merge_span(getattr(calendar, field), start, end))
+        calendar.save(update_fields=[field, 'updated_at'])
+
+
+def add_blocked_span(item_id, start, end):
+    _add_span(item_id, 'blocked', start, end)
+
+
+def add_booked_span(item_id, start, end):
+    _add_span(item_id, 'booked', start, end)
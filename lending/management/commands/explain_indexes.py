@@ -0,0 +1,116 @@
+"""
+Run EXPLAIN on the hot lending and messaging queries.
+
+Usage:
+    python manage.py explain_indexes
+    python manage.py explain_indexes --item 42 --user 7
+
+Prints the database's query plan for each query and whether it uses the
+composite index that was added for it, so we can keep an eye on the plans
+as the tables grow.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from items.models import Item
+from lending.models import ACTIVE_STATUSES, LendingRequest
+from messaging.models import Conversation, Message
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the lending overlap and message inbox queries and check their indexes are used."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item', type=int, help="Item id to use in the overlap queries (default: first item).")
+        parser.add_argument('--user', type=int, help="User id to use in the inbox queries (default: first user).")
+
+    def handle(self, *args, **options):
+        item = self._get(Item, options['item'])
+        user = self._get(User, options['user'])
+
+        conversation_id = Conversation.objects.filter(participants__user=user).values_list('pk', flat=True).first()
+
+        requested_from = timezone.localdate()
+        requested_to = requested_from + timedelta(days=7)
+
+        # (label, queryset, index names that count as "served by an index")
+        queries = [
+            (
+                "Lending request overlap check",
+                item.lending_requests.filter(
+                    status__in=ACTIVE_STATUSES,
+                    requested_from__lte=requested_to,
+                    requested_to__gte=requested_from,
+                ),
+                ['lending_item_status_dates_idx'],
+            ),
+            (
+                "Owner block (Availability) overlap check",
+                item.availabilities.filter(
+                    unavailable_from__lte=requested_to,
+                    unavailable_to__gte=requested_from,
+                ),
+                ['avail_item_dates_idx'],
+            ),
+            (
+                "Unread inbox",
+                Message.objects.filter(recipient=user, is_read=False).order_by('-time_stamp'),
+                ['msg_recipient_unread_idx'],
+            ),
+            (
+                "Sent messages",
+                Message.objects.filter(sender=user).order_by('-time_stamp'),
+                ['msg_sender_time_idx'],
+            ),
+            (
+                "All messages (MessageViewSet)",
+                Message.objects.filter(participants__user=user).order_by('-participants__time_stamp'),
+                ['msg_part_user_time_idx'],
+            ),
+            (
+                "All lending requests (LendingRequestViewSet)",
+                LendingRequest.objects.filter(participants__user=user).order_by('-participants__created_at'),
+                ['lending_part_user_created_idx'],
+            ),
+            (
+                "One conversation thread",
+                Message.objects.filter(conversation_id=conversation_id).order_by('-time_stamp'),
+                ['msg_conversation_time_idx'],
+            ),
+            (
+                "Conversation list",
+                Conversation.objects.filter(participants__user=user).order_by('-participants__last_message_at'),
+                ['conv_part_user_recent_idx'],
+            ),
+        ]
+
+        missing = 0
+        for label, queryset, index_names in queries:
+            plan = queryset.explain()
+            used = [name for name in index_names if name in plan]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"  uses {', '.join(used)}\n"))
+            else:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"  does NOT use {' or '.join(index_names)}\n"))
+
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"{missing} quer{'y' if missing == 1 else 'ies'} not served by the expected index. "
+                "On small tables the planner may prefer a scan; run ANALYZE and check again."
+            ))
+
+    def _get(self, model, pk):
+        queryset = model.objects.order_by('pk')
+        obj = queryset.filter(pk=pk).first() if pk else queryset.first()
+        if obj is None:
+            raise CommandError(f"No {model._meta.verbose_name} found to build the queries with.")
+        return obj
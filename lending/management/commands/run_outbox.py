@@ -0,0 +1,45 @@
+"""
+Dispatch pending lending outbox events (see lending/outbox.py).
+
+Usage:
+    python manage.py run_outbox                  # one pass, then exit
+    python manage.py run_outbox --loop           # keep polling (daemon)
+    python manage.py run_outbox --loop --interval 0.5 --batch-size 200
+
+Needed as a daemon when OUTBOX_DISPATCH = 'command'. With the default
+in-process dispatch it is still worth running from cron now and then, to
+retry failed events and pick up any left behind by a crashed process.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lending.outbox import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Dispatch pending lending outbox events (notification messages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Events claimed per pass.")
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processed = dispatch_pending(batch_size=options['batch_size'])
+                total += processed
+                if processed:
+                    self.stdout.write(f"Dispatched {processed} event(s).")
+                if not options['loop']:
+                    break
+                if processed < options['batch_size']:
+                    # Caught up: wait for more work
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} event(s) dispatched."))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0002_availability_item_dates_index'),
+        ('lending', '0002_alter_lendingrequest_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lendingrequest',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lending_requests', to='items.item', verbose_name='Requested Item'),
+        ),
+        migrations.AddIndex(
+            model_name='lendingrequest',
+            index=models.Index(fields=['item', 'status', 'requested_from', 'requested_to'], name='lending_item_status_dates_idx'),
+        ),
+    ]
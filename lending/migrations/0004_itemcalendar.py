@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0002_availability_item_dates_index'),
+        ('lending', '0003_lendingrequest_overlap_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemCalendar',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calendar', serialize=False, to='items.item')),
+                ('blocked', models.JSONField(blank=True, default=list)),
+                ('booked', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Item Calendar',
+                'verbose_name_plural': 'Item Calendars',
+            },
+        ),
+    ]
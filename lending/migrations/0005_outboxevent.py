@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0004_itemcalendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('lending_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox_events', to='lending.lendingrequest')),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['available_at'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_item_updated_index'),
+        ('lending', '0005_outboxevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lendingrequest',
+            index=models.Index(fields=['updated_at', 'id'], name='lending_updated_idx'),
+        ),
+    ]
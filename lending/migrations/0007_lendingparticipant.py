@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participants(apps, schema_editor):
+    """One participant row per borrower and per (different) item owner, in one INSERT ... SELECT."""
+    LendingRequest = apps.get_model('lending', 'LendingRequest')
+    LendingParticipant = apps.get_model('lending', 'LendingParticipant')
+    Item = apps.get_model('items', 'Item')
+    quote = schema_editor.quote_name
+    request, participant, item = (
+        quote(LendingRequest._meta.db_table), quote(LendingParticipant._meta.db_table), quote(Item._meta.db_table),
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {participant} (lending_request_id, user_id, created_at) "
+            f"SELECT id, borrower_id, created_at FROM {request} "
+            f"UNION ALL SELECT r.id, i.owner_id, r.created_at FROM {request} r "
+            f"JOIN {item} i ON i.id = r.item_id WHERE i.owner_id <> r.borrower_id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0006_lendingrequest_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LendingParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('lending_request', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='lending.lendingrequest')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', 'lending_request'], name='lending_part_user_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('lending_request', 'user'), name='unique_lending_participant')],
+            },
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
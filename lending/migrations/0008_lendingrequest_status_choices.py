@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0007_lendingparticipant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lendingrequest',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved by Owner'), ('DENIED', 'Denied by Owner'), ('CANCELLED', 'Cancelled by Borrower'), ('ON_LOAN', 'Handed Over to Borrower'), ('COMPLETED', 'Returned and Completed')], default='PENDING', max_length=10, verbose_name='Request Status'),
+        ),
+    ]
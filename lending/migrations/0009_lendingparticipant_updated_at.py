@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_updated_at(apps, schema_editor):
+    """Each participant row takes its request's updated_at."""
+    LendingRequest = apps.get_model('lending', 'LendingRequest')
+    LendingParticipant = apps.get_model('lending', 'LendingParticipant')
+    LendingParticipant.objects.update(updated_at=models.Subquery(
+        LendingRequest.objects.filter(pk=models.OuterRef('lending_request_id')).values('updated_at'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0008_lendingrequest_status_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lendingparticipant',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lendingparticipant',
+            index=models.Index(fields=['user', 'updated_at', 'lending_request'], name='lending_part_user_updated_idx'),
+        ),
+    ]
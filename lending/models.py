@@ -4,15 +4,22 @@ from django.core.validators import MinValueValidator
 from django.utils import timezone
 from items.models import Item  # Assuming Item model is in the 'items' app
 
-# --- Status Choices (SIMPLIFIED per instructions) ---
-# Defines the core lifecycle stages of a lending request.
+# --- Status Choices ---
+# Defines the core lifecycle stages of a lending request. Requests move
+# between them only through the transitions in lending/transitions.py.
 STATUS_CHOICES = [
     ('PENDING', 'Pending Approval'),
     ('APPROVED', 'Approved by Owner'),
     ('DENIED', 'Denied by Owner'),
+    ('CANCELLED', 'Cancelled by Borrower'),
+    ('ON_LOAN', 'Handed Over to Borrower'),
     ('COMPLETED', 'Returned and Completed'),
 ]
 
+# Statuses that hold the item for the requested dates (used by overlap checks
+# and by the materialized ItemCalendar).
+ACTIVE_STATUSES = ['PENDING', 'APPROVED', 'ON_LOAN']
+
 class LendingRequest(models.Model):
     """
     Model to track the entire lending/borrowing transaction for an Item.
@@ -26,6 +33,8 @@ class LendingRequest(models.Model):
         on_delete=models.CASCADE,
         related_name='lending_requests',
         verbose_name='Requested Item',
+        # No single-column index: lending_item_status_dates_idx starts with item
+        db_index=False,
     )
     
     # The user requesting to borrow the Item. (FK to the custom User model)
@@ -92,6 +101,16 @@ class LendingRequest(models.Model):
         verbose_name = 'Lending Request'
         verbose_name_plural = 'Lending Requests'
         ordering = ['-created_at']
+        indexes = [
+            # Serves the overlapping-request check in LendingRequestSerializer.validate()
+            models.Index(
+                fields=['item', 'status', 'requested_from', 'requested_to'],
+                name='lending_item_status_dates_idx',
+            ),
+            # Changes since a given time, site-wide; a user's own are read
+            # through lending_part_user_updated_idx (sync/changes.py)
+            models.Index(fields=['updated_at', 'id'], name='lending_updated_idx'),
+        ]
         # Optional constraint to prevent a user from requesting the same item for overlapping dates
         # constraints = [
         #     models.UniqueConstraint(
@@ -103,6 +122,13 @@ class LendingRequest(models.Model):
     def __str__(self):
         """String representation for the Django Admin and debugging."""
         return f"Request for '{self.item.name}' by {self.borrower.username} - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database so signal handlers can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
     
     def save(self, *args, **kwargs):
         """Override save to auto-set timestamps based on status changes."""
@@ -114,4 +140,146 @@ class LendingRequest(models.Model):
         if self.status == 'COMPLETED' and not self.returned_at:
             self.returned_at = timezone.now()
             
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class LendingParticipant(models.Model):
+    """
+    One row per user a LendingRequest concerns (its borrower and the item's
+    owner), so "my requests" is a single equality lookup on
+    lending_part_user_created_idx instead of an OR across the borrower and
+    a join to the item's owner. created_at is copied from the request so the
+    same index also returns them newest first, and updated_at so delta sync
+    reads a user's changed requests from lending_part_user_updated_idx. Kept
+    in sync by lending/signals.py (and lending/transitions.py, whose
+    update() skips the signals).
+    """
+    lending_request = models.ForeignKey(
+        LendingRequest,
+        on_delete=models.CASCADE,
+        related_name='participants',
+        # No single-column index: unique_lending_participant starts with lending_request
+        db_index=False,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # No single-column index: lending_part_user_created_idx starts with user
+        db_index=False,
+    )
+    created_at = models.DateTimeField()
+    # The request's updated_at, or when the user became a participant if later
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lending_request', 'user'], name='unique_lending_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'lending_request'], name='lending_part_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'lending_request'], name='lending_part_user_updated_idx'),
+        ]
+
+    @classmethod
+    def sync_for(cls, lending_requests, created=False):
+        """Make the requests' participant rows match their borrower and item owner."""
+        rows = []
+        stale = models.Q()
+        # A user who joins an existing request has to see it as changed now
+        now = timezone.now()
+        for lending_request in lending_requests:
+            user_ids = {lending_request.borrower_id, lending_request.item.owner_id}
+            stale |= models.Q(lending_request=lending_request) & ~models.Q(user_id__in=user_ids)
+            rows += [
+                cls(
+                    lending_request=lending_request, user_id=user_id, created_at=lending_request.created_at,
+                    updated_at=lending_request.updated_at if created else now,
+                )
+                for user_id in user_ids
+            ]
+        if not rows:
+            return
+        if not created:
+            cls.objects.filter(stale).delete()
+        cls.objects.bulk_create(rows, ignore_conflicts=True)
+
+    @classmethod
+    def touch(cls, lending_request_id, updated_at):
+        """Copy a change of the request's updated_at to its participant rows."""
+        cls.objects.filter(lending_request_id=lending_request_id).update(updated_at=updated_at)
+
+
+class ItemCalendar(models.Model):
+    """
+    Materialized booking calendar for one Item.
+
+    Holds two sorted lists of merged, non-overlapping [from, to] date spans
+    (ISO strings, both ends inclusive):
+    - 'blocked': the owner's Availability blocks
+    - 'booked': PENDING/APPROVED/ON_LOAN lending requests
+
+    A conflict check is a single-row lookup plus a binary search, instead of
+    two range queries. The lists are kept up to date by the signal handlers in
+    lending/signals.py; see lending/calendar.py for the interval logic.
+    """
+    item = models.OneToOneField(
+        Item,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='calendar',
+    )
+    blocked = models.JSONField(default=list, blank=True)
+    booked = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Item Calendar'
+        verbose_name_plural = 'Item Calendars'
+
+    def __str__(self):
+        return f"Calendar for item #{self.item_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Transactional outbox: a side effect (e.g. a notification message) to run
+    after a lending change, written in the same transaction as the change
+    itself. The dispatcher in lending/outbox.py picks events up afterwards,
+    so the request doesn't wait for them, and a committed change is never
+    missing its notification.
+
+    Pending events have processed_at = NULL. available_at is when the event
+    may next be picked up: dispatchers push it forward to claim an event (a
+    lease) and to back off after a failure.
+    """
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    lending_request = models.ForeignKey(
+        LendingRequest,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_events',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            # Only pending events are ever scanned by the dispatcher
+            models.Index(
+                fields=['available_at'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        state = 'processed' if self.processed_at else f'pending ({self.attempts} attempts)'
+        return f"{self.kind} #{self.pk} - {state}"
@@ -0,0 +1,197 @@
+# lending/outbox.py
+"""
+Transactional outbox for lending side effects (see OutboxEvent).
+
+Writers call enqueue() inside the transaction that makes the change. Once it
+commits, the event is handed to a dispatcher:
+- OUTBOX_DISPATCH = 'thread' (default): a small in-process thread pool runs
+  dispatch_pending() right after the commit.
+- OUTBOX_DISPATCH = 'command': nothing runs in the web process; a
+  `python manage.py run_outbox --loop` daemon polls for pending events.
+Either way, `run_outbox` also picks up anything a crashed process left behind.
+
+Each event is claimed with a conditional UPDATE (a lease on available_at), so
+any number of dispatchers can run side by side, and its handler commits in
+the same transaction that marks it processed, so it takes effect exactly once.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+STATUS_MESSAGE = 'lending.status_message'
+
+# How long a claimed event is reserved for the dispatcher that claimed it
+CLAIM_LEASE = timedelta(minutes=5)
+RETRY_BASE_DELAY = timedelta(seconds=5)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+HANDLERS = {}
+
+_executor = None
+
+
+def handler(kind):
+    """Register the function that carries out events of `kind`."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class _AlreadyProcessed(Exception):
+    pass
+
+
+# -------------------------------------------------------------
+# Writing events
+# -------------------------------------------------------------
+
+def enqueue(kind, payload, lending_request=None):
+    """Write an event in the current transaction; dispatch it after commit."""
+    event = OutboxEvent.objects.create(kind=kind, payload=payload, lending_request=lending_request)
+    transaction.on_commit(kick)
+    return event
+
+
+def kick():
+    """Start a dispatch in the background, if this process dispatches at all."""
+    if settings.OUTBOX_DISPATCH != 'thread':
+        return
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.OUTBOX_THREADS, thread_name_prefix='outbox')
+    _executor.submit(_dispatch_in_thread)
+
+
+def _dispatch_in_thread():
+    try:
+        dispatch_pending()
+    except Exception:
+        logger.exception("Outbox dispatch failed")
+    finally:
+        # Pool threads outlive requests: don't keep a connection per thread open
+        connection.close()
+
+
+# -------------------------------------------------------------
+# Dispatching
+# -------------------------------------------------------------
+
+def _claim(event_id, now):
+    """Reserve a pending event for this dispatcher. False if someone else has it."""
+    return bool(
+        OutboxEvent.objects.filter(pk=event_id, processed_at__isnull=True, available_at__lte=now)
+        .update(available_at=now + CLAIM_LEASE, attempts=F('attempts') + 1)
+    )
+
+
+def _retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def dispatch_pending(batch_size=100):
+    """Run up to batch_size due events. Returns how many were processed."""
+    now = timezone.now()
+    due = (
+        OutboxEvent.objects
+        .filter(processed_at__isnull=True, available_at__lte=now, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+        .order_by('available_at', 'pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    processed = 0
+    for event_id in list(due):
+        if not _claim(event_id, now):
+            continue
+        event = OutboxEvent.objects.get(pk=event_id)
+        try:
+            with transaction.atomic():
+                HANDLERS[event.kind](event)
+                done = OutboxEvent.objects.filter(pk=event_id, processed_at__isnull=True).update(
+                    processed_at=timezone.now(), last_error='',
+                )
+                if not done:
+                    # Our lease ran out and another dispatcher finished it first
+                    raise _AlreadyProcessed
+        except _AlreadyProcessed:
+            continue
+        except Exception as exc:
+            logger.exception("Outbox event %s (%s) failed", event_id, event.kind)
+            OutboxEvent.objects.filter(pk=event_id, processed_at__isnull=True).update(
+                available_at=timezone.now() + _retry_delay(event.attempts),
+                last_error=repr(exc)[:2000],
+            )
+            continue
+        processed += 1
+    return processed
+
+
+# -------------------------------------------------------------
+# Lending status notifications
+# -------------------------------------------------------------
+
+def status_notification(lending_request, old_status, actor):
+    """
+    The message (sender, recipient, content) telling the other party about a
+    status change made by `actor`, or None if the change needs no message.
+    """
+    if old_status == lending_request.status:
+        return None
+    item = lending_request.item
+    new_status = lending_request.status
+
+    # 1. OWNER Actions: APPROVED/DENIED
+    if new_status in ['APPROVED', 'DENIED']:
+        return item.owner, lending_request.borrower, \
+            f"Your request for '{item.name}' has been **{new_status}** by the owner."
+
+    # 2. RETURN Action: COMPLETED (Can be triggered by owner or borrower)
+    if new_status == 'COMPLETED':
+        # The person who didn't mark it complete gets notified
+        if actor == lending_request.borrower:
+            sender, recipient, who = lending_request.borrower, item.owner, "the borrower"
+        else:
+            sender, recipient, who = item.owner, lending_request.borrower, "the owner"
+        return sender, recipient, f"The item '{item.name}' has been marked as **RETURNED** by {who}."
+
+    # 3. CANCELLED Action (Usually triggered by borrower)
+    if new_status == 'CANCELLED':
+        return lending_request.borrower, item.owner, \
+            f"The request for '{item.name}' was CANCELLED by the borrower."
+    return None
+
+
+def enqueue_status_notification(lending_request, old_status, actor):
+    """Queue the status change message (if any) in the current transaction."""
+    notification = status_notification(lending_request, old_status, actor)
+    if notification is None:
+        return None
+    sender, recipient, content = notification
+    return enqueue(
+        STATUS_MESSAGE,
+        {'sender': sender.pk, 'recipient': recipient.pk, 'content': content},
+        lending_request=lending_request,
+    )
+
+
+@handler(STATUS_MESSAGE)
+def send_status_message(event):
+    # Imported here: messaging depends on lending, not the other way round
+    from messaging.models import Conversation, Message
+
+    payload = event.payload
+    Message.objects.create(
+        sender_id=payload['sender'],
+        recipient_id=payload['recipient'],
+        content=payload['content'],
+        # In the thread about this request
+        conversation=Conversation.for_participants(payload['sender'], payload['recipient'], event.lending_request_id),
+    )
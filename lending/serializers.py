@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.utils import timezone
+from .booking import BLOCKED_MESSAGE, CONFLICT_MESSAGE, overlapping_requests
+from .calendar import get_calendar, overlaps
 from .models import LendingRequest
 # Import only the necessary serializers or none if only names are displayed
 from users.serializers import UserSerializer 
@@ -26,14 +28,16 @@ class LendingRequestSerializer(serializers.ModelSerializer):
             'borrower', 'borrower_username', 
             # Writable date fields
             'requested_from', 'requested_to', 
-            # CRUCIAL: 'status' must be writable for PATCH/PUT requests
+            # Changed only by the approve/deny/cancel/hand-over/return actions
             'status', 
             # Read-only timestamp fields
             'approved_at', 'returned_at', 
             'created_at', 'updated_at'
         ]
         # 'borrower' is set automatically in the view, so it's read-only here
-        read_only_fields = ['borrower', 'approved_at', 'returned_at', 'created_at', 'updated_at']
+        read_only_fields = ['borrower', 'status', 'approved_at', 'returned_at', 'created_at', 'updated_at']
+        # Relations read by the *_username/item_name fields; applied by EagerLoadingMixin
+        select_related = ['borrower', 'item', 'item__owner']
     
     def validate(self, data):
         """
@@ -41,7 +45,22 @@ class LendingRequestSerializer(serializers.ModelSerializer):
         1. Ensure date range is valid (to > from) and not in the past.
         2. Ensure item owner is not the borrower.
         3. Perform item availability and date overlap checks.
+        On updates, the item is fixed and the dates can only change while the
+        request is PENDING: anything else goes through the status actions
+        (lending/transitions.py), so an owner never ends up with an approved
+        request for other dates, or for an item they didn't approve it for.
         """
+        if self.instance is not None:
+            if 'item' in data and data['item'] != self.instance.item:
+                raise serializers.ValidationError({'item': "The item of a request cannot be changed."})
+            dates_changed = any(
+                field in data and data[field] != getattr(self.instance, field)
+                for field in ('requested_from', 'requested_to')
+            )
+            if dates_changed and self.instance.status != 'PENDING':
+                raise serializers.ValidationError(
+                    f"Dates can only be changed while the request is PENDING, not {self.instance.status}."
+                )
         
         # 1. Retrieve the validated date objects
         # We use data.get for creation, or getattr(self.instance, ...) for updates
@@ -75,28 +94,21 @@ class LendingRequestSerializer(serializers.ModelSerializer):
             # Check if item is available for lending (global flag)
             if not item.is_available:
                 raise serializers.ValidationError("This item is currently not available for lending.")
-            
-            # Check for overlapping unavailable periods marked by the owner
-            overlapping_unavailable = item.availabilities.filter(
-                unavailable_from__lte=requested_to,
-                unavailable_to__gte=requested_from
-            ).exists()
-            
-            if overlapping_unavailable:
-                raise serializers.ValidationError("Item is not available for the requested dates due to owner's block.")
-            
-            # Check for approved/pending/on_loan lending requests that overlap
-            overlapping_requests = item.lending_requests.filter(
-                status__in=['PENDING', 'APPROVED', 'ON_LOAN'],
-                requested_from__lte=requested_to,
-                requested_to__gte=requested_from
-            )
-            
-            # If updating an existing instance, exclude it from the overlap check
-            if self.instance:
-                overlapping_requests = overlapping_requests.exclude(id=self.instance.id)
-            
-            if overlapping_requests.exists():
-                raise serializers.ValidationError("Item already has pending or approved requests for these dates.")
+
+            # New bookings are checked against blocks and other bookings by
+            # lending/booking.py, under the item's row lock, in the calendar
+            # it then adds them to. Date edits are checked early here, and
+            # again there.
+            if self.instance is not None:
+                # Owner blocks come from the item's materialized calendar: a
+                # single lookup plus a binary search
+                if overlaps(get_calendar(item.pk).blocked, requested_from, requested_to):
+                    raise serializers.ValidationError(BLOCKED_MESSAGE)
+                # The calendar includes this request's own dates, so query the
+                # lending requests directly and exclude it
+                if overlapping_requests(
+                    item.pk, requested_from, requested_to, exclude_id=self.instance.id,
+                ).exists():
+                    raise serializers.ValidationError(CONFLICT_MESSAGE)
         
         return data
@@ -0,0 +1,104 @@
+# lending/signals.py
+"""
+Signal handlers that keep the materialized ItemCalendar in sync with
+Availability blocks and LendingRequest bookings, and the LendingParticipant
+rows with each request's borrower and item owner.
+
+Also retires cached API responses that depend on bookings, and defines
+`status_changed`, sent after a saved LendingRequest's status differs from the
+one it was loaded with (receivers get `instance` and `old_status`).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from items.models import Availability, Item
+from nas_project import response_cache
+from .calendar import add_blocked_span, add_booked_span, invalidate_calendar
+from .models import ACTIVE_STATUSES, LendingParticipant, LendingRequest
+
+# Fields whose changes move a booking on the calendar
+CALENDAR_FIELDS = ('item_id', 'status', 'requested_from', 'requested_to')
+
+status_changed = Signal()
+
+
+@receiver(post_save, sender=Availability)
+def availability_saved(sender, instance, created, **kwargs):
+    if created:
+        add_blocked_span(instance.item_id, instance.unavailable_from, instance.unavailable_to)
+    else:
+        # The block may have moved or shrunk: rebuild on next read
+        invalidate_calendar(instance.item_id)
+
+
+@receiver(post_delete, sender=Availability)
+def availability_deleted(sender, instance, **kwargs):
+    invalidate_calendar(instance.item_id)
+
+
+@receiver(post_save, sender=LendingRequest)
+def lending_request_saved(sender, instance, created, **kwargs):
+    response_cache.invalidate(LendingRequest)
+    is_active = instance.status in ACTIVE_STATUSES
+
+    if created:
+        LendingParticipant.sync_for([instance], created=True)
+        if is_active:
+            add_booked_span(instance.item_id, instance.requested_from, instance.requested_to)
+        return
+
+    # Delta sync reads the change from the participant rows
+    LendingParticipant.touch(instance.pk, instance.updated_at)
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        # Saved without being loaded from the database: we can't tell what changed
+        LendingParticipant.sync_for([instance])
+        invalidate_calendar(instance.item_id)
+        return
+
+    if any(f in loaded and loaded[f] != getattr(instance, f) for f in ('borrower_id', 'item_id')):
+        LendingParticipant.sync_for([instance])
+        loaded.update(borrower_id=instance.borrower_id)
+
+    changed = [f for f in CALENDAR_FIELDS if f in loaded and loaded[f] != getattr(instance, f)]
+    if not changed:
+        return
+    old_status = loaded.get('status')
+
+    if changed == ['status'] and (loaded['status'] in ACTIVE_STATUSES) == is_active:
+        # Between two active (e.g. PENDING -> APPROVED) or two inactive
+        # statuses: the booked dates stay as they are
+        pass
+    elif changed == ['status'] and is_active:
+        # Re-activated booking: it only adds to the calendar
+        add_booked_span(instance.item_id, instance.requested_from, instance.requested_to)
+    else:
+        invalidate_calendar(instance.item_id)
+        if 'item_id' in changed:
+            invalidate_calendar(loaded['item_id'])
+
+    # Later saves of the same instance compare against what is stored now
+    loaded.update({f: getattr(instance, f) for f in CALENDAR_FIELDS if f in loaded})
+
+    if 'status' in changed:
+        status_changed.send(sender=LendingRequest, instance=instance, old_status=old_status)
+
+
+@receiver(post_delete, sender=LendingRequest)
+def lending_request_deleted(sender, instance, **kwargs):
+    response_cache.invalidate(LendingRequest)
+    invalidate_calendar(instance.item_id)
+
+
+@receiver(post_save, sender=Item)
+def item_owner_changed(sender, instance, created, **kwargs):
+    # The new owner takes over the item's requests
+    loaded = getattr(instance, '_loaded_values', None)
+    if created or (loaded is not None and loaded.get('owner_id', instance.owner_id) == instance.owner_id):
+        return
+    requests = list(instance.lending_requests.only('pk', 'borrower_id', 'item_id', 'created_at'))
+    for lending_request in requests:
+        lending_request.item = instance
+    LendingParticipant.sync_for(requests)
+    if loaded is not None:
+        loaded['owner_id'] = instance.owner_id
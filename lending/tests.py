@@ -1,3 +1,422 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from items.models import Availability, Item
+from nas_project.testing import QueryCountAssertionsMixin
+from messaging.models import Message
+from . import booking, outbox, transitions
+from .calendar import build_spans, merge_span, overlaps
+from .models import ItemCalendar, LendingParticipant, LendingRequest, OutboxEvent
+
+User = get_user_model()
+
+
+def make_item(owner, name="Drill"):
+    return Item.objects.create(
+        owner=owner, name=name, description="A useful thing",
+        condition='Good', location='Westlands',
+    )
+
+
+def make_request(item, borrower, start_in_days=1, length_days=2, **kwargs):
+    start = timezone.localdate() + timedelta(days=start_in_days)
+    return LendingRequest.objects.create(
+        item=item, borrower=borrower,
+        requested_from=start, requested_to=start + timedelta(days=length_days),
+        **kwargs,
+    )
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite connection settings")
+class SQLiteConnectionTests(TestCase):
+    """Concurrent lending request writes rely on these (see DATABASES in settings.py)."""
+
+    def test_pragmas_and_transaction_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(OUTBOX_DISPATCH='command')
+class BookingConcurrencyTests(TransactionTestCase):
+    """Concurrent requests for one slot: exactly one wins (lending/booking.py)."""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='pass12345')
+        self.item = make_item(owner)
+        self.borrowers = [User.objects.create_user(username=f'borrower{n}') for n in range(10)]
+        self.start = timezone.localdate() + timedelta(days=3)
+
+    def post(self, number, item_id, start):
+        client = APIClient()
+        client.force_authenticate(self.borrowers[number % len(self.borrowers)])
+        try:
+            return client.post('/api/lending-requests/', {
+                'item': item_id, 'requested_from': start, 'requested_to': start + timedelta(days=2),
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_one_winner_per_slot(self):
+        # Overlapping, not identical, dates: the check must be a range check
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            statuses = list(pool.map(
+                lambda n: self.post(n, self.item.pk, self.start + timedelta(days=n % 2)), range(200),
+            ))
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(400), 199)
+        self.assertEqual(LendingRequest.objects.filter(item=self.item).count(), 1)
+
+    @skipUnless(connection.features.has_select_for_update, "Row locks (SQLite locks the whole database)")
+    def test_other_items_are_not_blocked(self):
+        other = make_item(self.item.owner, name="Ladder")
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    booking.lock_item(self.item.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                future = pool.submit(self.post, 0, other.pk, self.start)
+                self.assertEqual(future.result(timeout=5), 201)
+        finally:
+            release.set()
+            holder.join()
+
+
+class LendingRequestQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """List and detail endpoints must not issue one query per row."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.client.force_authenticate(self.borrower)
+        self.request = make_request(make_item(self.owner), self.borrower)
+
+    def test_lending_request_list_query_count(self):
+        def add_rows():
+            for i in range(5):
+                owner = User.objects.create_user(username=f'owner{i}')
+                make_request(make_item(owner, name=f"Item {i}"), self.borrower)
+
+        # The page's keys for the ETag, then the page
+        self.assertConstantQueries(self.client, '/api/lending-requests/', 2, add_rows)
+
+    def test_lending_request_detail_query_count(self):
+        self.assertQueryCount(self.client, f'/api/lending-requests/{self.request.pk}/', 2)
+
+    def test_new_item_owner_takes_over_requests(self):
+        new_owner = User.objects.create_user(username='new-owner', password='pass12345')
+        item = Item.objects.get(pk=self.request.item_id)
+        item.owner = new_owner
+        item.save()
+
+        self.assertEqual(
+            set(LendingParticipant.objects.filter(lending_request=self.request).values_list('user_id', flat=True)),
+            {self.borrower.pk, new_owner.pk},
+        )
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get('/api/lending-requests/').data['results'], [])
+        self.client.force_authenticate(new_owner)
+        self.assertEqual([row['id'] for row in self.client.get('/api/lending-requests/').data['results']], [self.request.pk])
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.client.force_authenticate(self.borrower)
+        self.request = make_request(make_item(self.owner), self.borrower)
+        self.url = f'/api/lending-requests/{self.request.pk}/'
+
+    def test_unchanged_detail_is_not_modified(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # It shows item names and usernames, which can change without touching updated_at
+        self.assertNotIn('Last-Modified', first)
+
+        self.request.requested_to += timedelta(days=1)
+        self.request.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_list_etag_covers_new_and_deleted_rows(self):
+        etag = self.client.get('/api/lending-requests/')['ETag']
+        self.assertEqual(self.client.get('/api/lending-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        other = make_request(make_item(self.owner, name="Ladder"), self.borrower)
+        self.assertEqual(self.client.get('/api/lending-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        other.delete()
+        # Back to the same rows: the same validators
+        self.assertEqual(self.client.get('/api/lending-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_list_validators_cover_the_page_only(self):
+        for index in range(2):
+            make_request(make_item(self.owner, name=f"Item {index}"), self.borrower)
+        url = '/api/lending-requests/?page_size=2'
+        first = self.client.get(url)
+        # A deleted row would leave the newest updated_at as it was
+        self.assertNotIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        # The oldest request is on the next page
+        self.request.requested_to += timedelta(days=1)
+        self.request.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        LendingRequest.objects.filter(pk=first.data['results'][1]['id']).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class ItemCalendarTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.item = make_item(self.owner)
+        self.today = timezone.localdate()
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def test_merge_span_keeps_spans_sorted_and_merged(self):
+        spans = []
+        for start, end in [(5, 7), (1, 2), (3, 4), (10, 12), (8, 8)]:
+            spans = merge_span(spans, self.day(start), self.day(end))
+        self.assertEqual(spans, build_spans([(self.day(1), self.day(8)), (self.day(10), self.day(12))]))
+        self.assertTrue(overlaps(spans, self.day(8), self.day(9)))
+        self.assertFalse(overlaps(spans, self.day(9), self.day(9)))
+
+    def test_calendar_tracks_blocks_and_bookings(self):
+        Availability.objects.create(item=self.item, unavailable_from=self.day(3), unavailable_to=self.day(4))
+        request = make_request(self.item, self.borrower, start_in_days=6, length_days=1)
+
+        calendar = ItemCalendar.objects.get(item=self.item)
+        self.assertEqual(calendar.blocked, [[self.day(3).isoformat(), self.day(4).isoformat()]])
+        self.assertEqual(calendar.booked, [[self.day(6).isoformat(), self.day(7).isoformat()]])
+
+        # Leaving the active statuses drops the booking from the calendar
+        request.status = 'DENIED'
+        request.save()
+        self.client.force_authenticate(self.borrower)
+        response = self.client.get(
+            f'/api/items/{self.item.pk}/calendar/',
+            {'from': self.day(0).isoformat(), 'to': self.day(9).isoformat()},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['busy'],
+            [{'from': self.day(3).isoformat(), 'to': self.day(4).isoformat(), 'reason': 'blocked'}],
+        )
+        self.assertEqual(response.data['free'], [
+            {'from': self.day(0).isoformat(), 'to': self.day(2).isoformat()},
+            {'from': self.day(5).isoformat(), 'to': self.day(9).isoformat()},
+        ])
+
+    def test_create_rejects_dates_booked_in_calendar(self):
+        make_request(self.item, self.borrower, start_in_days=2, length_days=3)
+        self.client.force_authenticate(self.borrower)
+        response = self.client.post('/api/lending-requests/', {
+            'item': self.item.pk,
+            'requested_from': self.day(4).isoformat(),
+            'requested_to': self.day(8).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_booking_reads_the_calendar_once(self):
+        Availability.objects.create(item=self.item, unavailable_from=self.day(3), unavailable_to=self.day(4))
+        self.client.force_authenticate(self.borrower)
+        url = '/api/lending-requests/'
+
+        response = self.client.post(url, {
+            'item': self.item.pk, 'requested_from': self.day(4).isoformat(), 'requested_to': self.day(6).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'non_field_errors': [booking.BLOCKED_MESSAGE]})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {
+                'item': self.item.pk, 'requested_from': self.day(6).isoformat(), 'requested_to': self.day(8).isoformat(),
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        calendar_reads = [q for q in queries if q['sql'].startswith('SELECT') and 'lending_itemcalendar' in q['sql']]
+        self.assertEqual(len(calendar_reads), 1)
+        # The item and its owner, then in a transaction (two savepoint statements here): the
+        # item lock, the calendar, the overlap check, the insert, the participants and the
+        # calendar update
+        self.assertEqual(len(queries), 10)
+        self.assertEqual(
+            ItemCalendar.objects.get(item=self.item).booked, [[self.day(6).isoformat(), self.day(8).isoformat()]],
+        )
+
+    def test_approval_keeps_the_calendar(self):
+        request = make_request(self.item, self.borrower, start_in_days=6, length_days=1)
+        request = LendingRequest.objects.get(pk=request.pk)
+        request.status = 'APPROVED'
+        request.save()
+        self.assertEqual(ItemCalendar.objects.get(item=self.item).booked, [[self.day(6).isoformat(), self.day(7).isoformat()]])
+
+
+@override_settings(OUTBOX_DISPATCH='command')
+class StatusOutboxTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.request = make_request(make_item(self.owner), self.borrower)
+        self.url = f'/api/lending-requests/{self.request.pk}/'
+
+    def test_status_change_writes_outbox_event(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(self.url + 'approve/')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        # The message is sent by the dispatcher, not during the request
+        self.assertFalse(Message.objects.exists())
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.lending_request_id, self.request.pk)
+
+        self.assertEqual(outbox.dispatch_pending(), 1)
+        message = Message.objects.get()
+        self.assertEqual((message.sender, message.recipient), (self.owner, self.borrower))
+        self.assertIn("APPROVED", message.content)
+        self.assertEqual(message.conversation.lending_request_id, self.request.pk)
+
+        # Processed events are never sent twice
+        self.assertEqual(outbox.dispatch_pending(), 0)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_rejected_change_writes_nothing(self):
+        self.client.force_authenticate(self.borrower)
+        response = self.client.post(self.url + 'approve/')
+        self.assertEqual(response.status_code, 403)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.status, 'PENDING')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_event_is_retried_later(self):
+        self.client.force_authenticate(self.owner)
+        self.client.post(self.url + 'deny/')
+
+        failing = mock.Mock(side_effect=RuntimeError("mail server down"))
+        with mock.patch.dict(outbox.HANDLERS, {outbox.STATUS_MESSAGE: failing}), self.assertLogs('lending.outbox', 'ERROR'):
+            self.assertEqual(outbox.dispatch_pending(), 0)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("mail server down", event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+
+        # Not due yet; once it is, it goes through
+        self.assertEqual(outbox.dispatch_pending(), 0)
+        OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.dispatch_pending(), 1)
+        self.assertEqual(Message.objects.count(), 1)
+
+
+class TransitionTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.request = make_request(make_item(self.owner), self.borrower)
+        self.url = f'/api/lending-requests/{self.request.pk}/'
+
+    def post(self, user, action):
+        self.client.force_authenticate(user)
+        return self.client.post(f'{self.url}{action}/')
+
+    def test_lifecycle(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.post(self.owner, 'approve')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'APPROVED')
+        self.assertIsNotNone(response.data['approved_at'])
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "lending_lendingrequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status" = \'PENDING\'', updates[0])
+
+        self.assertEqual(self.post(self.owner, 'hand-over').data['status'], 'ON_LOAN')
+        response = self.post(self.borrower, 'return')
+        self.assertEqual(response.data['status'], 'COMPLETED')
+        self.assertIsNotNone(response.data['returned_at'])
+        self.assertEqual(OutboxEvent.objects.count(), 2)  # approved, returned
+
+    def test_illegal_transitions_write_nothing(self):
+        self.assertEqual(self.post(self.borrower, 'approve').status_code, 403)
+        self.assertEqual(self.post(self.owner, 'cancel').status_code, 403)
+        self.assertEqual(self.post(self.owner, 'return').status_code, 409)
+        self.assertEqual(self.post(self.owner, 'deny').status_code, 200)
+        self.assertEqual(self.post(self.owner, 'approve').status_code, 409)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.status, 'DENIED')
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_item_is_fixed_and_dates_only_change_while_pending(self):
+        other_item = make_item(User.objects.create_user(username='other-owner'), name="Ladder")
+        self.client.force_authenticate(self.borrower)
+        response = self.client.patch(self.url, {'item': other_item.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        later = self.request.requested_from + timedelta(days=10)
+        dates = {'requested_from': later, 'requested_to': later + timedelta(days=1)}
+        self.assertEqual(self.client.patch(self.url, dates, format='json').status_code, 200)
+
+        self.post(self.owner, 'approve')
+        self.client.force_authenticate(self.borrower)
+        dates = {'requested_from': later + timedelta(days=5), 'requested_to': later + timedelta(days=6)}
+        self.assertEqual(self.client.patch(self.url, dates, format='json').status_code, 400)
+        item_id = self.request.item_id
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.item_id, self.request.requested_from, self.request.status),
+                         (item_id, later, 'APPROVED'))
+
+    def test_status_is_not_writable_directly(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.patch(self.url, {'status': 'APPROVED'}).data['status'], 'PENDING')
+
+    def test_lost_race_is_a_conflict(self):
+        stale = LendingRequest.objects.select_related('item').get(pk=self.request.pk)
+        self.assertEqual(self.post(self.borrower, 'cancel').status_code, 200)
+        with self.assertRaises(transitions.TransitionConflict):
+            transitions.apply(stale, 'approve', self.owner)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.status, 'CANCELLED')
+
+    def test_cancelling_frees_the_dates(self):
+        self.assertEqual(self.post(self.borrower, 'cancel').status_code, 200)
+        other = User.objects.create_user(username='other', password='pass12345')
+        self.client.force_authenticate(other)
+        response = self.client.post('/api/lending-requests/', {
+            'item': self.request.item_id,
+            'requested_from': self.request.requested_from,
+            'requested_to': self.request.requested_to,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
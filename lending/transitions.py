@@ -0,0 +1,106 @@
+# lending/transitions.py
+"""
+The lending request state machine.
+
+Status changes are the actions in TRANSITIONS, exposed by
+LendingRequestViewSet as POST /api/lending-requests/<pk>/<action>/:
+
+    approve    PENDING            -> APPROVED    item owner
+    deny       PENDING            -> DENIED      item owner
+    cancel     PENDING, APPROVED  -> CANCELLED   borrower
+    hand-over  APPROVED           -> ON_LOAN     item owner
+    return     APPROVED, ON_LOAN  -> COMPLETED   either
+
+apply() checks the actor and the current status before writing anything,
+then writes the change as a single compare-and-set statement
+(UPDATE ... WHERE id = ? AND status = <the status it checked>). Nothing
+else about the request changes, so the serializer and its overlap queries
+are not run again. If another transition got there first, the UPDATE
+matches no row and the caller gets a 409.
+"""
+from typing import NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, PermissionDenied
+
+from nas_project import response_cache
+from . import outbox
+from .calendar import invalidate_calendar
+from .models import ACTIVE_STATUSES, LendingParticipant, LendingRequest
+from .signals import status_changed
+
+OWNER, BORROWER, EITHER = 'owner', 'borrower', 'either'
+
+
+class Transition(NamedTuple):
+    sources: tuple
+    target: str
+    actor: str
+
+
+TRANSITIONS = {
+    'approve': Transition(('PENDING',), 'APPROVED', OWNER),
+    'deny': Transition(('PENDING',), 'DENIED', OWNER),
+    'cancel': Transition(('PENDING', 'APPROVED'), 'CANCELLED', BORROWER),
+    'hand_over': Transition(('APPROVED',), 'ON_LOAN', OWNER),
+    'return': Transition(('APPROVED', 'ON_LOAN'), 'COMPLETED', EITHER),
+}
+
+# Timestamps stamped by a transition into these statuses
+TIMESTAMP_FIELDS = {'APPROVED': 'approved_at', 'COMPLETED': 'returned_at'}
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The request's status does not allow this action."
+    default_code = 'transition_conflict'
+
+
+def _check_actor(lending_request, transition, user):
+    is_owner = lending_request.item.owner_id == user.pk
+    is_borrower = lending_request.borrower_id == user.pk
+    allowed = {OWNER: is_owner, BORROWER: is_borrower, EITHER: is_owner or is_borrower}[transition.actor]
+    if not allowed:
+        who = {OWNER: "the item owner", BORROWER: "the borrower"}.get(transition.actor, "the owner or the borrower")
+        raise PermissionDenied(f"Only {who} can do this.")
+
+
+def apply(lending_request, action, user):
+    """
+    Carry out `action` on the request as `user`, or raise PermissionDenied or
+    TransitionConflict without writing. Updates the instance in place.
+    """
+    transition = TRANSITIONS[action]
+    _check_actor(lending_request, transition, user)
+    old_status = lending_request.status
+    if old_status not in transition.sources:
+        raise TransitionConflict(f"Cannot {action.replace('_', ' ')} a request that is {old_status}.")
+
+    now = timezone.now()
+    changes = {'status': transition.target, 'updated_at': now}
+    if transition.target in TIMESTAMP_FIELDS:
+        changes[TIMESTAMP_FIELDS[transition.target]] = now
+
+    with transaction.atomic():
+        updated = LendingRequest.objects.filter(pk=lending_request.pk, status=old_status).update(**changes)
+        if not updated:
+            raise TransitionConflict("The request was changed in the meantime. Reload it and try again.")
+        for field, value in changes.items():
+            setattr(lending_request, field, value)
+        loaded = getattr(lending_request, '_loaded_values', None)
+        if loaded is not None:
+            # Later saves of this instance compare against what is stored now
+            loaded.update({field: value for field, value in changes.items() if field in loaded})
+
+        # update() skips post_save: do what lending/signals.py would have done
+        LendingParticipant.touch(lending_request.pk, now)
+        response_cache.invalidate(LendingRequest)
+        if old_status in ACTIVE_STATUSES and transition.target not in ACTIVE_STATUSES:
+            # The dates are free again
+            invalidate_calendar(lending_request.item_id)
+        status_changed.send(sender=LendingRequest, instance=lending_request, old_status=old_status)
+        # The notification commits (or not) together with the change
+        outbox.enqueue_status_notification(lending_request, old_status, user)
+    return lending_request
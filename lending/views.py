@@ -1,12 +1,15 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import serializers 
-from django.db import models
-from django.utils import timezone
+from django.db.models import F
+from . import booking, transitions
 from .models import LendingRequest
 from .serializers import LendingRequestSerializer
-from messaging.models import Message # Import the Message model
+from items.models import Item
+from nas_project.conditional import ConditionalGetMixin
+from nas_project.eager_loading import EagerLoadingMixin
+from nas_project.pagination import ParticipantKeysetPagination
+from nas_project.response_cache import model_version
 
 # -------------------------------------------------------------
 # STEP 1: Custom Permission Class (Replaced IsOwnerOrBorrower)
@@ -30,95 +33,66 @@ class IsItemOwnerOrRequester(permissions.BasePermission):
         
         return is_owner or is_requester
 
-class LendingRequestViewSet(viewsets.ModelViewSet):
+class LendingRequestViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    queryset = LendingRequest.objects.all()
     serializer_class = LendingRequestSerializer
     # Use the new, more specific permission class
     permission_classes = [permissions.IsAuthenticated, IsItemOwnerOrRequester]
+    # Newest requests first, by the participant row's copy of created_at
+    pagination_class = ParticipantKeysetPagination
+    # Only request.user's id is needed: authenticate from the token claims (users/authentication.py)
+    claims_only_user = True
 
     def get_queryset(self):
         user = self.request.user
-        # Show requests I made (borrower) OR requests for items I own (owner)
-        return LendingRequest.objects.filter(
-            models.Q(borrower=user) | models.Q(item__owner=user)
-        ).select_related('borrower', 'item', 'item__owner').distinct()
+        # Show requests I made (borrower) OR requests for items I own (owner):
+        # one lookup on lending_part_user_created_idx, at most one row per request
+        # (related rows are joined by EagerLoadingMixin from the serializer's Meta)
+        return super().get_queryset().filter(participants__user=user).annotate(
+            participant_time=F('participants__created_at'),
+        )
     
+    def get_etag_dependencies(self):
+        # Item names and usernames are shown too, without touching updated_at
+        # (a username change bumps the Item version, see items/signals.py)
+        return [model_version(Item)]
+
     def perform_create(self, serializer):
-        # Automatically sets the borrower and initial status
-        serializer.save(borrower=self.request.user, status='PENDING')
+        # Automatically sets the borrower and initial status; the final overlap
+        # check and the insert run under the item's row lock (lending/booking.py)
+        booking.save_booking(serializer, borrower=self.request.user, status='PENDING')
+
+    def perform_update(self, serializer):
+        # Date changes are checked under the same lock
+        booking.save_booking(serializer)
 
     # -----------------------------------------------------------------
-    # STEP 2: Implement Status Change and Auto-Messaging Logic in update()
+    # STEP 2: Status Changes (POST /api/lending-requests/<pk>/<action>/)
     # -----------------------------------------------------------------
-    def update(self, request, *args, **kwargs):
-        partial = kwargs.pop('partial', False)
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
-        serializer.is_valid(raise_exception=True)
+    # Each one is a single conditional UPDATE plus its notification (an
+    # outbox event, turned into a Message in the background by
+    # lending/outbox.py); see lending/transitions.py for who may do what, when.
+    def transition(self, action_name):
+        lending_request = transitions.apply(self.get_object(), action_name, self.request.user)
+        return Response(self.get_serializer(lending_request).data)
 
-        old_status = instance.status
-        
-        # Save the instance to apply the update (calls perform_update internally)
-        self.perform_update(serializer) 
-        
-        new_status = instance.status
-        
-        # Initialize content to None
-        content = None
-        sender = None
-        recipient = None
+    @action(detail=True, methods=['post'])
+    def approve(self, request, pk=None):
+        return self.transition('approve')
+
+    @action(detail=True, methods=['post'])
+    def deny(self, request, pk=None):
+        return self.transition('deny')
 
-        # --- Auto-Messaging Logic (Triggered only if status changed) ---
-        if old_status != new_status:
-            item_name = instance.item.name
-            
-            # 1. OWNER Actions: APPROVED/DENIED
-            if new_status in ['APPROVED', 'DENIED']:
-                # Ensure only the item owner can trigger these critical status changes
-                if self.request.user != instance.item.owner:
-                    # Raise a validation error if a non-owner tries to approve/deny
-                    raise serializers.ValidationError({"status": "Only the item owner can approve or deny a request."})
-                
-                recipient = instance.borrower
-                sender = instance.item.owner
-                action_word = new_status.upper()
-                
-                content = f"Your request for '{item_name}' has been **{action_word}** by the owner."
-            
-            # 2. RETURN Action: COMPLETED (Can be triggered by owner or borrower)
-            elif new_status == 'COMPLETED':
-                
-                # Set returned_at timestamp if not already set
-                if not instance.returned_at:
-                    instance.returned_at = timezone.now() 
-                    # Use update_fields to save only the changed field
-                    instance.save(update_fields=['returned_at']) 
-                
-                # Determine who gets notified (the person who didn't mark it complete)
-                if request.user == instance.borrower:
-                    recipient = instance.item.owner # Borrower notified owner
-                    sender = instance.borrower
-                    actor = "the borrower"
-                else:
-                    recipient = instance.borrower # Owner notified borrower
-                    sender = instance.item.owner
-                    actor = "the owner"
-                
-                content = f"The item '{item_name}' has been marked as **RETURNED** by {actor}."
-            
-            # 3. CANCELLED Action (Usually triggered by borrower)
-            elif new_status == 'CANCELLED':
-                # Notify the owner that the borrower cancelled
-                recipient = instance.item.owner
-                sender = instance.borrower
-                content = f"The request for '{item_name}' was CANCELLED by the borrower."
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        return self.transition('cancel')
 
-            # 4. Create the Message object if 'content' was successfully generated
-            if content and sender and recipient:
-                Message.objects.create(
-                    sender=sender,
-                    recipient=recipient,
-                    content=content,
-                )
+    @action(detail=True, methods=['post'], url_path='hand-over')
+    def hand_over(self, request, pk=None):
+        return self.transition('hand_over')
 
-        # Return the response data
-        return Response(serializer.data)
+    # "return" is a keyword: the method needs another name
+    @action(detail=True, methods=['post'], url_path='return')
+    def return_item(self, request, pk=None):
+        return self.transition('return')
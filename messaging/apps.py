@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MessagingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'messaging'
+
+    def ready(self):
+        # Keep the denormalized inbox counters in sync (see messaging/signals.py)
+        from . import signals  # noqa: F401
@@ -0,0 +1,81 @@
+# messaging/counters.py
+"""
+Maintenance of the denormalized InboxCounter rows.
+
+Every change is a single UPDATE with F() expressions (or an INSERT for a
+new conversation partner), so concurrent messages never lose an increment.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, F, Q, Value, When
+
+from .models import InboxCounter, Message
+
+
+def _touch(user_id, partner_id, message, unread_delta):
+    """Add unread_delta to user's counter for partner and move last_message forward."""
+    is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.time_stamp)
+    updates = {
+        'unread_count': F('unread_count') + unread_delta,
+        # Don't let a slower, older message overwrite a newer one
+        'last_message': Case(
+            When(is_newer, then=Value(message.pk)),
+            default=F('last_message'),
+            output_field=BigIntegerField(),
+        ),
+        'last_message_at': Case(When(is_newer, then=Value(message.time_stamp)), default=F('last_message_at')),
+    }
+    counters = InboxCounter.objects.filter(user_id=user_id, partner_id=partner_id)
+    if counters.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            InboxCounter.objects.create(
+                user_id=user_id,
+                partner_id=partner_id,
+                unread_count=unread_delta,
+                last_message=message,
+                last_message_at=message.time_stamp,
+            )
+    except IntegrityError:
+        # Someone created the row first: apply ours on top of theirs
+        counters.update(**updates)
+
+
+def record_message(message):
+    """A new message: newest message for both sides, one more unread for the recipient."""
+    with transaction.atomic():
+        if message.sender_id == message.recipient_id:
+            _touch(message.sender_id, message.sender_id, message, 0)
+            return
+        _touch(message.sender_id, message.recipient_id, message, 0)
+        _touch(message.recipient_id, message.sender_id, message, 0 if message.is_read else 1)
+
+
+def record_read(message, read=True):
+    """The recipient read (or un-read) a message from its sender."""
+    counters = InboxCounter.objects.filter(user_id=message.recipient_id, partner_id=message.sender_id)
+    if read:
+        counters.filter(unread_count__gt=0).update(unread_count=F('unread_count') - 1)
+    else:
+        counters.update(unread_count=F('unread_count') + 1)
+
+
+def record_delete(message):
+    """A message was deleted: fix the unread count and, if needed, the latest message."""
+    with transaction.atomic():
+        if not message.is_read and message.sender_id != message.recipient_id:
+            record_read(message)
+
+        # last_message was set to NULL by the FK; point it at the newest remaining message
+        pair = Q(sender_id=message.sender_id, recipient_id=message.recipient_id) | \
+            Q(sender_id=message.recipient_id, recipient_id=message.sender_id)
+        latest = Message.objects.filter(pair).order_by('-time_stamp').first()
+        counters = InboxCounter.objects.filter(
+            Q(user_id=message.sender_id, partner_id=message.recipient_id)
+            | Q(user_id=message.recipient_id, partner_id=message.sender_id),
+            last_message__isnull=True,
+        )
+        if latest is None:
+            counters.delete()
+        else:
+            counters.update(last_message=latest, last_message_at=latest.time_stamp)
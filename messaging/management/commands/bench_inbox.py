@@ -0,0 +1,179 @@
+"""
+Benchmark "my messages" queries: the old sender-OR-recipient filter against
+the MessageParticipant lookup that MessageViewSet uses now.
+
+Usage:
+    python manage.py bench_inbox                              # 10,000,000 messages
+    python manage.py bench_inbox --messages 1000000 --users 2000 --queries 500 --keep
+
+Generates messages between throwaway 'bench-inbox-N' users (with their
+participant rows, as the signal handlers would), then times, for random
+users, the first page and a page halfway through their history with both
+queries and prints latency percentiles and the query plans. The generated
+rows are deleted afterwards unless --keep is given. Run it against a
+scratch database.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from messaging.models import Message, MessageParticipant
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench-inbox-'
+PAGE_SIZE = 20
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def or_page(user_id, before=None):
+    """The query MessageViewSet used to run."""
+    queryset = Message.objects.filter(Q(sender_id=user_id) | Q(recipient_id=user_id))
+    if before is not None:
+        queryset = queryset.filter(time_stamp__lt=before)
+    return queryset.order_by('-time_stamp')[:PAGE_SIZE]
+
+
+def participant_page(user_id, before=None):
+    """The query MessageViewSet runs now."""
+    queryset = Message.objects.filter(participants__user_id=user_id).annotate(
+        participant_time=F('participants__time_stamp'),
+    )
+    if before is not None:
+        queryset = queryset.filter(participant_time__lt=before)
+    return queryset.order_by('-participant_time')[:PAGE_SIZE]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the OR inbox query against the participant lookup (default 10M messages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10_000_000, help="Number of synthetic messages.")
+        parser.add_argument('--users', type=int, default=10_000, help="Number of synthetic users.")
+        parser.add_argument('--queries', type=int, default=200, help="Timed queries per scenario.")
+        parser.add_argument('--batch-size', type=int, default=20_000, help="Rows per INSERT batch.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated rows afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"Database: {connection.vendor}")
+        user_ids = self.bench_users(options['users'])
+
+        existing = Message.objects.filter(sender__username__startswith=USERNAME_PREFIX).count()
+        to_create = max(0, options['messages'] - existing)
+        if to_create:
+            self.generate(rng, user_ids, to_create, options['batch_size'])
+        with connection.cursor() as cursor:
+            # Fresh statistics, so the planner sees the table at its real size
+            cursor.execute('ANALYZE')
+
+        sample = [rng.choice(user_ids) for _ in range(options['queries'])]
+        # A page halfway through each sampled user's history
+        middles = {
+            user_id: MessageParticipant.objects.filter(user_id=user_id)
+            .order_by('-time_stamp').values_list('time_stamp', flat=True)[
+                MessageParticipant.objects.filter(user_id=user_id).count() // 2
+            ]
+            for user_id in set(sample)
+        }
+        for label, page in [("OR (before)", or_page), ("participant", participant_page)]:
+            self.run_scenario(f"{label}, first page", lambda user_id: page(user_id), sample)
+            self.run_scenario(f"{label}, middle page", lambda user_id: page(user_id, middles[user_id]), sample)
+
+        for label, page in [("OR (before)", or_page), ("participant", participant_page)]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Plan, {label}"))
+            self.stdout.write(page(sample[0], middles[sample[0]]).explain())
+
+        if not options['keep']:
+            self.cleanup(user_ids)
+
+    def bench_users(self, count):
+        existing = set(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}{i}")
+            for i in range(count) if f"{USERNAME_PREFIX}{i}" not in existing
+        ])
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+
+    def generate(self, rng, user_ids, count, batch_size):
+        """Raw INSERTs: bulk_create would stamp every row with the same auto_now_add time."""
+        self.stdout.write(f"Generating {count:,} messages...")
+        messages, participants = Message._meta.db_table, MessageParticipant._meta.db_table
+        started = time.perf_counter()
+        start_time = timezone.now() - timedelta(days=365)
+        step = timedelta(days=365) / count
+        created = 0
+        with connection.cursor() as cursor:
+            while created < count:
+                size = min(batch_size, count - created)
+                rows = []
+                for i in range(created, created + size):
+                    sender, recipient = rng.sample(user_ids, 2)
+                    sent_at = start_time + step * i
+                    rows.append((sender, recipient, "Is it still available?", sent_at, rng.random() < 0.7, sent_at))
+                with transaction.atomic():
+                    first_id = (Message.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+                    cursor.executemany(
+                        f"INSERT INTO {messages} (sender_id, recipient_id, content, time_stamp, is_read, updated_at) "
+                        f"VALUES (%s, %s, %s, %s, %s, %s)",
+                        rows,
+                    )
+                    # The participant rows the post_save handler would have written
+                    cursor.execute(
+                        f"INSERT INTO {participants} (message_id, user_id, time_stamp, updated_at) "
+                        f"SELECT id, sender_id, time_stamp, updated_at FROM {messages} WHERE id >= %s "
+                        f"UNION ALL SELECT id, recipient_id, time_stamp, updated_at FROM {messages} WHERE id >= %s",
+                        [first_id, first_id],
+                    )
+                created += size
+                if created % (batch_size * 50) == 0 or created == count:
+                    self.stdout.write(f"  {created:,} / {count:,}")
+        self.stdout.write(f"Generated in {time.perf_counter() - started:.1f}s")
+
+    def run_scenario(self, label, run_query, sample):
+        # Warm up caches so the first queries don't skew the numbers
+        for user_id in sample[:5]:
+            list(run_query(user_id))
+
+        timings = []
+        for user_id in sample:
+            started = time.perf_counter()
+            list(run_query(user_id))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        self.stdout.write(
+            f"{label:<28} n={len(sample):<5} "
+            f"mean={statistics.fmean(timings):8.2f}ms "
+            f"p50={percentile(timings, 0.50):8.2f}ms "
+            f"p95={percentile(timings, 0.95):8.2f}ms "
+            f"p99={percentile(timings, 0.99):8.2f}ms "
+            f"max={timings[-1]:8.2f}ms"
+        )
+
+    def cleanup(self, user_ids):
+        self.stdout.write("Removing generated messages and users...")
+        messages, participants = Message._meta.db_table, MessageParticipant._meta.db_table
+        users = User._meta.db_table
+        bench_senders = f"SELECT id FROM {users} WHERE username LIKE %s"
+        # Raw deletes: the ORM would collect and signal 10M rows one by one
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {participants} WHERE message_id IN "
+                f"(SELECT id FROM {messages} WHERE sender_id IN ({bench_senders}))",
+                [f"{USERNAME_PREFIX}%"],
+            )
+            cursor.execute(f"DELETE FROM {messages} WHERE sender_id IN ({bench_senders})", [f"{USERNAME_PREFIX}%"])
+        User.objects.filter(pk__in=user_ids).delete()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='recipient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='sender',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', 'is_read', '-time_stamp'], name='msg_recipient_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', '-time_stamp'], name='msg_sender_time_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_inbox_counters(apps, schema_editor):
+    """Build the counters for messages sent before InboxCounter existed."""
+    Message = apps.get_model('messaging', 'Message')
+    InboxCounter = apps.get_model('messaging', 'InboxCounter')
+
+    counters = {}
+    messages = Message.objects.order_by('time_stamp').values_list(
+        'id', 'sender_id', 'recipient_id', 'is_read', 'time_stamp',
+    )
+    for message_id, sender_id, recipient_id, is_read, time_stamp in messages.iterator(chunk_size=2000):
+        for user_id, partner_id in {(sender_id, recipient_id), (recipient_id, sender_id)}:
+            counter = counters.setdefault((user_id, partner_id), InboxCounter(user_id=user_id, partner_id=partner_id))
+            counter.last_message_id = message_id
+            counter.last_message_at = time_stamp
+            if user_id == recipient_id and user_id != sender_id and not is_read:
+                counter.unread_count += 1
+    InboxCounter.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_message_inbox_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='inbox_user_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'partner'), name='unique_inbox_counter')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox_counters, migrations.RunPython.noop),
+    ]
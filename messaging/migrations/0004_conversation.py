@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    """Put existing messages into their pair's general thread."""
+    Message = apps.get_model('messaging', 'Message')
+    Conversation = apps.get_model('messaging', 'Conversation')
+
+    latest = {}
+    pairs = Message.objects.values('sender_id', 'recipient_id').annotate(latest=models.Max('time_stamp')).order_by()
+    for row in pairs:
+        pair = tuple(sorted((row['sender_id'], row['recipient_id'])))
+        latest[pair] = max(latest.get(pair, row['latest']), row['latest'])
+
+    for (user_a, user_b), last_message_at in latest.items():
+        conversation = Conversation.objects.create(user_a_id=user_a, user_b_id=user_b, last_message_at=last_message_at)
+        Message.objects.filter(
+            models.Q(sender_id=user_a, recipient_id=user_b) | models.Q(sender_id=user_b, recipient_id=user_a),
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0004_itemcalendar'),
+        ('messaging', '0003_inboxcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lending_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='lending.lendingrequest')),
+                ('user_a', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='messaging.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-time_stamp'], name='msg_conversation_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_a', '-last_message_at'], name='conv_user_a_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_b', '-last_message_at'], name='conv_user_b_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.CheckConstraint(condition=models.Q(('user_a__lte', models.F('user_b'))), name='conversation_user_order'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('lending_request__isnull', True)), fields=('user_a', 'user_b'), name='unique_pair_conversation'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('lending_request__isnull', False)), fields=('user_a', 'user_b', 'lending_request'), name='unique_lending_conversation'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
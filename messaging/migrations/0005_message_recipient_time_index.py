@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', 'time_stamp', 'id'], name='msg_recipient_time_idx'),
+        ),
+    ]
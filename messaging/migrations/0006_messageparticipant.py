@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participants(apps, schema_editor):
+    """One participant row per sender and per (different) recipient, in one INSERT ... SELECT."""
+    Message = apps.get_model('messaging', 'Message')
+    MessageParticipant = apps.get_model('messaging', 'MessageParticipant')
+    quote = schema_editor.quote_name
+    message, participant = quote(Message._meta.db_table), quote(MessageParticipant._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {participant} (message_id, user_id, time_stamp) "
+            f"SELECT id, sender_id, time_stamp FROM {message} "
+            f"UNION ALL SELECT id, recipient_id, time_stamp FROM {message} WHERE recipient_id <> sender_id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_message_recipient_time_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_stamp', models.DateTimeField()),
+                ('message', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='messaging.message')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-time_stamp', 'message'], name='msg_part_user_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('message', 'user'), name='unique_message_participant')],
+            },
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_time_stamp(apps, schema_editor):
+    """Existing messages were last changed, as far as anyone can tell, when they were sent."""
+    Message = apps.get_model('messaging', 'Message')
+    Message.objects.update(updated_at=models.F('time_stamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_messageparticipant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_time_stamp, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='msg_recipient_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['updated_at', 'id'], name='msg_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_updated_at(apps, schema_editor):
+    """Each participant row takes its message's updated_at."""
+    Message = apps.get_model('messaging', 'Message')
+    MessageParticipant = apps.get_model('messaging', 'MessageParticipant')
+    MessageParticipant.objects.update(updated_at=models.Subquery(
+        Message.objects.filter(pk=models.OuterRef('message_id')).values('updated_at'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_message_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageparticipant',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='messageparticipant',
+            index=models.Index(fields=['user', 'updated_at', 'message'], name='msg_part_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participants(apps, schema_editor):
+    """One participant row per user_a and per (different) user_b, in one INSERT ... SELECT."""
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ConversationParticipant = apps.get_model('messaging', 'ConversationParticipant')
+    quote = schema_editor.quote_name
+    conversation, participant = quote(Conversation._meta.db_table), quote(ConversationParticipant._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {participant} (conversation_id, user_id, last_message_at) "
+            f"SELECT id, user_a_id, last_message_at FROM {conversation} "
+            f"UNION ALL SELECT id, user_b_id, last_message_at FROM {conversation} WHERE user_b_id <> user_a_id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_messageparticipant_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField()),
+                ('conversation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='messaging.conversation')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_message_at', 'conversation'], name='conv_part_user_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_participant')],
+            },
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
@@ -1,27 +1,286 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings # Recommened for referencing the User model
+from django.utils import timezone
+
+
+class Conversation(models.Model):
+    """
+    A message thread between two users, optionally about one LendingRequest.
+
+    The participants are stored in a fixed order (user_a has the lower id), so
+    each pair has exactly one general thread plus one thread per lending
+    request. Use Conversation.for_participants() to look one up or create it.
+    """
+    user_a = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # No single-column index: conv_user_a_recent_idx starts with user_a
+        db_index=False,
+    )
+    user_b = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # No single-column index: conv_user_b_recent_idx starts with user_b
+        db_index=False,
+    )
+    # The lending request this thread is about (None for the pair's general thread)
+    lending_request = models.ForeignKey(
+        'lending.LendingRequest',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='conversations',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward by the Message post_save handler, here and on the
+    # participant rows, which order the thread list
+    last_message_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-last_message_at']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(user_a__lte=models.F('user_b')), name='conversation_user_order'),
+            models.UniqueConstraint(
+                fields=['user_a', 'user_b'],
+                condition=models.Q(lending_request__isnull=True),
+                name='unique_pair_conversation',
+            ),
+            models.UniqueConstraint(
+                fields=['user_a', 'user_b', 'lending_request'],
+                condition=models.Q(lending_request__isnull=False),
+                name='unique_lending_conversation',
+            ),
+        ]
+        indexes = [
+            # Conversations of either participant, most recently active first;
+            # the thread list reads conv_part_user_recent_idx instead
+            models.Index(fields=['user_a', '-last_message_at'], name='conv_user_a_recent_idx'),
+            models.Index(fields=['user_b', '-last_message_at'], name='conv_user_b_recent_idx'),
+        ]
+
+    def __str__(self):
+        about = f" about request #{self.lending_request_id}" if self.lending_request_id else ""
+        return f"Conversation {self.user_a_id} <-> {self.user_b_id}{about}"
+
+    @classmethod
+    def for_participants(cls, user_id, other_id, lending_request_id=None):
+        """The thread between two users (and lending request), created if missing."""
+        user_a, user_b = sorted((user_id, other_id))
+        lookup = {'user_a_id': user_a, 'user_b_id': user_b, 'lending_request_id': lending_request_id}
+        conversation = cls.objects.filter(**lookup).first()
+        if conversation is not None:
+            return conversation
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**lookup)
+        except IntegrityError:
+            # Created concurrently by the other participant
+            return cls.objects.get(**lookup)
+
+    def has_participant(self, user):
+        return user.pk in (self.user_a_id, self.user_b_id)
+
+
+class ConversationParticipant(models.Model):
+    """
+    One row per user in a Conversation (user_a and user_b), so a user's
+    thread list is a single equality lookup on conv_part_user_recent_idx
+    instead of an OR across user_a and user_b. last_message_at is copied
+    from the conversation so the same index also returns the threads most
+    recently active first. Kept in sync by messaging/signals.py.
+    """
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='participants',
+        # No single-column index: unique_conversation_participant starts with conversation
+        db_index=False,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # No single-column index: conv_part_user_recent_idx starts with user
+        db_index=False,
+    )
+    last_message_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', 'conversation'], name='conv_part_user_recent_idx'),
+        ]
+
+    @classmethod
+    def sync_for(cls, conversation):
+        """Write the conversation's participant rows. Its participants never change."""
+        cls.objects.bulk_create(
+            [
+                cls(conversation=conversation, user_id=user_id, last_message_at=conversation.last_message_at)
+                for user_id in {conversation.user_a_id, conversation.user_b_id}
+            ],
+            ignore_conflicts=True,
+        )
+
 
 class Message(models.Model):
     # Sender is the ForeignKey to the User model (the user sending the message)
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='sent_messages'
+        related_name='sent_messages',
+        # No single-column index: msg_sender_time_idx starts with sender
+        db_index=False,
     )
     # Recipient is the other ForeignKey (the user receiving the message)
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='received_messages'
+        related_name='received_messages',
+        # No single-column index: msg_recipient_unread_idx starts with recipient
+        db_index=False,
+    )
+    # Thread the message belongs to. Filled in by the pre_save handler when
+    # not set explicitly (the pair's general thread).
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='messages',
+        # No single-column index: msg_conversation_time_idx starts with conversation
+        db_index=False,
     )
     content = models.TextField()
     time_stamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Moved forward by every save, edits and read receipts included
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-time_stamp']
         verbose_name = "Message"
         verbose_name_plural = "Messages"
+        indexes = [
+            # Inbox (and unread filter) newest first
+            models.Index(fields=['recipient', 'is_read', '-time_stamp'], name='msg_recipient_unread_idx'),
+            # Sent messages newest first
+            models.Index(fields=['sender', '-time_stamp'], name='msg_sender_time_idx'),
+            # One thread newest first (GET /api/messages/threads/{id}/)
+            models.Index(fields=['conversation', '-time_stamp'], name='msg_conversation_time_idx'),
+            # Changes since a given time, site-wide; a user's own are read
+            # through msg_part_user_updated_idx (sync/changes.py)
+            models.Index(fields=['updated_at', 'id'], name='msg_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"From: {self.sender.username} to {self.recipient.username} - {self.time_stamp.strftime('%Y-%m-%d %H:%M')}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database so signal handlers can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class MessageParticipant(models.Model):
+    """
+    One row per user a Message belongs to (its sender and its recipient),
+    so "my messages" is a single equality lookup on msg_part_user_time_idx
+    instead of an OR across sender and recipient, which databases can't
+    serve from one index. time_stamp is copied from the message so the
+    same index also returns them newest first, and updated_at so delta sync
+    reads a user's changed messages from msg_part_user_updated_idx. Kept in
+    sync by messaging/signals.py.
+    """
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='participants',
+        # No single-column index: unique_message_participant starts with message
+        db_index=False,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # No single-column index: msg_part_user_time_idx starts with user
+        db_index=False,
+    )
+    time_stamp = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['message', 'user'], name='unique_message_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-time_stamp', 'message'], name='msg_part_user_time_idx'),
+            models.Index(fields=['user', 'updated_at', 'message'], name='msg_part_user_updated_idx'),
+        ]
+
+    @classmethod
+    def sync_for(cls, message, created=False):
+        """Make the message's participant rows match its sender and recipient."""
+        user_ids = {message.sender_id, message.recipient_id}
+        if not created:
+            cls.objects.filter(message=message).exclude(user_id__in=user_ids).delete()
+        cls.objects.bulk_create(
+            [
+                cls(message=message, user_id=user_id, time_stamp=message.time_stamp, updated_at=message.updated_at)
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def touch(cls, message_id, updated_at):
+        """Copy a change of the message's updated_at to its participant rows."""
+        cls.objects.filter(message_id=message_id).update(updated_at=updated_at)
+
+
+class InboxCounter(models.Model):
+    """
+    Denormalized inbox state of one user for one conversation partner: how
+    many of the partner's messages are unread, and the latest message either
+    way. Kept up to date by messaging/counters.py so that the inbox summary
+    reads a handful of rows instead of scanning the user's messages.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='inbox_counters',
+        # No single-column index: unique_inbox_counter starts with user
+        db_index=False,
+    )
+    partner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'partner'], name='unique_inbox_counter'),
+        ]
+        indexes = [
+            # Summary lists threads most recent first
+            models.Index(fields=['user', '-last_message_at'], name='inbox_user_recent_idx'),
+        ]
 
     def __str__(self):
-        return f"From: {self.sender.username} to {self.recipient.username} - {self.time_stamp.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"{self.user_id} <-> {self.partner_id}: {self.unread_count} unread"
\ No newline at end of file
@@ -1,22 +1,80 @@
 from rest_framework import serializers
-from .models import Message
+from lending.models import LendingRequest
+from .models import Conversation, InboxCounter, Message
 
 class MessageSerializer(serializers.ModelSerializer):
     # Read-only fields to show context, not for creation/update
     sender_username = serializers.ReadOnlyField(source='sender.username')
     recipient_username = serializers.ReadOnlyField(source='recipient.username')
+    # Optional: file the message in the thread about this lending request
+    lending_request = serializers.PrimaryKeyRelatedField(
+        queryset=LendingRequest.objects.select_related('item'),
+        required=False,
+        write_only=True,
+    )
 
     class Meta:
         model = Message
         # Fields for reading (GET)
         fields = [
             'id', 'sender', 'recipient', 'sender_username',
-            'recipient_username', 'content', 'time_stamp', 'is_read'
+            'recipient_username', 'conversation', 'lending_request',
+            'content', 'time_stamp', 'is_read'
         ]
         # Fields that should only be written (POST)
-        read_only_fields = ['sender', 'time_stamp']
+        read_only_fields = ['sender', 'conversation', 'time_stamp']
+        # Relations read by sender_username/recipient_username; applied by EagerLoadingMixin
+        select_related = ['sender', 'recipient']
+
+    def validate(self, data):
+        lending_request = data.get('lending_request')
+        if lending_request is not None:
+            # Only the borrower and the item owner can talk about a request
+            sender = self.context['request'].user
+            recipient = data.get('recipient', getattr(self.instance, 'recipient', None))
+            participants = {lending_request.borrower_id, lending_request.item.owner_id}
+            if {sender.pk, getattr(recipient, 'pk', None)} != participants:
+                raise serializers.ValidationError({
+                    "lending_request": "Messages about a lending request must be between its borrower and the item owner."
+                })
+        return data
 
     def create(self, validated_data):
         # Automatically set the sender to the authenticated user
         validated_data['sender'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        lending_request = validated_data.pop('lending_request', None)
+        if lending_request is not None:
+            validated_data['conversation'] = Conversation.for_participants(
+                validated_data['sender'].pk, validated_data['recipient'].pk, lending_request.pk,
+            )
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # Messages can't be moved to another thread
+        validated_data.pop('lending_request', None)
+        return super().update(instance, validated_data)
+
+class InboxCounterSerializer(serializers.ModelSerializer):
+    """One conversation partner in GET /api/messages/summary/."""
+    partner_username = serializers.ReadOnlyField(source='partner.username')
+    last_message = MessageSerializer(read_only=True)
+
+    class Meta:
+        model = InboxCounter
+        fields = ['partner', 'partner_username', 'unread_count', 'last_message', 'last_message_at']
+        read_only_fields = fields
+        select_related = ['partner', 'last_message', 'last_message__sender', 'last_message__recipient']
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """One thread in GET /api/messages/threads/."""
+    user_a_username = serializers.ReadOnlyField(source='user_a.username')
+    user_b_username = serializers.ReadOnlyField(source='user_b.username')
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'user_a', 'user_a_username', 'user_b', 'user_b_username',
+            'lending_request', 'created_at', 'last_message_at',
+        ]
+        read_only_fields = fields
+        select_related = ['user_a', 'user_b']
@@ -0,0 +1,58 @@
+# messaging/signals.py
+"""
+Signal handlers that keep the InboxCounter and MessageParticipant rows in
+sync with Message rows, file new messages into a Conversation, and keep
+the ConversationParticipant rows in step with their Conversation.
+Bulk operations that bypass signals (.update(), bulk_create) must call the
+functions in messaging/counters.py and MessageParticipant.sync_for() (or
+.touch()) themselves.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters
+from .models import Conversation, ConversationParticipant, Message, MessageParticipant
+
+
+@receiver(post_save, sender=Conversation)
+def conversation_saved(sender, instance, created, **kwargs):
+    if created:
+        ConversationParticipant.sync_for(instance)
+
+
+@receiver(pre_save, sender=Message)
+def message_conversation(sender, instance, **kwargs):
+    # Messages sent without a thread go to the pair's general thread
+    if instance._state.adding and instance.conversation_id is None:
+        instance.conversation = Conversation.for_participants(instance.sender_id, instance.recipient_id)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    if created:
+        MessageParticipant.sync_for(instance, created=True)
+        counters.record_message(instance)
+        # Conditional so a slower, older message can't move the thread back
+        Conversation.objects.filter(
+            pk=instance.conversation_id, last_message_at__lt=instance.time_stamp,
+        ).update(last_message_at=instance.time_stamp)
+        ConversationParticipant.objects.filter(
+            conversation_id=instance.conversation_id, last_message_at__lt=instance.time_stamp,
+        ).update(last_message_at=instance.time_stamp)
+        return
+
+    # Delta sync reads the change from the participant rows
+    MessageParticipant.touch(instance.pk, instance.updated_at)
+    loaded = getattr(instance, '_loaded_values', {})
+    if any(f in loaded and loaded[f] != getattr(instance, f) for f in ('sender_id', 'recipient_id')):
+        MessageParticipant.sync_for(instance)
+        loaded.update(sender_id=instance.sender_id, recipient_id=instance.recipient_id)
+    if 'is_read' in loaded and loaded['is_read'] != instance.is_read:
+        if instance.sender_id != instance.recipient_id:
+            counters.record_read(instance, read=instance.is_read)
+        loaded['is_read'] = instance.is_read
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, **kwargs):
+    counters.record_delete(instance)
@@ -1,3 +1,169 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from items.models import Item
+from lending.models import LendingRequest
+
+from nas_project.testing import QueryCountAssertionsMixin
+from .models import Conversation, InboxCounter, Message, MessageParticipant
+
+User = get_user_model()
+
+
+class MessageQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """List and detail endpoints must not issue one query per row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.other = User.objects.create_user(username='bob', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.message = Message.objects.create(sender=self.other, recipient=self.user, content="Hi")
+
+    def test_message_list_query_count(self):
+        def add_rows():
+            for i in range(5):
+                partner = User.objects.create_user(username=f'partner{i}')
+                Message.objects.create(sender=partner, recipient=self.user, content="Hello")
+                Message.objects.create(sender=self.user, recipient=partner, content="Hello back")
+
+        self.assertConstantQueries(self.client, '/api/messages/', 1, add_rows)
+
+    def test_message_detail_query_count(self):
+        self.assertQueryCount(self.client, f'/api/messages/{self.message.pk}/', 1)
+
+    def test_list_reads_participant_rows(self):
+        self.assertEqual(
+            set(MessageParticipant.objects.filter(message=self.message).values_list('user_id', flat=True)),
+            {self.user.pk, self.other.pk},
+        )
+        Message.objects.create(sender=self.user, recipient=self.other, content="Reply")
+        Message.objects.create(sender=self.other, recipient=User.objects.create_user(username='carol'), content="Not mine")
+
+        response = self.client.get('/api/messages/')
+        self.assertEqual([row['content'] for row in response.data['results']], ["Reply", "Hi"])
+        # The list's query: the user's participant rows, newest first
+        participant_rows = Message.objects.filter(participants__user=self.user).annotate(
+            participant_time=F('participants__time_stamp'),
+        ).order_by('-participant_time', '-pk')
+        self.assertIn('msg_part_user_time_idx', participant_rows.explain())
+
+    def test_summary_query_count(self):
+        def add_rows():
+            for i in range(5):
+                partner = User.objects.create_user(username=f'partner{i}')
+                Message.objects.create(sender=partner, recipient=self.user, content="Hello")
+
+        # One aggregate for the unread total, one query for the page
+        self.assertConstantQueries(self.client, '/api/messages/summary/', 2, add_rows)
+
+
+class InboxSummaryTests(APITestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.carol = User.objects.create_user(username='carol', password='pass12345')
+        self.client.force_authenticate(self.alice)
+
+    def summary(self):
+        response = self.client.get('/api/messages/summary/')
+        self.assertEqual(response.status_code, 200)
+        threads = {t['partner_username']: (t['unread_count'], t['last_message']['content']) for t in response.data['results']}
+        return response.data['unread_total'], threads
+
+    def test_counters_follow_messages_and_reads(self):
+        first = Message.objects.create(sender=self.bob, recipient=self.alice, content="Is the drill free?")
+        Message.objects.create(sender=self.bob, recipient=self.alice, content="For Saturday")
+        Message.objects.create(sender=self.carol, recipient=self.alice, content="Hi")
+        Message.objects.create(sender=self.alice, recipient=self.bob, content="Yes")
+        self.assertEqual(self.summary(), (3, {'bob': (2, "Yes"), 'carol': (1, "Hi")}))
+
+        # Reading twice only counts once
+        for _ in range(2):
+            self.client.get(f'/api/messages/{first.pk}/retrieve_and_mark_read/')
+        self.assertEqual(self.summary()[0], 2)
+
+        Message.objects.get(content="Hi").delete()
+        self.assertEqual(self.summary(), (1, {'bob': (1, "Yes")}))
+        self.assertFalse(InboxCounter.objects.filter(partner=self.carol).exists())
+
+
+class ConversationThreadTests(QueryCountAssertionsMixin, APITestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.carol = User.objects.create_user(username='carol', password='pass12345')
+        self.client.force_authenticate(self.alice)
+
+    def test_messages_are_filed_by_pair(self):
+        first = Message.objects.create(sender=self.alice, recipient=self.bob, content="Hi")
+        reply = Message.objects.create(sender=self.bob, recipient=self.alice, content="Hello")
+        other = Message.objects.create(sender=self.carol, recipient=self.alice, content="Hey")
+        self.assertEqual(first.conversation_id, reply.conversation_id)
+        self.assertNotEqual(first.conversation_id, other.conversation_id)
+
+        response = self.client.get('/api/messages/threads/')
+        self.assertEqual(response.status_code, 200)
+        # Most recently active thread first
+        self.assertEqual([t['id'] for t in response.data['results']], [other.conversation_id, first.conversation_id])
+
+    def test_thread_list_reads_participant_rows(self):
+        Message.objects.create(sender=self.bob, recipient=self.carol, content="Not mine")
+
+        def add_rows():
+            for i in range(5):
+                Message.objects.create(sender=User.objects.create_user(username=f'partner{i}'), recipient=self.alice, content="Hi")
+
+        # One range of the participant index, with the partners joined
+        self.assertConstantQueries(self.client, '/api/messages/threads/', 1, add_rows)
+        self.assertEqual(len(self.client.get('/api/messages/threads/').data['results']), 5)
+        participant_rows = Conversation.objects.filter(participants__user=self.alice).annotate(
+            participant_time=F('participants__last_message_at'),
+        ).order_by('-participant_time', '-pk')
+        self.assertIn('conv_part_user_recent_idx', participant_rows.explain())
+
+    def test_lending_request_thread(self):
+        item = Item.objects.create(owner=self.bob, name="Drill", description="Cordless", location="Accra", condition='Good')
+        lending_request = LendingRequest.objects.create(
+            item=item, borrower=self.alice, requested_from='2030-01-01', requested_to='2030-01-03',
+        )
+        response = self.client.post('/api/messages/', {
+            'recipient': self.bob.pk, 'content': "Can I pick it up early?", 'lending_request': lending_request.pk,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        conversation = Conversation.objects.get(pk=response.data['conversation'])
+        self.assertEqual(conversation.lending_request_id, lending_request.pk)
+
+        # Carol is not part of the request
+        response = self.client.post('/api/messages/', {
+            'recipient': self.carol.pk, 'content': "Hi", 'lending_request': lending_request.pk,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_thread_pages_backwards(self):
+        for i in range(5):
+            Message.objects.create(sender=self.bob, recipient=self.alice, content=f"Message {i}")
+        thread_id = Message.objects.first().conversation_id
+
+        response = self.client.get(f'/api/messages/threads/{thread_id}/?page_size=3')
+        self.assertEqual([m['content'] for m in response.data['results']], ["Message 4", "Message 3", "Message 2"])
+        self.assertIn('before=', response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([m['content'] for m in response.data['results']], ["Message 1", "Message 0"])
+
+    def test_thread_query_count(self):
+        thread_id = Message.objects.create(sender=self.bob, recipient=self.alice, content="Hi").conversation_id
+
+        def add_rows():
+            for i in range(5):
+                Message.objects.create(sender=self.alice, recipient=self.bob, content=f"Reply {i}")
+
+        # The conversation check and one slice of the thread
+        self.assertConstantQueries(self.client, f'/api/messages/threads/{thread_id}/', 2, add_rows)
+
+    def test_other_users_thread_is_hidden(self):
+        thread_id = Message.objects.create(sender=self.bob, recipient=self.carol, content="Hi").conversation_id
+        response = self.client.get(f'/api/messages/threads/{thread_id}/')
+        self.assertEqual(response.status_code, 404)
@@ -1,18 +1,97 @@
+from django.db import transaction
+from django.db.models import F, Sum
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Message
-from .serializers import MessageSerializer
+from nas_project.eager_loading import EagerLoadingMixin, setup_eager_loading
+from nas_project.pagination import (
+    LastMessageKeysetPagination, ParticipantKeysetPagination, ThreadMessagesPagination,
+)
+from . import counters
+from .models import Conversation, InboxCounter, Message, MessageParticipant
+from .serializers import ConversationSerializer, InboxCounterSerializer, MessageSerializer
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     # Only authenticated users can access messages
     permission_classes = [permissions.IsAuthenticated]
+    queryset = Message.objects.all()
     serializer_class = MessageSerializer
+    # Newest messages first, by the participant row's copy of time_stamp
+    pagination_class = ParticipantKeysetPagination
+    # Only request.user's id is needed: authenticate from the token claims (users/authentication.py)
+    claims_only_user = True
 
     def get_queryset(self):
-        # Only show messages where the authenticated user is either the sender OR the recipient
+        # Only show messages where the authenticated user is either the sender OR the recipient:
+        # one lookup on msg_part_user_time_idx rather than an OR across the two columns
         user = self.request.user
-        return Message.objects.filter(sender=user) | Message.objects.filter(recipient=user)
+        return super().get_queryset().filter(participants__user=user).annotate(
+            participant_time=F('participants__time_stamp'),
+        )
+
+    def perform_create(self, serializer):
+        # The message and its inbox counter updates (post_save) commit together
+        with transaction.atomic():
+            serializer.save()
+
+    # GET /api/messages/summary/
+    @action(
+        detail=False, methods=['get'],
+        serializer_class=InboxCounterSerializer,
+        pagination_class=LastMessageKeysetPagination,
+    )
+    def summary(self, request):
+        """
+        Unread count and latest message per conversation partner, most recent
+        first, plus the total unread count. Reads the denormalized
+        InboxCounter rows only, never the messages table.
+        """
+        user_counters = InboxCounter.objects.filter(user=request.user)
+        unread_total = user_counters.aggregate(total=Sum('unread_count'))['total'] or 0
+
+        page = self.paginate_queryset(setup_eager_loading(user_counters, InboxCounterSerializer))
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['unread_total'] = unread_total
+        return response
+
+    # GET /api/messages/threads/
+    @action(
+        detail=False, methods=['get'],
+        serializer_class=ConversationSerializer,
+        pagination_class=ParticipantKeysetPagination,
+    )
+    def threads(self, request):
+        """
+        The user's conversations, most recently active first: one range of
+        conv_part_user_recent_idx per page.
+        """
+        conversations = Conversation.objects.filter(participants__user=request.user).annotate(
+            participant_time=F('participants__last_message_at'),
+        )
+        page = self.paginate_queryset(setup_eager_loading(conversations, ConversationSerializer))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    # GET /api/messages/threads/{id}/?before=<cursor>
+    @action(
+        detail=False, methods=['get'],
+        url_path=r'threads/(?P<thread_id>[0-9]+)',
+        pagination_class=ThreadMessagesPagination,
+    )
+    def thread(self, request, thread_id=None):
+        """
+        One conversation, newest message first. Each page is a single slice of
+        msg_conversation_time_idx, however long the user's message history is.
+        """
+        # Looked up by pk alone; membership is checked on the row
+        conversation = get_object_or_404(Conversation.objects.only('pk', 'user_a_id', 'user_b_id'), pk=thread_id)
+        if not conversation.has_participant(request.user):
+            raise Http404
+        messages = setup_eager_loading(conversation.messages.all(), MessageSerializer)
+        page = self.paginate_queryset(messages)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
 
     # Custom action to retrieve a single message and mark it as read
     @action(detail=True, methods=['get'])
@@ -23,10 +102,17 @@ class MessageViewSet(viewsets.ModelViewSet):
         if message.sender != request.user and message.recipient != request.user:
             return Response({"detail": "Not authorized to view this message."}, status=403)
 
-        # Mark as read if the current user is the recipient and it's unread
+        # Mark as read if the current user is the recipient and it's unread.
+        # The conditional UPDATE makes sure only one concurrent request
+        # decrements the unread counter. update() skips auto_now and the
+        # signals: updated_at is set here so delta sync replays the read receipt.
         if message.recipient == request.user and not message.is_read:
+            now = timezone.now()
+            with transaction.atomic():
+                if Message.objects.filter(pk=message.pk, is_read=False).update(is_read=True, updated_at=now):
+                    MessageParticipant.touch(message.pk, now)
+                    counters.record_read(message)
             message.is_read = True
-            message.save()
 
         serializer = self.get_serializer(message)
         return Response(serializer.data)
\ No newline at end of file
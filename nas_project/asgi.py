@@ -2,6 +2,8 @@
 ASGI config for nas_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections go to the real-time push
+endpoint in realtime/websocket.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nas_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up (it uses models and settings)
+from realtime.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,102 @@
+# nas_project/conditional.py
+"""
+Conditional GET for viewsets, answered before anything is serialized.
+
+The validators are computed with one query over the rows a response is
+built from:
+- a list: the requested page only, read with the same keyset query as the
+  page itself but just the key columns. Its ETag hashes each row's pk and
+  updated_at, so a row deleted from the page counts as a change, and the
+  cost does not grow with the table.
+- a detail: the row's updated_at.
+The ETag also covers the request URL and user, and the response cache
+versions of any related data the response shows (see
+get_etag_dependencies()).
+
+Last-Modified is only sent where the newest updated_at really is the last
+change: on a detail response that shows nothing else. On a list, a deleted
+row or a related change leaves it as it was, and an If-Modified-Since
+request would get a 304 for a changed response.
+
+A request whose If-None-Match (or, without one, If-Modified-Since) still
+matches gets a 304 right away; otherwise the response is built as usual and
+carries the validators.
+
+This is for responses that are not cached. Viewsets using the response
+cache (nas_project/response_cache.py) get their ETags and 304s from it; a
+second set of validators would only cost its query on every cache hit.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .response_cache import current_versions
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin adding ETag/Last-Modified validators to list() and
+    retrieve(). The model needs an updated_at column (`updated_field`).
+    """
+    updated_field = 'updated_at'
+
+    def get_etag_dependencies(self):
+        """Response cache version keys of related data shown in responses."""
+        return []
+
+    def _etag(self, request, *parts):
+        source = '|'.join(map(str, [
+            request.get_full_path(), request.user.pk, *parts, *current_versions(self.get_etag_dependencies()),
+        ]))
+        # Weak: equal validators mean an equivalent, not byte-identical, body
+        return f'W/"{hashlib.sha256(source.encode()).hexdigest()[:32]}"'
+
+    def _page_keys(self, request, queryset):
+        """[(pk, updated_at)] of the requested page and whether pages follow or precede it."""
+        queryset = queryset.prefetch_related(None)
+        if self.pagination_class is not None:
+            # A paginator of its own: self.paginator builds the real page later
+            paginator = self.pagination_class()
+            ordering = [field.lstrip('-') for field in paginator.get_ordering(request, queryset, self)]
+            fields = dict.fromkeys(['pk', self.updated_field, *ordering])
+            rows = paginator.paginate_queryset(queryset.values(*fields), request, view=self)
+            if rows is not None:
+                keys = [(row['pk'], row[self.updated_field]) for row in rows]
+                return keys, paginator.has_next, paginator.has_previous
+        # Unpaginated: the response shows every row
+        return list(queryset.order_by('pk').values_list('pk', self.updated_field)), False, False
+
+    def _conditional(self, request, build, etag, last_modified=None):
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        response = not_modified or build()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        build = lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        keys, has_next, has_previous = self._page_keys(request, self.filter_queryset(self.get_queryset()))
+        return self._conditional(request, build, self._etag(request, keys, has_next, has_previous))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        try:
+            latest = queryset.aggregate(latest=Max(self.updated_field))['latest']
+        except (TypeError, ValueError, ValidationError):
+            # A malformed lookup value: let retrieve() answer it (404)
+            return build()
+        if latest is None:
+            # No such row: retrieve() answers 404
+            return build()
+        # HTTP dates have whole seconds, so Last-Modified is truncated to match
+        last_modified = None if self.get_etag_dependencies() else int(latest.timestamp())
+        return self._conditional(request, build, self._etag(request, latest.isoformat()), last_modified)
@@ -0,0 +1,125 @@
+# nas_project/eager_loading.py
+"""
+Serializer-driven eager loading for viewsets.
+
+Serializers declare the relations their read-only fields walk through, e.g.
+
+    class Meta:
+        model = Item
+        select_related = ['owner']       # forward FKs (single JOIN)
+        prefetch_related = []            # reverse / many relations (one extra query)
+
+and any viewset using EagerLoadingMixin applies the matching select_related(),
+prefetch_related() and, for read-only requests, only() to its queryset. This
+keeps list endpoints at a fixed number of queries no matter how many rows
+are returned (no N+1 lookups for 'owner.username' and friends).
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+
+def _field_lookups(serializer, model, prefix, prefetched):
+    """
+    only() lookups for the readable fields of `serializer` (whose instances
+    are `model` rows reached through `prefix`), or None if a field can't be
+    mapped to concrete columns.
+    """
+    lookups = set()
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+
+        current_model = model
+        parts = list(prefix)
+        for attr in field.source_attrs:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            parts.append(attr)
+            if model_field.is_relation and (model_field.many_to_many or model_field.one_to_many):
+                # Reverse/many relations are loaded by prefetch_related instead.
+                if '__'.join(parts) not in prefetched:
+                    return None
+                parts = None
+                break
+            if model_field.is_relation:
+                current_model = model_field.related_model
+        if not parts:
+            continue
+
+        lookups.add('__'.join(parts))
+        if isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer):
+            # Nested serializer for a forward relation: load the columns it reads too
+            nested = _field_lookups(field, current_model, parts, prefetched)
+            if nested is None:
+                return None
+            lookups |= nested
+    return lookups
+
+
+@lru_cache(maxsize=None)
+def _only_fields(serializer_class):
+    """
+    Work out the model columns a serializer reads, as only() lookups.
+
+    Returns None when a field can't be mapped to concrete columns (methods,
+    properties, source='*'), in which case we don't restrict the columns at all.
+    """
+    meta = serializer_class.Meta
+    model = meta.model
+    prefetched = set(getattr(meta, 'prefetch_related', []))
+
+    lookups = _field_lookups(serializer_class(), model, [], prefetched)
+    if lookups is None:
+        return None
+    lookups.add(model._meta.pk.name)
+
+    # select_related paths must never be deferred, so always load them.
+    for path in getattr(meta, 'select_related', []):
+        parts = path.split('__')
+        for i in range(1, len(parts) + 1):
+            lookups.add('__'.join(parts[:i]))
+
+    return tuple(sorted(lookups))
+
+
+def setup_eager_loading(queryset, serializer_class, read_only=True):
+    """Apply a serializer's declared relations (and column list) to a queryset."""
+    meta = getattr(serializer_class, 'Meta', None)
+    if meta is None or getattr(meta, 'model', None) is not queryset.model:
+        return queryset
+
+    select_related = getattr(meta, 'select_related', [])
+    prefetch_related = getattr(meta, 'prefetch_related', [])
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+
+    # Deferred instances only save the columns they loaded (which would skip
+    # auto_now fields such as updated_at), so only() is for reads only.
+    if read_only:
+        only = _only_fields(serializer_class)
+        if only:
+            queryset = queryset.only(*only)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Viewset mixin: eager-load whatever the serializer declares it needs.
+    Must come before the DRF viewset class in the bases.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return setup_eager_loading(
+            queryset,
+            self.get_serializer_class(),
+            read_only=self.request.method in permissions.SAFE_METHODS,
+        )
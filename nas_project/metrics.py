@@ -0,0 +1,382 @@
+# nas_project/metrics.py
+"""
+Per-endpoint request metrics, served in Prometheus text format at /metrics.
+
+QueryMetricsMiddleware times every request and, through
+connection.execute_wrapper(), every SQL query it runs. Per route (the URL
+pattern's view name) and method it keeps:
+- wall time, time spent in the database and number of queries, each in an
+  HDR-style histogram (see Histogram), and
+- counters of responses per status, of duplicate queries (the same SQL with
+  the same parameters run again in one request) and of requests over the
+  query budget.
+
+A request that runs more queries than QUERY_BUDGET (or its route's entry in
+QUERY_BUDGET_OVERRIDES) is logged as a warning on 'nas_project.metrics',
+with its most repeated statement, which is usually the N+1 culprit.
+
+Everything is in process memory: every server process exports its own
+numbers, and Prometheus sums them.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_ROUTE = '<unresolved>'
+
+# Prometheus bucket boundaries exported from the histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+# -------------------------------------------------------------
+# Histograms
+# -------------------------------------------------------------
+
+class Histogram:
+    """
+    HDR-style log-linear histogram of non-negative integers (microseconds,
+    query counts). Values below 2 * SUB_BUCKETS are counted exactly; above
+    that, every power of two is split into SUB_BUCKETS equal buckets, so a
+    value is known to within 1/SUB_BUCKETS (12.5%) of itself at any
+    magnitude, in a few dozen buckets, with O(1) recording.
+    """
+    SUB_BUCKET_BITS = 3
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.buckets = defaultdict(int)  # bucket lower bound -> count
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def _lower_bound(cls, value):
+        shift = max(value.bit_length() - cls.SUB_BUCKET_BITS - 1, 0)
+        return (value >> shift) << shift
+
+    @classmethod
+    def _highest_equivalent(cls, lower):
+        """The largest value counted in the bucket starting at `lower`."""
+        return lower + (1 << max(lower.bit_length() - cls.SUB_BUCKET_BITS - 1, 0)) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self.buckets[self._lower_bound(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """The value at or below which `fraction` of the recorded values lie."""
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for lower in sorted(self.buckets):
+            seen += self.buckets[lower]
+            if seen >= target:
+                return min(self._highest_equivalent(lower), self.max)
+        return self.max
+
+    def cumulative(self, boundaries):
+        """[(boundary, values <= boundary)] for Prometheus 'le' buckets."""
+        result = []
+        for boundary in boundaries:
+            result.append((boundary, sum(
+                count for lower, count in self.buckets.items() if self._highest_equivalent(lower) <= boundary
+            )))
+        return result
+
+
+class RouteStats:
+    def __init__(self):
+        self.duration = Histogram()   # microseconds
+        self.db_time = Histogram()    # microseconds
+        self.queries = Histogram()    # per request
+        self.responses = Counter()    # status code -> count
+        self.duplicate_queries = 0
+        self.over_budget = 0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = defaultdict(RouteStats)
+
+    def record(self, route, method, status, duration, db_time, queries, duplicates, over_budget):
+        with self._lock:
+            stats = self.routes[(route, method)]
+            stats.duration.record(duration * 1_000_000)
+            stats.db_time.record(db_time * 1_000_000)
+            stats.queries.record(queries)
+            stats.responses[status] += 1
+            stats.duplicate_queries += duplicates
+            stats.over_budget += over_budget
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+
+registry = Registry()
+
+
+# -------------------------------------------------------------
+# Recording
+# -------------------------------------------------------------
+
+class QueryRecorder:
+    """execute_wrapper() that counts and times a request's queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()   # SQL text -> executions
+        self.executions = Counter()   # (SQL text, parameters) -> executions
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.executions.values() if count > 1)
+
+
+class RecordedStream:
+    """
+    streaming_content wrapper: a StreamingHttpResponse calls the close() of
+    its content when it is closed itself, whether or not it was sent in full.
+    """
+
+    def __init__(self, content, on_close):
+        self.content = content
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class AsyncRecordedStream(RecordedStream):
+    def __aiter__(self):
+        return aiter(self.content)
+
+
+def query_budget(route):
+    return settings.QUERY_BUDGET_OVERRIDES.get(route, settings.QUERY_BUDGET)
+
+
+class QueryMetricsMiddleware:
+    """
+    Record time, DB time and queries per request (see module docstring).
+
+    Sync and async capable: under ASGI the async views (users/views.py) run
+    without a detour through a thread. Database connections are per thread,
+    so there the query wrappers are installed, and removed, in the thread
+    that the request's sync_to_async calls run in.
+
+    A streaming response (the item export) runs its queries while it is
+    sent, after the view has returned: it is recorded when the server
+    closes it, with the time and queries of the whole stream.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def wrap_queries(stack, recorder):
+        """Send this thread's queries through `recorder` until `stack` closes."""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.path == settings.METRICS_PATH:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = ExitStack()
+        self.wrap_queries(stack, recorder)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+        if response.streaming:
+            return self.record_on_close(request, response, recorder, started, stack)
+        stack.close()
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if request.path == settings.METRICS_PATH:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.wrap_queries)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(stack.close)()
+            raise
+        if response.streaming:
+            # ASGIHandler closes the response from the request's sync thread
+            return self.record_on_close(request, response, recorder, started, stack)
+        await sync_to_async(stack.close)()
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def record_on_close(self, request, response, recorder, started, stack):
+        """Keep counting queries until the streaming response is closed, then record it."""
+        def finish():
+            stack.close()
+            self.record(request, response, recorder, time.perf_counter() - started)
+
+        stream_class = AsyncRecordedStream if response.is_async else RecordedStream
+        response.streaming_content = stream_class(response.streaming_content, finish)
+        return response
+
+    def record(self, request, response, recorder, duration):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else UNRESOLVED_ROUTE
+        budget = query_budget(route)
+        over_budget = recorder.count > budget
+        if over_budget:
+            statement, repeats = recorder.statements.most_common(1)[0]
+            logger.warning(
+                "%s %s (%s) ran %d queries, over its budget of %d; most repeated (%dx): %s",
+                request.method, request.path, route, recorder.count, budget, repeats, statement[:500],
+            )
+        registry.record(
+            route, request.method, response.status_code, duration, recorder.time,
+            recorder.count, recorder.duplicates, over_budget,
+        )
+
+
+# -------------------------------------------------------------
+# Exposition
+# -------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, routes, attribute, boundaries, scale):
+    """Prometheus histogram family from one Histogram per route (values divided by `scale`)."""
+    for (route, method), stats in routes:
+        histogram = getattr(stats, attribute)
+        for boundary, count in histogram.cumulative([b * scale for b in boundaries]):
+            yield f'{name}_bucket{_labels(route=route, method=method, le=boundary / scale)} {count}'
+        yield f'{name}_bucket{_labels(route=route, method=method, le="+Inf")} {histogram.count}'
+        yield f'{name}_sum{_labels(route=route, method=method)} {histogram.total / scale}'
+        yield f'{name}_count{_labels(route=route, method=method)} {histogram.count}'
+
+
+def render(registry=registry):
+    """The registry in Prometheus text exposition format (0.0.4)."""
+    # Imported here: the cache module pulls in DRF, which metrics shouldn't need
+    from .response_cache import cache_stats
+
+    with registry._lock:
+        routes = sorted(registry.routes.items())
+        lines = [
+            '# HELP http_requests_total Responses by route, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method), stats in routes:
+            for status, count in sorted(stats.responses.items()):
+                lines.append(f'http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Wall time per request.',
+            '# TYPE http_request_duration_seconds histogram',
+            *_histogram_lines('http_request_duration_seconds', routes, 'duration', DURATION_BUCKETS, 1_000_000),
+            '# HELP http_request_duration_quantile_seconds Wall time quantiles per request (from the HDR histogram).',
+            '# TYPE http_request_duration_quantile_seconds gauge',
+        ]
+        for (route, method), stats in routes:
+            for quantile in QUANTILES:
+                value = stats.duration.percentile(quantile) / 1_000_000
+                lines.append(
+                    f'http_request_duration_quantile_seconds{_labels(route=route, method=method, quantile=quantile)} {value}'
+                )
+
+        lines += [
+            '# HELP http_request_db_seconds Time spent in SQL queries per request.',
+            '# TYPE http_request_db_seconds histogram',
+            *_histogram_lines('http_request_db_seconds', routes, 'db_time', DURATION_BUCKETS, 1_000_000),
+            '# HELP http_request_queries SQL queries per request.',
+            '# TYPE http_request_queries histogram',
+            *_histogram_lines('http_request_queries', routes, 'queries', QUERY_COUNT_BUCKETS, 1),
+            '# HELP http_request_duplicate_queries_total Queries repeated with identical SQL and parameters within a request.',
+            '# TYPE http_request_duplicate_queries_total counter',
+        ]
+        for (route, method), stats in routes:
+            lines.append(f'http_request_duplicate_queries_total{_labels(route=route, method=method)} {stats.duplicate_queries}')
+        lines += [
+            '# HELP http_request_query_budget_exceeded_total Requests that ran more queries than their budget.',
+            '# TYPE http_request_query_budget_exceeded_total counter',
+        ]
+        for (route, method), stats in routes:
+            lines.append(f'http_request_query_budget_exceeded_total{_labels(route=route, method=method)} {stats.over_budget}')
+
+    lines += [
+        '# HELP api_response_cache_total Response cache lookups by endpoint and outcome.',
+        '# TYPE api_response_cache_total counter',
+    ]
+    for endpoint, counts in cache_stats().items():
+        for outcome, count in counts.items():
+            lines.append(f'api_response_cache_total{_labels(endpoint=endpoint, outcome=outcome)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    GET /metrics for Prometheus. With METRICS_TOKEN set, scrapers must send
+    "Authorization: Bearer <token>"; without it, only METRICS_ALLOWED_IPS
+    may read it.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,147 @@
+# nas_project/pagination.py
+"""
+Shared pagination classes for the API.
+
+We use keyset (cursor) pagination everywhere instead of page numbers:
+- The cursor encodes the position of the last row seen, so each page is a
+  simple "WHERE <ordering field> < ? ORDER BY ... LIMIT n" query.
+- No COUNT(*) query is ever issued, so page latency does not depend on how
+  deep the client has paged or how large the table is.
+- Cursors are opaque (base64 encoded) and stay stable when new rows are
+  inserted at the head of the list.
+"""
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def positive_int(value, strict=False, cutoff=None):
+    """
+    Parse a query parameter as an int >= 0 (> 0 if strict), at most cutoff.
+    Raises ValueError otherwise.
+    """
+    number = int(value)
+    if number < 0 or (strict and number == 0):
+        raise ValueError(value)
+    return min(number, cutoff) if cutoff else number
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Base cursor paginator used as the project-wide DEFAULT_PAGINATION_CLASS.
+
+    Clients may ask for a smaller or larger page with ?page_size=N, capped by
+    the API_MAX_PAGE_SIZE setting.
+    """
+    # Default ordering for models without a timestamp; subclasses override it.
+    ordering = '-pk'
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        # Read per request, so the setting can change after import (and in tests)
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Newest first, for models with a 'created_at' column (Item, LendingRequest)."""
+    ordering = '-created_at'
+
+
+class TimeStampKeysetPagination(KeysetPagination):
+    """Newest first, for the Message model's 'time_stamp' column."""
+    ordering = '-time_stamp'
+
+
+class ParticipantKeysetPagination(KeysetPagination):
+    """
+    Newest first, for "my rows" querysets read through a participant table
+    (MessageParticipant, LendingParticipant, ConversationParticipant). The
+    viewset annotates the participant row's copy of the timestamp as
+    'participant_time', so each page is one range scan of the participant
+    index.
+    """
+    ordering = '-participant_time'
+
+
+class ThreadMessagesPagination(TimeStampKeysetPagination):
+    """
+    One conversation, newest message first. The next link carries
+    ?before=<cursor> to load older messages as the client scrolls up.
+    """
+    cursor_query_param = 'before'
+
+
+class LastMessageKeysetPagination(KeysetPagination):
+    """Most recently active first, for InboxCounter rows."""
+    ordering = '-last_message_at'
+
+
+class RankedResultsPagination(BasePagination):
+    """
+    Offset paging for relevance-ranked results (search), where there is no
+    column to build a keyset cursor from. It fetches one row more than the
+    page size to find out whether there is a next page, so it still never
+    runs a COUNT(*).
+
+    Usage:
+        paginator = RankedResultsPagination()
+        rows = paginator.paginate_results(lambda limit, offset: ..., request)
+        return paginator.get_paginated_response(serializer(rows).data)
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    offset_query_param = 'offset'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+    def get_page_size(self, request):
+        try:
+            return positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_offset(self, request):
+        try:
+            return positive_int(request.query_params[self.offset_query_param])
+        except (KeyError, ValueError):
+            return 0
+
+    def paginate_results(self, fetch, request):
+        """Call fetch(limit, offset) for one page of results."""
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.offset = self.get_offset(request)
+        rows = list(fetch(self.limit + 1, self.offset))
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        url = self.request.build_absolute_uri()
+        previous_offset = max(self.offset - self.limit, 0)
+        if previous_offset == 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, previous_offset)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,188 @@
+# nas_project/response_cache.py
+"""
+Cache for serialized viewset responses, with versioned keys.
+
+Every cached response is filed under the current "version" of what it was
+built from:
+- a model version ('items.item'), bumped by any change to that model, for
+  list responses, and
+- an object version ('items.item:42'), bumped by a change to that row, for
+  detail responses.
+Versions are random tokens kept in the cache itself; invalidate() replaces
+them, so stale entries are never read again and simply expire. The apps call
+invalidate() from post_save/post_delete handlers (and after bulk writes that
+skip signals), once the transaction has committed.
+
+Responses carry an ETag; a request whose If-None-Match matches gets a 304
+without the response being rebuilt (or even read from the database).
+
+Viewsets opt in with CachedListMixin / CachedRetrieveMixin. The backend is
+the API_CACHE_ALIAS entry of CACHES (locmem, file or Redis; see
+settings.py). Hit/miss counts are kept per process and served by
+CacheStatsView.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'not_modified': 0})
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _version_key(model, pk=None):
+    label = model._meta.label_lower
+    return f'ver:{label}' if pk is None else f'ver:{label}:{pk}'
+
+
+def model_version(model):
+    """Dependency on every row of `model` (for list responses)."""
+    return _version_key(model)
+
+
+def object_version(model, pk):
+    """Dependency on one row of `model` (for detail responses)."""
+    return _version_key(model, pk)
+
+
+def invalidate(model, *pks):
+    """
+    Retire cached responses built from `model` (and from rows `pks` of it)
+    once the current transaction commits.
+    """
+    keys = [_version_key(model)] + [_version_key(model, pk) for pk in pks]
+
+    def bump():
+        get_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def current_versions(keys, cache=None):
+    """The current token of each version key, created if missing."""
+    cache = cache or get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, token in missing.items():
+        # add(): if another process created it first, use theirs
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key, token)
+        versions[key] = token
+    return [versions[key] for key in keys]
+
+
+def _record(name, outcome):
+    with _stats_lock:
+        _stats[name][outcome] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in sorted(_stats.items())}
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+
+def cached_response(request, name, dependencies, build, per_user=False):
+    """
+    Serve build()'s Response from the cache, filed under the request's URL
+    (and user, if per_user) and the current versions of `dependencies`.
+    Only 200 responses are cached.
+    """
+    cache = get_cache()
+    versions = current_versions(list(dependencies), cache)
+    key_source = json.dumps([
+        request.get_full_path(),
+        request.headers.get('Accept', ''),
+        request.user.pk if per_user else None,
+        versions,
+    ])
+    key = f'resp:{name}:{hashlib.sha256(key_source.encode()).hexdigest()}'
+
+    entry = cache.get(key)
+    if entry is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        body = json.dumps(response.data, cls=JSONEncoder, sort_keys=True)
+        entry = (response.data, f'"{hashlib.md5(body.encode()).hexdigest()}"')
+        cache.set(key, entry, settings.API_CACHE_TIMEOUT)
+        _record(name, 'misses')
+    else:
+        _record(name, 'hits')
+
+    data, etag = entry
+    if _etag_matches(request, etag):
+        _record(name, 'not_modified')
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    # Personal responses must not be stored by shared caches
+    response['Cache-Control'] = 'private, no-cache' if per_user else 'no-cache'
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Base for the viewset mixins below. Viewsets declare what their responses
+    are built from:
+        def get_cache_dependencies(self):
+            return [model_version(Item)]  # or [object_version(Item, pk)]
+    and set cache_per_user = True when the response differs per user.
+    """
+    cache_per_user = False
+
+    def get_cache_dependencies(self):
+        raise NotImplementedError
+
+    def cached(self, request, build):
+        return cached_response(
+            request, f'{self.basename}-{self.action}', self.get_cache_dependencies(), build,
+            per_user=self.cache_per_user,
+        )
+
+
+class CachedListMixin(CachedResponseMixin):
+    """Cache list() responses (GET on the collection)."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedListMixin, self).list(request, *args, **kwargs))
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+    """Cache retrieve() responses (GET on one object)."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedRetrieveMixin, self).retrieve(request, *args, **kwargs))
+
+
+class CacheStatsView(APIView):
+    """GET /api/cache/stats/: response cache hits/misses per endpoint (this process). Staff only."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        stats = cache_stats()
+        hits = sum(counts['hits'] for counts in stats.values())
+        misses = sum(counts['misses'] for counts in stats.values())
+        return Response({
+            'backend': settings.CACHES[settings.API_CACHE_ALIAS]['BACKEND'],
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'endpoints': stats,
+        })
@@ -57,9 +57,14 @@ INSTALLED_APPS = [
     'items.apps.ItemsConfig',
     'lending.apps.LendingConfig',
     'messaging',
+    'realtime.apps.RealtimeConfig',
+    'sync.apps.SyncConfig',
+    'benchmarks.apps.BenchmarksConfig',
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it times (and counts the queries of) everything below it
+    'nas_project.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # Update SessionMiddleware for production performance if using Redis/Cache
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -93,12 +98,68 @@ WSGI_APPLICATION = 'nas_project.wsgi.application'
 # DATABASE
 # -----------------------------------------------------------
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default, for development) or DB_ENGINE=postgres.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'nas'),
+            'USER': os.environ.get('DB_USER', 'nas'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Keep connections open between requests instead of reconnecting
+            # every time, and check them before reuse so a server restart
+            # doesn't surface as one failed request per worker.
+            # (A pool manages its own connections: CONN_MAX_AGE must be 0.)
+            'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # DB_POOL_MAX_SIZE > 0: a psycopg connection pool per process
+                # (needs psycopg[pool]); size it so that processes x max_size
+                # stays under the server's max_connections.
+                **({'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': DB_POOL_MAX_SIZE,
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                }} if DB_POOL_MAX_SIZE else {}),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Run on every new connection:
+                # - WAL lets readers carry on while one connection writes,
+                # - synchronous=NORMAL fsyncs at checkpoints instead of on
+                #   every commit (safe with WAL; a power cut can lose only
+                #   the last transactions, never corrupt the file),
+                # - busy_timeout makes a writer wait for the lock instead of
+                #   failing at once with "database is locked".
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA busy_timeout={int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))};"
+                ),
+                # Take the write lock when a transaction starts. With the
+                # default (DEFERRED), a transaction that read first and then
+                # writes can't wait for the lock: SQLite fails it immediately
+                # to avoid a deadlock, whatever the busy timeout.
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # A file for the test database too: the default in-memory one is
+            # shared-cache, where a second writer fails at once ("database
+            # table is locked") instead of waiting, so concurrency tests
+            # couldn't run against it
+            'TEST': {'NAME': os.environ.get('DB_TEST_NAME', BASE_DIR / 'test_db.sqlite3')},
+        }
     }
-}
 
 
 # Password validation
@@ -118,6 +179,28 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# -----------------------------------------------------------
+# PASSWORD HASHING (users/hashing.py)
+# -----------------------------------------------------------
+
+# Django's hashers, with PBKDF2 at a configurable cost first. Existing hashes
+# keep verifying and are redone at the new cost on the next login.
+PASSWORD_HASHERS = [
+    'users.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# PBKDF2 iterations per hash (0 = Django's default, 1,000,000 in Django 5.2)
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0))
+# Registration and login hash in this many threads per process; this many more
+# requests may wait for one, and the rest get a 503 with this Retry-After
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 32))
+PASSWORD_HASHING_RETRY_AFTER = int(os.environ.get('PASSWORD_HASHING_RETRY_AFTER', 1))
+
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -136,6 +219,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded images are re-encoded into content-hashed thumbnails under
+# MEDIA_ROOT/thumbs/ (see nas_project/thumbnails.py), in a worker pool unless
+# THUMBNAIL_ASYNC is off. Serve /media/thumbs/ with
+# "Cache-Control: public, max-age=31536000, immutable".
+THUMBNAIL_ASYNC = os.environ.get('THUMBNAIL_ASYNC', 'True') == 'True'
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+
+# Resumable item photo uploads (items/uploads.py): partial files are kept
+# here, outside MEDIA_ROOT, until they are finalized.
+PHOTO_UPLOAD_DIR = os.environ.get('PHOTO_UPLOAD_DIR', os.path.join(BASE_DIR, 'photo_uploads'))
+ITEM_PHOTO_MAX_BYTES = int(os.environ.get('ITEM_PHOTO_MAX_BYTES', 20 * 1024 * 1024))
+
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -151,7 +246,8 @@ AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
     # Sets default authentication to JWT (for dynamic tokens) and Session (for browsable API)
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication', # Replaces TokenAuthentication
+        # simplejwt's JWTAuthentication, with the user served from a cache (see users/authentication.py)
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     # Sets the default permission: requires login for almost all views
@@ -161,8 +257,130 @@ REST_FRAMEWORK = {
     # Forces date-time serialization to a standard format
     'DATETIME_FORMAT': "%Y-%m-%dT%H:%M:%S%z",
     'DATE_FORMAT': "%Y-%m-%d",
+    # Keyset (cursor) pagination for every list endpoint: no COUNT(*) queries,
+    # so page latency stays flat no matter how large the tables grow.
+    'DEFAULT_PAGINATION_CLASS': 'nas_project.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 20)),
 }
 
+# Upper bound for the ?page_size= query parameter accepted by the paginators.
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+
+
+# -----------------------------------------------------------
+# REQUEST METRICS (nas_project/metrics.py, scraped at /metrics)
+# -----------------------------------------------------------
+
+METRICS_PATH = '/metrics'
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token,
+# only these addresses may read the metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+# Requests running more SQL queries than this are logged as warnings.
+# Endpoints that legitimately run more get their own budget, by view name.
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 20))
+QUERY_BUDGET_OVERRIDES = {
+    # One INSERT (plus search index writes) per chunk of rows
+    'item-bulk': 200,
+    # Sending a message also files it in a thread and updates participant
+    # rows and both users' inbox counters
+    'message-list': 30,
+}
+
+
+# -----------------------------------------------------------
+# CACHES (API responses are cached in the 'api' cache, see
+# nas_project/response_cache.py)
+# -----------------------------------------------------------
+
+# API_CACHE_BACKEND picks where cached responses live:
+# 'locmem' (per process, the default), 'file' (shared by the processes on
+# one host, under API_CACHE_LOCATION) or 'redis' (shared by every host,
+# at API_CACHE_LOCATION, e.g. redis://127.0.0.1:6379/1).
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'locmem')
+_API_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'api-responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache', 'api')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': _API_CACHE_BACKENDS[API_CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', _API_CACHE_BACKENDS[API_CACHE_BACKEND][1]),
+        'OPTIONS': {'MAX_ENTRIES': 10000} if API_CACHE_BACKEND != 'redis' else {},
+    },
+}
+API_CACHE_ALIAS = 'api'
+# Seconds a cached response is kept; changes invalidate it before that
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 300))
+
+
+# -----------------------------------------------------------
+# AUTHENTICATED USER CACHE (users/authentication.py)
+# -----------------------------------------------------------
+
+# Users kept per process for CachedJWTAuthentication, and how long each is
+# trusted. Changes to a user retire its entry at once, through the API cache.
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+
+
+# -----------------------------------------------------------
+# REFRESH TOKEN BLACKLIST (users/tokens.py)
+# -----------------------------------------------------------
+
+# Blacklisted tokens the per-process Bloom filter is sized for, and its false
+# positive rate (the share of refreshes that still query the blacklist)
+TOKEN_BLACKLIST_CAPACITY = int(os.environ.get('TOKEN_BLACKLIST_CAPACITY', 100000))
+TOKEN_BLACKLIST_ERROR_RATE = float(os.environ.get('TOKEN_BLACKLIST_ERROR_RATE', 0.01))
+# The filter re-reads new blacklist entries at least this often, even if the
+# shared cache did not announce any
+TOKEN_BLACKLIST_SYNC_SECONDS = float(os.environ.get('TOKEN_BLACKLIST_SYNC_SECONDS', 5))
+# Expired tokens are deleted at most this often (seconds, 0 = only by
+# `python manage.py prune_tokens`), this many rows per transaction
+TOKEN_PRUNE_INTERVAL = int(os.environ.get('TOKEN_PRUNE_INTERVAL', 3600))
+TOKEN_PRUNE_BATCH_SIZE = int(os.environ.get('TOKEN_PRUNE_BATCH_SIZE', 1000))
+
+
+# -----------------------------------------------------------
+# DELTA SYNC (GET /api/sync/, see sync/changes.py)
+# -----------------------------------------------------------
+
+# Rows per source (items, lending requests, messages, deletions) per response
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', 200))
+# Changes are only returned once they are this old, so transactions still
+# committing when a client syncs are not skipped
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+# Deletions are remembered this long; older sync tokens get a 410
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+
+# -----------------------------------------------------------
+# REAL-TIME PUSH (WebSockets on the ASGI app, see realtime/)
+# -----------------------------------------------------------
+
+# Pub/sub backend between publishers and open connections. The in-process
+# broker is enough for a single ASGI server process.
+REALTIME_BROKER = os.environ.get('REALTIME_BROKER', 'realtime.broker.InProcessBroker')
+# A connection with more undelivered events than this is closed (the client
+# reconnects and catches up over the REST API).
+REALTIME_MAX_PENDING = int(os.environ.get('REALTIME_MAX_PENDING', 100))
+
+
+# -----------------------------------------------------------
+# LENDING OUTBOX (notifications sent after the status change commits)
+# -----------------------------------------------------------
+
+# 'thread': dispatch in a small thread pool right after commit.
+# 'command': leave it to a `python manage.py run_outbox --loop` daemon.
+OUTBOX_DISPATCH = os.environ.get('OUTBOX_DISPATCH', 'thread')
+OUTBOX_THREADS = int(os.environ.get('OUTBOX_THREADS', 2))
+# Events failing this many times stay pending (with last_error) for inspection
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+
 
 # -----------------------------------------------------------
 # SIMPLE JWT CONFIGURATION (DYNAMIC TOKENS)
@@ -179,6 +397,8 @@ SIMPLE_JWT = {
     # Key settings for rotation and security
     'ROTATE_REFRESH_TOKENS': True,        # Refresh tokens are rotated after use
     'BLACKLIST_AFTER_ROTATION': True,     # Old refresh tokens are blacklisted
+    # Checks the blacklist through a Bloom filter first (users/tokens.py)
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.FilteredTokenRefreshSerializer',
     
     # Other standard JWT settings
     'ALGORITHM': 'HS256',
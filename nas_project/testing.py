@@ -0,0 +1,40 @@
+# nas_project/testing.py
+"""
+Shared helpers for the app test suites.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin that pins the number of SQL queries an endpoint issues.
+
+    assertConstantQueries() checks the count twice, before and after adding
+    more rows, so an N+1 regression fails even when the expected number is
+    updated carelessly. The response cache is cleared before each request,
+    so the count is that of building the response.
+    """
+
+    def get_query_count(self, client, url):
+        caches[settings.API_CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', response))
+        return len(context.captured_queries), context.captured_queries
+
+    def assertQueryCount(self, client, url, expected):
+        count, queries = self.get_query_count(client, url)
+        self.assertEqual(
+            count, expected,
+            f"{url} issued {count} queries, expected {expected}:\n"
+            + "\n".join(query['sql'] for query in queries),
+        )
+
+    def assertConstantQueries(self, client, url, expected, add_rows):
+        """Assert `expected` queries for url, then again after add_rows() has run."""
+        self.assertQueryCount(client, url, expected)
+        add_rows()
+        self.assertQueryCount(client, url, expected)
@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from items.models import Item
+from . import metrics
+from .pagination import positive_int
+
+User = get_user_model()
+
+
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.item = Item.objects.create(
+            owner=self.user, name="Drill", description="Cordless", condition='Good', location='Westlands',
+        )
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        caches[settings.API_CACHE_ALIAS].clear()
+
+    def test_histogram_percentiles_are_within_a_bucket(self):
+        histogram = metrics.Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        for fraction in (0.5, 0.9, 0.99):
+            expected = fraction * 1000
+            self.assertLessEqual(abs(histogram.percentile(fraction) - expected), expected / 8)
+        self.assertEqual(histogram.percentile(1.0), 1000)
+
+    def test_requests_are_recorded_per_route(self):
+        self.client.get('/api/items/')
+        self.client.get(f'/api/items/{self.item.pk}/')
+        self.client.get(f'/api/items/{self.item.pk}/')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{route="item-list",method="GET",status="200"} 1', body)
+        self.assertIn('http_requests_total{route="item-detail",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_queries_count{route="item-detail",method="GET"} 2', body)
+        self.assertIn('http_request_duration_quantile_seconds{route="item-list",method="GET",quantile="0.99"}', body)
+        # The scrape itself isn't recorded
+        self.assertNotIn('route="metrics"', body)
+
+    async def test_async_views_are_recorded_without_a_thread_detour(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            response = await self.async_client.post(
+                '/api/users/', {'username': 'alice', 'password': 'pass12345'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        stats = metrics.registry.routes[('user-register', 'POST')]
+        self.assertEqual(stats.responses[201], 1)
+        # The uniqueness check and the insert, run through sync_to_async
+        self.assertGreaterEqual(stats.queries.total, 2)
+
+    def test_streaming_response_is_recorded_once_sent(self):
+        response = self.client.get('/api/items/export/')
+        # The export reads the items while it streams
+        self.assertNotIn(('item-export', 'GET'), metrics.registry.routes)
+        self.assertIn(b'"Drill"', b''.join(response.streaming_content))
+        stats = metrics.registry.routes[('item-export', 'GET')]
+        self.assertEqual(stats.responses[200], 1)
+        self.assertEqual(stats.queries.total, 1)
+
+    def test_query_budget_overrun_is_logged_and_counted(self):
+        with override_settings(QUERY_BUDGET=1), self.assertLogs('nas_project.metrics', 'WARNING') as logs:
+            self.client.get('/api/items/')
+        self.assertIn('(item-list) ran 2 queries, over its budget of 1', logs.output[0])
+        self.assertEqual(metrics.registry.routes[('item-list', 'GET')].over_budget, 1)
+
+    def test_metrics_are_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='owner', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+        self.items = [self.make_item(f"Item {i}", minutes_ago=10 - i) for i in range(5)]
+
+    def make_item(self, name, minutes_ago):
+        item = Item.objects.create(
+            owner=self.user, name=name, description="A useful thing", condition='Good', location='Westlands',
+        )
+        # created_at is set on insert: give each item its own, in order
+        Item.objects.filter(pk=item.pk).update(created_at=self.now - timedelta(minutes=minutes_ago))
+        return item
+
+    def names(self, response):
+        return [row['name'] for row in response.data['results']]
+
+    def test_page_size_is_capped(self):
+        with override_settings(API_MAX_PAGE_SIZE=3):
+            response = self.client.get('/api/items/', {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(len(self.client.get('/api/items/', {'page_size': 4}).data['results']), 4)
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/items/', {'page_size': 2})
+        self.assertIsNotNone(response.data['next'])
+        self.assertNotIn('count', response.data)
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()])
+
+    def test_cursor_is_stable_under_inserts(self):
+        first = self.client.get('/api/items/', {'page_size': 2})
+        self.assertEqual(self.names(first), ["Item 4", "Item 3"])
+        # New items go to the head of the list, in front of the page already read
+        self.make_item("Newer", minutes_ago=1)
+        self.make_item("Newest", minutes_ago=0)
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.names(second), ["Item 2", "Item 1"])
+        self.assertEqual(self.names(self.client.get(second.data['next'])), ["Item 0"])
+
+    def test_positive_int(self):
+        self.assertEqual(positive_int('7'), 7)
+        self.assertEqual(positive_int('0'), 0)
+        self.assertEqual(positive_int('500', strict=True, cutoff=100), 100)
+        for value, strict in (('0', True), ('-1', False), ('ten', False)):
+            with self.assertRaises(ValueError):
+                positive_int(value, strict=strict)
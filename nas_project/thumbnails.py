@@ -0,0 +1,161 @@
+# nas_project/thumbnails.py
+"""
+Image derivative pipeline shared by the apps that accept photo uploads.
+
+An upload is decoded once (JPEGs straight at reduced scale via draft()),
+rotated upright from its EXIF orientation, and re-encoded into:
+- a cleaned "original" (capped at ORIGINAL_MAX_SIZE px, no metadata), and
+- fixed-size thumbnails (THUMBNAIL_SIZES) in every THUMBNAIL_FORMATS format.
+
+Derivatives are resized from the next larger one rather than from the full
+image, and every file is stored under a name derived from the SHA-256 of its
+bytes (media/thumbs/ab/cdef....webp). A name never changes content, so the
+web server or CDN can serve THUMBNAIL_DIR with a far-future, immutable cache
+header, and identical images are stored once.
+
+The work runs off the request thread in a small worker pool (submit()); see
+users/pictures.py for how a profile picture is wired through it.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_SIZES = (512, 128, 64)
+THUMBNAIL_FORMATS = ('webp', 'jpeg')
+ORIGINAL_MAX_SIZE = 2048
+
+# Encoder settings per format: (Pillow format name, save() options)
+_ENCODERS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+# -------------------------------------------------------------
+# Decoding and encoding
+# -------------------------------------------------------------
+
+def _open_upright(source, max_size):
+    """Decode an image no larger than needed for max_size, rotated upright."""
+    image = Image.open(source)
+    # JPEG only: let the decoder scale down by 1/2, 1/4 or 1/8 while decoding
+    image.draft('RGB', (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _encode(image, fmt):
+    pil_format, options = _ENCODERS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        # No alpha in JPEG: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    # No exif=/icc_profile= arguments: nothing from the upload's metadata is written
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, extension, storage):
+    """Save bytes under their content hash; an existing file is reused as is."""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{THUMBNAIL_DIR}/{digest[:2]}/{digest[2:34]}.{extension}"
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    return name
+
+
+def create_derivatives(source, sizes=THUMBNAIL_SIZES, crop=True, storage=None):
+    """
+    Decode `source` (a path or file object) once and store its derivatives.
+
+    Thumbnails are square (center-cropped) when crop is True, or fit inside
+    the square otherwise. Returns (original name, {size: {format: name}}),
+    with sizes as strings so the mapping round-trips through JSON.
+    """
+    storage = storage or default_storage
+    image = _open_upright(source, ORIGINAL_MAX_SIZE)
+    if max(image.size) > ORIGINAL_MAX_SIZE:
+        image.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE), Image.LANCZOS)
+    original = _store(_encode(image, 'jpeg'), 'jpg', storage)
+
+    thumbnails = {}
+    current = image
+    for size in sorted(sizes, reverse=True):
+        if crop:
+            current = ImageOps.fit(current, (size, size), Image.LANCZOS)
+        else:
+            current = current.copy()
+            current.thumbnail((size, size), Image.LANCZOS)
+        thumbnails[str(size)] = {
+            fmt: _store(_encode(current, fmt), 'jpg' if fmt == 'jpeg' else fmt, storage)
+            for fmt in THUMBNAIL_FORMATS
+        }
+    return original, thumbnails
+
+
+# -------------------------------------------------------------
+# Worker pool
+# -------------------------------------------------------------
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Image processing failed: %s%r", getattr(func, '__name__', func), args)
+    finally:
+        if settings.THUMBNAIL_ASYNC:
+            # Pool threads outlive requests: don't keep a connection per thread open
+            connection.close()
+
+
+def submit(func, *args):
+    """Run func(*args) in the image worker pool (inline when THUMBNAIL_ASYNC is off)."""
+    if not settings.THUMBNAIL_ASYNC:
+        _run(func, args)
+        return
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    _executor.submit(_run, func, args)
+
+
+# -------------------------------------------------------------
+# Serializer field
+# -------------------------------------------------------------
+
+class ThumbnailURLsField(serializers.Field):
+    """
+    Read-only field turning a {size: {format: name}} mapping into URLs,
+    absolute when the request is in the serializer context (like ImageField).
+    Empty while the derivatives are still being generated.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for size, names in (value or {}).items():
+            urls[size] = {}
+            for fmt, name in names.items():
+                url = default_storage.url(name)
+                urls[size][fmt] = request.build_absolute_uri(url) if request is not None else url
+        return urls
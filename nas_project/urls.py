@@ -6,11 +6,10 @@ from rest_framework.routers import DefaultRouter
 
 # --- 1. Users App Imports ---
 # NOTE: Added UserLogoutView import here
-from users.views import UserRegistrationViewSet, UserProfileViewSet, auth_client_view, UserLogoutView
+from users.views import LoginView, RegistrationView, UserProfileViewSet, auth_client_view, UserLogoutView
 
 # --- 2. Authentication Imports (Using Simple JWT) ---
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,  # Handles POST to get access and refresh tokens
     TokenRefreshView,     # Handles POST to get a new access token
 )
 # Note: Removed 'from rest_framework.authtoken.views import obtain_auth_token'
@@ -19,6 +18,9 @@ from rest_framework_simplejwt.views import (
 from items.views import ItemViewSet
 from lending.views import LendingRequestViewSet
 from messaging.views import MessageViewSet
+from nas_project.metrics import metrics_view
+from nas_project.response_cache import CacheStatsView
+from sync.views import SyncView
 
 
 # Initialize the router for API endpoints
@@ -28,10 +30,7 @@ router = DefaultRouter()
 # API ROUTER REGISTRATION (Handles /api/{endpoint}/ and /api/{endpoint}/{pk}/)
 # ==================================================================
 
-# 1. Users App (Registration and Profile Management)
-# Registration: Handles POST /api/users/ (for creating a new user)
-router.register(r'users', UserRegistrationViewSet, basename='user-register')
-
+# 1. Users App (Profile Management; registration is mapped below)
 # Profile: Handles GET, PUT, PATCH /api/profiles/me/
 # Note: We'll use 'profiles' as the base, and map 'me' separately below
 router.register(r'profiles', UserProfileViewSet, basename='user-profile')
@@ -53,6 +52,9 @@ router.register(r'messages', MessageViewSet, basename='message')
 urlpatterns = [
     path('admin/', admin.site.urls),
     
+    # Prometheus scrape endpoint (request latency, query counts; see nas_project/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
+
     # Simple HTML client for testing auth
     path('auth-client/', auth_client_view, name='auth-client'),
 
@@ -60,6 +62,10 @@ urlpatterns = [
     # API ENDPOINTS
     # ------------------------------------------------------------------
 
+    # Registration: Handles POST /api/users/ (for creating a new user)
+    # An async view: the password is hashed off the request worker (users/hashing.py)
+    path('api/users/', RegistrationView.as_view(), name='user-register'),
+
     # 1. API Router (Includes all registered viewsets: items, lending-requests, etc.)
     path('api/', include(router.urls)),
 
@@ -74,8 +80,9 @@ urlpatterns = [
 
 
     # 3. Simple JWT Authentication Endpoints (CRITICAL FOR LOGIN/TOKEN MANAGEMENT)
-    # The login endpoint (TokenObtainPairView)
-    path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    # The login endpoint: TokenObtainPairView's responses, from an async view
+    # that hashes in the bounded pool of users/hashing.py
+    path('api/auth/token/', LoginView.as_view(), name='token_obtain_pair'),
     # The token refresh endpoint (TokenRefreshView)
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
@@ -83,6 +90,12 @@ urlpatterns = [
     # Logout (Token destruction) - Now using the custom UserLogoutView from users/views.py
     path('api/auth/token/logout/', UserLogoutView.as_view(), name='token-logout'), 
 
+    # Delta sync for offline clients: changes since a token
+    path('api/sync/', SyncView.as_view(), name='sync'),
+
+    # Response cache hit/miss counters (staff only)
+    path('api/cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+
     # Fallback for browsable API login/logout links
     path('api/auth/', include('rest_framework.urls')), 
 ]
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RealtimeConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'realtime'
+
+    def ready(self):
+        # Push new messages and lending status changes (see realtime/signals.py)
+        from . import signals  # noqa: F401
@@ -0,0 +1,112 @@
+# realtime/broker.py
+"""
+Pub/sub layer between the HTTP side (which publishes events) and the open
+WebSocket connections (which subscribe to their user's events).
+
+The broker class is picked with the REALTIME_BROKER setting. The default,
+InProcessBroker, fans events out inside the current process, which is all a
+single ASGI server process needs. Deployments running several processes can
+point REALTIME_BROKER at a Broker subclass backed by a local broker (Redis,
+NATS, ...) without touching the publishers or the WebSocket endpoint.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One WebSocket connection's queue of pending events for a user."""
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def deliver(self, payload):
+        """Queue a payload. Safe to call from any thread."""
+        _deliver_threadsafe(self.loop, [self], payload)
+
+
+def _deliver_all(subscriptions, payload):
+    for subscription in subscriptions:
+        subscription.queue.put_nowait(payload)
+
+
+def _deliver_threadsafe(loop, subscriptions, payload):
+    try:
+        # One wake-up of the loop for the whole batch
+        loop.call_soon_threadsafe(_deliver_all, subscriptions, payload)
+    except RuntimeError:
+        # The connections' event loop is gone: nothing left to deliver to
+        pass
+
+
+class Broker:
+    """
+    Interface of a pub/sub backend.
+
+    publish() is called from ordinary (sync) Django code, in any thread;
+    subscribe() and unsubscribe() are called from the event loop serving the
+    WebSocket connection. Payloads are JSON strings.
+    """
+
+    def subscribe(self, user_id):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, user_id, payload):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Delivers events to the subscriptions held by this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, batch in by_loop.items():
+            _deliver_threadsafe(loop, batch, payload)
+
+    def subscription_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker instance (class from settings.REALTIME_BROKER)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
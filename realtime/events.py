@@ -0,0 +1,52 @@
+# realtime/events.py
+"""
+The events pushed to WebSocket clients, and how they are published.
+
+Every event is a JSON object with a 'type':
+- "message.created": {"type", "message": <same fields as GET /api/messages/{id}/>}
+- "lending_request.status_changed": {"type", "lending_request", "item", "old_status", "status"}
+
+Events are published once the surrounding transaction commits, so clients
+never hear about a row they can't fetch yet (or one that was rolled back).
+"""
+import json
+
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .broker import get_broker
+
+
+def publish(user_ids, event):
+    """Send an event to every connection of the given users after commit."""
+    payload = json.dumps(event, cls=JSONEncoder)
+    user_ids = set(user_ids)
+
+    def send():
+        broker = get_broker()
+        for user_id in user_ids:
+            broker.publish(user_id, payload)
+
+    transaction.on_commit(send)
+
+
+def message_created(message):
+    from messaging.serializers import MessageSerializer
+
+    publish(
+        [message.sender_id, message.recipient_id],
+        {'type': 'message.created', 'message': MessageSerializer(message).data},
+    )
+
+
+def lending_status_changed(lending_request, old_status):
+    publish(
+        [lending_request.borrower_id, lending_request.item.owner_id],
+        {
+            'type': 'lending_request.status_changed',
+            'lending_request': lending_request.pk,
+            'item': lending_request.item_id,
+            'old_status': old_status,
+            'status': lending_request.status,
+        },
+    )
@@ -0,0 +1,191 @@
+"""
+Load test the WebSocket push endpoint with many concurrent idle connections.
+
+Usage:
+    python manage.py realtime_loadtest                          # 10,000 connections
+    python manage.py realtime_loadtest --connections 20000 --users 500 --hold 30
+
+Opens the connections in-process against the real ASGI application (JWT
+check, broker subscription and all), with in-memory transports instead of
+sockets, so it measures what the application itself costs per connection
+without running into file descriptor limits. It then:
+- holds them idle for --hold seconds while measuring event loop lag,
+- publishes --events fan-out rounds from a worker thread (like an HTTP
+  request would) and times delivery to every connection,
+- disconnects everything and checks no subscription was leaked.
+
+Connections are spread over --users throwaway 'rt-load-N' users, which are
+deleted afterwards. Run it against a scratch database.
+"""
+import asyncio
+import json
+import statistics
+import resource
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from realtime.broker import InProcessBroker, get_broker
+from realtime.websocket import websocket_application
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'rt-load-'
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class FakeConnection:
+    """In-memory ASGI transport for one WebSocket connection."""
+
+    def __init__(self, token):
+        self.scope = {
+            'type': 'websocket',
+            'path': '/ws/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+        }
+        self.inbox = asyncio.Queue()
+        self.accepted = asyncio.Event()
+        self.closed = None
+        self.received = 0
+        self.on_event = None
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, message):
+        if message['type'] == 'websocket.accept':
+            self.accepted.set()
+        elif message['type'] == 'websocket.close':
+            self.closed = message.get('code')
+            self.accepted.set()
+        elif message['type'] == 'websocket.send':
+            self.received += 1
+            if self.on_event is not None:
+                self.on_event(message['text'])
+
+    def start(self):
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        return asyncio.ensure_future(websocket_application(self.scope, self.receive, self.send))
+
+    def disconnect(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+
+
+class Command(BaseCommand):
+    help = "Hold many concurrent idle WebSocket connections and measure fan-out latency (default 10k)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10_000, help="Number of concurrent connections.")
+        parser.add_argument('--users', type=int, default=100, help="Number of users the connections belong to.")
+        parser.add_argument('--hold', type=float, default=5.0, help="Seconds to hold the connections idle.")
+        parser.add_argument('--events', type=int, default=5, help="Fan-out rounds (one event to every user).")
+
+    def handle(self, *args, **options):
+        if not isinstance(get_broker(), InProcessBroker):
+            raise CommandError("The load test needs REALTIME_BROKER to be the in-process broker.")
+        if options['users'] < 1 or options['connections'] < 1:
+            raise CommandError("--users and --connections must be positive.")
+
+        users = self._create_users(options['users'])
+        try:
+            tokens = [str(AccessToken.for_user(user)) for user in users]
+            asyncio.run(self._run(tokens, [user.pk for user in users], options))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def _create_users(self, count):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{i}', password='!') for i in range(count)],
+            batch_size=1000,
+        )
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk'))
+
+    async def _run(self, tokens, user_ids, options):
+        broker = get_broker()
+        count = options['connections']
+
+        # Peak resident set size, in KiB on Linux
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        connections = [FakeConnection(tokens[i % len(tokens)]) for i in range(count)]
+        tasks = [connection.start() for connection in connections]
+        await asyncio.gather(*(connection.accepted.wait() for connection in connections))
+        connect_seconds = time.perf_counter() - started
+        memory_per_connection = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory_before) / count
+
+        rejected = sum(1 for connection in connections if connection.closed is not None)
+        if rejected:
+            raise CommandError(f"{rejected} connections were rejected.")
+        self.stdout.write(
+            f"Connected {count} clients for {len(user_ids)} users in {connect_seconds:.2f}s "
+            f"({broker.subscription_count()} subscriptions, ~{memory_per_connection:.1f} KiB RSS each)"
+        )
+
+        lags = await self._measure_idle(options['hold'])
+        self.stdout.write(
+            f"Idle for {options['hold']:.0f}s: event loop lag p50 {percentile(lags, 0.5) * 1000:.2f}ms, "
+            f"max {lags[-1] * 1000:.2f}ms"
+        )
+
+        for round_number in range(options['events']):
+            latencies = await self._fan_out(connections, user_ids, round_number)
+            self.stdout.write(
+                f"Fan-out round {round_number + 1}: {len(latencies)} deliveries, "
+                f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+                f"p95 {percentile(latencies, 0.95) * 1000:.1f}ms, "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+                f"mean {statistics.mean(latencies) * 1000:.1f}ms"
+            )
+
+        for connection in connections:
+            connection.disconnect()
+        await asyncio.gather(*tasks)
+        leaked = broker.subscription_count()
+        if leaked:
+            raise CommandError(f"{leaked} subscriptions left after disconnecting.")
+        self.stdout.write(self.style.SUCCESS("All connections closed cleanly."))
+
+    async def _measure_idle(self, seconds, interval=0.05):
+        """How late the event loop wakes up from short sleeps while idle."""
+        lags = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+        return sorted(lags) or [0.0]
+
+    async def _fan_out(self, connections, user_ids, round_number):
+        """Publish one event per user from a worker thread; time delivery to every connection."""
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        latencies = []
+        expected = len(connections)
+        started = time.perf_counter()
+
+        def on_event(text):
+            latencies.append(time.perf_counter() - started)
+            if len(latencies) == expected:
+                done.set()
+
+        for connection in connections:
+            connection.on_event = on_event
+
+        payload = json.dumps({'type': 'loadtest', 'round': round_number})
+        broker = get_broker()
+
+        def publish_all():
+            for user_id in user_ids:
+                broker.publish(user_id, payload)
+
+        await loop.run_in_executor(None, publish_all)
+        await asyncio.wait_for(done.wait(), timeout=60)
+        return sorted(latencies)
@@ -0,0 +1,23 @@
+# realtime/signals.py
+"""
+Signal handlers that push new messages and lending status changes to the
+users' open WebSocket connections.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from lending.models import LendingRequest
+from lending.signals import status_changed
+from messaging.models import Message
+from . import events
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    if created:
+        events.message_created(instance)
+
+
+@receiver(status_changed, sender=LendingRequest)
+def lending_request_status_changed(sender, instance, old_status, **kwargs):
+    events.lending_status_changed(instance, old_status)
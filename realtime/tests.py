@@ -0,0 +1,114 @@
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from items.models import Item
+from lending.models import LendingRequest
+from messaging.models import Message
+from nas_project.asgi import application
+from .broker import InProcessBroker, get_broker
+
+User = get_user_model()
+
+
+class InProcessBrokerTests(TestCase):
+
+    async def test_publish_from_another_thread(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        other = broker.subscribe(2)
+
+        thread = threading.Thread(target=broker.publish, args=(1, '{"type": "test"}'))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(await subscription.queue.get(), '{"type": "test"}')
+        self.assertTrue(other.queue.empty())
+
+        broker.unsubscribe(subscription)
+        broker.unsubscribe(other)
+        self.assertEqual(broker.subscription_count(), 0)
+
+
+class WebSocketPushTests(TestCase):
+
+    def setUp(self):
+        # Like Django's test client does for request signals: closing the
+        # connection would end the test's transaction
+        patcher = mock.patch('realtime.websocket.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+
+    async def connect(self, query_string):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'websocket', 'path': '/ws/', 'query_string': query_string.encode(), 'headers': [],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator, await communicator.receive_output()
+
+    async def receive_event(self, communicator):
+        output = await communicator.receive_output()
+        self.assertEqual(output['type'], 'websocket.send')
+        return json.loads(output['text'])
+
+    async def disconnect(self, communicator):
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_rejects_missing_or_bad_token(self):
+        for query_string in ['', 'token=not-a-jwt']:
+            communicator, output = await self.connect(query_string)
+            self.assertEqual(output, {'type': 'websocket.close', 'code': 4401})
+
+    async def test_pushes_new_messages(self):
+        communicator, output = await self.connect(f'token={AccessToken.for_user(self.bob)}')
+        self.assertEqual(output['type'], 'websocket.accept')
+
+        def send_message():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Message.objects.create(sender=self.alice, recipient=self.bob, content="Is the drill free?")
+
+        message = await sync_to_async(send_message)()
+        event = await self.receive_event(communicator)
+        self.assertEqual(event['type'], 'message.created')
+        self.assertEqual(event['message']['id'], message.pk)
+        self.assertEqual(event['message']['sender_username'], 'alice')
+
+        await communicator.send_input({'type': 'websocket.receive', 'text': '{"type": "ping"}'})
+        self.assertEqual(await self.receive_event(communicator), {'type': 'pong'})
+
+        await self.disconnect(communicator)
+        self.assertEqual(get_broker().subscription_count(), 0)
+
+    async def test_pushes_lending_status_changes(self):
+        communicator, _ = await self.connect(f'token={AccessToken.for_user(self.alice)}')
+
+        def approve():
+            item = Item.objects.create(owner=self.bob, name="Drill", description="Cordless", location="Karen", condition='Good')
+            lending_request = LendingRequest.objects.create(
+                item=item, borrower=self.alice, requested_from='2030-01-01', requested_to='2030-01-03',
+            )
+            lending_request = LendingRequest.objects.get(pk=lending_request.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                lending_request.status = 'APPROVED'
+                lending_request.save()
+            return lending_request
+
+        lending_request = await sync_to_async(approve)()
+        event = await self.receive_event(communicator)
+        self.assertEqual(event, {
+            'type': 'lending_request.status_changed',
+            'lending_request': lending_request.pk,
+            'item': lending_request.item_id,
+            'old_status': 'PENDING',
+            'status': 'APPROVED',
+        })
+        await self.disconnect(communicator)
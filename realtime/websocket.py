@@ -0,0 +1,130 @@
+# realtime/websocket.py
+"""
+ASGI WebSocket endpoint that pushes a user's events (see realtime/events.py).
+
+Clients connect to ws(s)://<host>/ws/?token=<access token>, using the same
+simplejwt access token as the REST API (browsers can't set an Authorization
+header on a WebSocket, but it is accepted as well). The server only sends;
+a client may send {"type": "ping"} to get a {"type": "pong"} back.
+
+Close codes:
+- 4401: missing, invalid or expired token (reconnect with a fresh one)
+- 4008: the client fell too far behind (reconnect and catch up over REST)
+- 4404: unknown path
+
+An idle connection costs two small tasks, a timer and an empty queue, so a
+single process can hold many thousands of them.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from users.authentication import CachedJWTAuthentication
+from .broker import get_broker
+
+WEBSOCKET_PATH = '/ws/'
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_LAGGING = 4008
+CLOSE_NOT_FOUND = 4404
+
+PONG = json.dumps({'type': 'pong'})
+# Queued by the expiry timer in place of an event
+TOKEN_EXPIRED = object()
+
+
+def _raw_token(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if query.get('token'):
+        return query['token'][0].encode()
+    header = dict(scope.get('headers', [])).get(b'authorization')
+    if header:
+        return JWTAuthentication().get_raw_token(header)
+    return None
+
+
+@sync_to_async
+def _authenticate(raw_token):
+    """(user id, token expiry timestamp) for a valid access token, else None."""
+    close_old_connections()
+    try:
+        # Only the id is needed: no users table query (see users/authentication.py)
+        authentication = CachedJWTAuthentication()
+        authentication.claims_only = True
+        validated_token = authentication.get_validated_token(raw_token)
+        user = authentication.get_user(validated_token)
+        return user.pk, validated_token.get('exp')
+    except (InvalidToken, AuthenticationFailed, TokenError):
+        return None
+    finally:
+        close_old_connections()
+
+
+async def _send_events(subscription, send, expires_at):
+    """Forward queued events until the token expires or the client lags behind."""
+    max_pending = settings.REALTIME_MAX_PENDING
+    expiry = None
+    if expires_at is not None:
+        # One timer per connection (not one per event) to drop it when the token expires
+        loop = asyncio.get_running_loop()
+        expiry = loop.call_later(max(expires_at - time.time(), 0), subscription.queue.put_nowait, TOKEN_EXPIRED)
+    try:
+        while True:
+            payload = await subscription.queue.get()
+            if payload is TOKEN_EXPIRED:
+                await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+                return
+            if subscription.queue.qsize() >= max_pending:
+                await send({'type': 'websocket.close', 'code': CLOSE_LAGGING})
+                return
+            await send({'type': 'websocket.send', 'text': payload})
+    finally:
+        if expiry is not None:
+            expiry.cancel()
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for 'websocket' scopes (routed from nas_project/asgi.py)."""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    raw_token = _raw_token(scope)
+    identity = await _authenticate(raw_token) if raw_token else None
+    if identity is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    user_id, expires_at = identity
+
+    await send({'type': 'websocket.accept'})
+    broker = get_broker()
+    subscription = broker.subscribe(user_id)
+    sender = asyncio.ensure_future(_send_events(subscription, send, expires_at))
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] == 'websocket.receive' and _is_ping(event.get('text')):
+                subscription.queue.put_nowait(PONG)
+    finally:
+        sender.cancel()
+        broker.unsubscribe(subscription)
+
+
+def _is_ping(text):
+    try:
+        return json.loads(text or '').get('type') == 'ping'
+    except (ValueError, AttributeError):
+        return False
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class SyncConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'sync'
+
+    def ready(self):
+        # Record deletions for GET /api/sync/ (see sync/signals.py)
+        from . import signals  # noqa: F401
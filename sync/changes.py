@@ -0,0 +1,188 @@
+# sync/changes.py
+"""
+Delta sync: the rows a user's client has to apply since its last sync.
+
+Each source (items, lending requests, messages, deletions) is read with a
+keyset scan on (change timestamp, id) from where the previous sync stopped,
+through the indexes added for it, so a sync costs what changed rather than
+the size of the tables. Lending requests and messages are read through the
+user's participant rows, which carry a copy of updated_at, and deletions
+as two slices (public ones and the user's own) merged in order: a user's
+sync never reads past other users' changes. The position in every source
+is carried in an opaque token, returned as `next` and sent back as ?since=.
+
+Two details keep the stream gap-free:
+- Rows are only read up to SYNC_SETTLE_SECONDS ago. A transaction that
+  stamped a row just before another one committed may commit after it; the
+  delay lets it land before the cursor moves past its timestamp.
+- A source that returns less than a full batch has been read up to that
+  cut-off, so its cursor moves there even if nothing changed.
+
+Messages are synced by updated_at, like the other sources, so edits and
+read receipts are replayed along with new messages.
+"""
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from items.models import Item
+from items.serializers import ItemSerializer
+from lending.models import LendingRequest
+from lending.serializers import LendingRequestSerializer
+from messaging.models import Message
+from messaging.serializers import MessageSerializer
+from nas_project.eager_loading import setup_eager_loading
+from .models import Tombstone
+
+DELETED = 'deleted'
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "This sync token is too old. Sync again without 'since' to fetch everything."
+    default_code = 'sync_token_expired'
+
+
+def _items(user):
+    return Item.objects.all()
+
+
+def _lending_requests(user):
+    # A range of lending_part_user_updated_idx
+    return LendingRequest.objects.filter(participants__user=user).annotate(
+        participant_updated=F('participants__updated_at'),
+    )
+
+
+def _messages(user):
+    # A range of msg_part_user_updated_idx
+    return Message.objects.filter(participants__user=user).annotate(
+        participant_updated=F('participants__updated_at'),
+    )
+
+
+# Response key: (rows visible to the user, change timestamp column, serializer)
+SOURCES = {
+    Tombstone.ITEMS: (_items, 'updated_at', ItemSerializer),
+    Tombstone.LENDING_REQUESTS: (_lending_requests, 'participant_updated', LendingRequestSerializer),
+    Tombstone.MESSAGES: (_messages, 'participant_updated', MessageSerializer),
+}
+
+
+# -------------------------------------------------------------
+# Tokens
+# -------------------------------------------------------------
+
+def encode_token(cursors):
+    """{source: (timestamp, id) or None} -> opaque URL-safe string."""
+    payload = {
+        source: [position[0].isoformat(), position[1]] if position else None
+        for source, position in cursors.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Inverse of encode_token(); raises ValidationError on anything malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        cursors = {}
+        for source in [*SOURCES, DELETED]:
+            position = payload[source]
+            cursors[source] = None if position is None else (datetime.fromisoformat(position[0]), int(position[1]))
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError):
+        raise serializers.ValidationError({'since': "Invalid sync token."})
+    return cursors
+
+
+# -------------------------------------------------------------
+# Reading changes
+# -------------------------------------------------------------
+
+def _after(queryset, field, cursor, until):
+    """Rows after `cursor` (a (timestamp, id) pair, or None for the start) and before `until`."""
+    queryset = queryset.filter(**{f'{field}__lt': until})
+    if cursor is not None:
+        timestamp, pk = cursor
+        queryset = queryset.filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}))
+    return queryset.order_by(field, 'pk')
+
+
+def _read_batch(querysets, field, cursor, until, batch_size):
+    """
+    (rows, new cursor, whether more are waiting) for one source, made of
+    one or more disjoint querysets, each scanned on its own and merged.
+    """
+    scans = [_after(queryset, field, cursor, until)[:batch_size + 1] for queryset in querysets]
+    if len(scans) == 1:
+        # Already in order; serializers may not load `field` at all
+        rows = list(scans[0])
+    else:
+        rows = list(islice(heapq.merge(*scans, key=lambda row: (getattr(row, field), row.pk)), batch_size + 1))
+    if len(rows) > batch_size:
+        rows = rows[:batch_size]
+        last = rows[-1]
+        return rows, (getattr(last, field), last.pk), True
+    # Everything before the cut-off has been read
+    return rows, (until, 0), False
+
+
+def collect_changes(user, token=None, context=None, batch_size=None):
+    """
+    The changes visible to `user` since `token` (everything, for None):
+    {'items': [...], 'lending_requests': [...], 'messages': [...],
+     'deleted': {'items': [ids], ...}, 'next': token, 'has_more': bool}
+    """
+    batch_size = batch_size or settings.SYNC_BATCH_SIZE
+    now = timezone.now()
+    until = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+    if token:
+        cursors = decode_token(token)
+        deleted_cursor = cursors[DELETED]
+        if deleted_cursor is None or deleted_cursor[0] < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+            # Deletions since then may already have been pruned
+            raise SyncTokenExpired()
+    else:
+        # A first sync only fetches rows that exist, so no deletion before it matters
+        cursors = dict.fromkeys(SOURCES)
+        deleted_cursor = (until, 0)
+
+    result = {'deleted': {source: [] for source in SOURCES}}
+    next_cursors = {}
+    has_more = False
+    for source, (visible_to, field, serializer_class) in SOURCES.items():
+        queryset = setup_eager_loading(visible_to(user), serializer_class)
+        rows, next_cursors[source], more = _read_batch([queryset], field, cursors[source], until, batch_size)
+        result[source] = serializer_class(rows, many=True, context=context or {}).data
+        has_more = has_more or more
+
+    tombstones = Tombstone.objects.only('kind', 'object_id', 'deleted_at')
+    # Public and own deletions: two ranges of tomb_user_deleted_idx
+    rows, next_cursors[DELETED], more = _read_batch(
+        [tombstones.filter(user__isnull=True), tombstones.filter(user=user.pk)],
+        'deleted_at', deleted_cursor, until, batch_size,
+    )
+    for tombstone in rows:
+        result['deleted'][tombstone.kind].append(tombstone.object_id)
+    has_more = has_more or more
+
+    result['next'] = encode_token(next_cursors)
+    result['has_more'] = has_more
+    return result
+
+
+def prune_tombstones(max_age=None):
+    """Delete tombstones past SYNC_TOMBSTONE_DAYS. Returns how many."""
+    max_age = max_age or timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - max_age).delete()
+    return deleted
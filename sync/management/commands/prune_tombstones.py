@@ -0,0 +1,27 @@
+"""
+Delete sync tombstones older than SYNC_TOMBSTONE_DAYS (see sync/changes.py).
+
+Usage:
+    python manage.py prune_tombstones              # keep SYNC_TOMBSTONE_DAYS
+    python manage.py prune_tombstones --days 7
+
+Meant for cron (daily). Clients whose last sync is older than the cut-off
+get a 410 from GET /api/sync/ and sync from scratch.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sync.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_TOMBSTONE_DAYS, help="Age in days to keep.")
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(timedelta(days=options['days']))
+        self.stdout.write(f"Deleted {deleted} tombstone(s).")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('items', 'Item'), ('lending_requests', 'Lending request'), ('messages', 'Message')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('user_a', models.BigIntegerField(null=True)),
+                ('user_b', models.BigIntegerField(null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deleted_at', 'id'], name='tomb_deleted_idx')],
+            },
+        ),
+    ]
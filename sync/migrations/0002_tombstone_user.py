@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def split_per_user(apps, schema_editor):
+    """A tombstone for two users becomes one for each."""
+    Tombstone = apps.get_model('sync', 'Tombstone')
+    copies = [
+        Tombstone(kind=tombstone.kind, object_id=tombstone.object_id, user=tombstone.user_b, deleted_at=tombstone.deleted_at)
+        for tombstone in Tombstone.objects.filter(user_a__isnull=False, user_b__isnull=False).exclude(user_b=models.F('user_a'))
+    ]
+    Tombstone.objects.update(user=Coalesce('user_a', 'user_b'))
+    Tombstone.objects.bulk_create(copies, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(split_per_user, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='tombstone',
+            name='user_a',
+        ),
+        migrations.RemoveField(
+            model_name='tombstone',
+            name='user_b',
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='tomb_user_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# sync/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """
+    A deleted item, lending request or message, kept so GET /api/sync/ can
+    tell clients to drop their copy. Written by sync/signals.py; rows older
+    than SYNC_TOMBSTONE_DAYS are removed by `python manage.py prune_tombstones`.
+    """
+    ITEMS = 'items'
+    LENDING_REQUESTS = 'lending_requests'
+    MESSAGES = 'messages'
+    KIND_CHOICES = [
+        (ITEMS, 'Item'),
+        (LENDING_REQUESTS, 'Lending request'),
+        (MESSAGES, 'Message'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Who synced the row: empty for public rows (items). A lending request or
+    # message gets one tombstone per participant (borrower and item owner,
+    # sender and recipient), so a sync only reads its own user's. A plain id,
+    # not a foreign key: deleting a user cascades to rows whose tombstones
+    # are written in that same transaction.
+    user = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Pruning old deletions
+            models.Index(fields=['deleted_at', 'id'], name='tomb_deleted_idx'),
+            # Keyset scans of public and of one user's deletions since a sync token
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tomb_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,65 @@
+# sync/signals.py
+"""
+Signal handlers that write Tombstones for every deleted item, lending
+request and message (including those deleted by cascade), in the deleting
+transaction: one public row per item, one row per participant otherwise.
+
+Deleting an item deletes its lending requests first, by cascade. Their
+tombstones are written in one bulk insert from the item's pre_delete, while
+the item (and so its owner) is still known, instead of one owner lookup and
+one insert per request. The item is noted on `origin`, the object delete()
+was called on, which every signal of that one call receives: the requests'
+post_delete handler skips the items noted there. The note goes with that
+call's objects, so another delete (in this thread or any other) never sees
+it, rolled back or not.
+"""
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from items.models import Item
+from lending.models import LendingRequest
+from messaging.models import Message
+from .models import Tombstone
+
+
+def _tombstones(kind, object_id, *user_ids):
+    """Unsaved tombstones for the object, one per distinct user id that is set."""
+    return [Tombstone(kind=kind, object_id=object_id, user=user_id) for user_id in {*user_ids} - {None}]
+
+
+@receiver(pre_delete, sender=Item)
+def item_deleting(sender, instance, using, origin=None, **kwargs):
+    if origin is None:
+        # Not sent by delete(): lending_request_deleted() writes them one by one
+        return
+    requests = LendingRequest.objects.using(using).filter(item_id=instance.pk).values_list('pk', 'borrower_id')
+    Tombstone.objects.using(using).bulk_create([
+        tombstone
+        for pk, borrower_id in requests
+        for tombstone in _tombstones(Tombstone.LENDING_REQUESTS, pk, borrower_id, instance.owner_id)
+    ])
+    vars(origin).setdefault('_sync_tombstoned_items', set()).add(instance.pk)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    # Items are public: every client may hold a copy
+    Tombstone.objects.create(kind=Tombstone.ITEMS, object_id=instance.pk)
+
+
+@receiver(post_delete, sender=LendingRequest)
+def lending_request_deleted(sender, instance, origin=None, **kwargs):
+    if instance.item_id in getattr(origin, '_sync_tombstoned_items', ()):
+        # Written with the item's, by item_deleting()
+        return
+    owner_id = Item.objects.filter(pk=instance.item_id).values_list('owner_id', flat=True).first()
+    Tombstone.objects.bulk_create(
+        _tombstones(Tombstone.LENDING_REQUESTS, instance.pk, instance.borrower_id, owner_id),
+    )
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, **kwargs):
+    Tombstone.objects.bulk_create(
+        _tombstones(Tombstone.MESSAGES, instance.pk, instance.sender_id, instance.recipient_id),
+    )
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from items.models import Item
+from lending.models import LendingRequest
+from messaging.models import Message
+from .changes import SOURCES, _after, decode_token, encode_token
+from .models import Tombstone
+
+User = get_user_model()
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.borrower = User.objects.create_user(username='borrower', password='pass12345')
+        self.stranger = User.objects.create_user(username='stranger', password='pass12345')
+        self.item = Item.objects.create(owner=self.owner, name="Drill", description="Cordless", location="Karen", condition='Good')
+        self.request = LendingRequest.objects.create(
+            item=self.item, borrower=self.borrower, requested_from='2030-01-01', requested_to='2030-01-03',
+        )
+        self.message = Message.objects.create(sender=self.borrower, recipient=self.owner, content="Is it free?")
+        Message.objects.create(sender=self.stranger, recipient=self.owner, content="Not for the borrower")
+        self.client.force_authenticate(self.borrower)
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_first_sync_then_only_changes(self):
+        with self.assertNumQueries(6):  # items, their photos, requests, messages, public and own deletions
+            first = self.sync()
+        self.assertEqual([row['id'] for row in first['items']], [self.item.pk])
+        self.assertEqual([row['id'] for row in first['lending_requests']], [self.request.pk])
+        self.assertEqual([row['id'] for row in first['messages']], [self.message.pk])
+        self.assertFalse(first['has_more'])
+
+        nothing = self.sync(first['next'])
+        self.assertEqual((nothing['items'], nothing['lending_requests'], nothing['messages']), ([], [], []))
+
+        self.item.name = "Hammer drill"
+        self.item.save()
+        message_id = self.message.pk
+        self.message.delete()
+        Message.objects.filter(sender=self.stranger).delete()
+        changes = self.sync(nothing['next'])
+        self.assertEqual([row['name'] for row in changes['items']], ["Hammer drill"])
+        self.assertEqual(changes['lending_requests'], [])
+        # Only deletions of rows the user could see
+        self.assertEqual(changes['deleted'], {'items': [], 'lending_requests': [], 'messages': [message_id]})
+
+    def test_message_edits_and_reads_are_replayed(self):
+        token = self.sync()['next']
+        url = f'/api/messages/{self.message.pk}/'
+        self.assertEqual(self.client.patch(url, {'content': "Is it free on Sunday?"}).status_code, 200)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(url + 'retrieve_and_mark_read/').status_code, 200)
+
+        self.client.force_authenticate(self.borrower)
+        changes = self.sync(token)
+        self.assertEqual(
+            [(row['id'], row['content'], row['is_read']) for row in changes['messages']],
+            [(self.message.pk, "Is it free on Sunday?", True)],
+        )
+
+    def test_deleting_an_item_reports_its_requests(self):
+        token = self.sync()['next']
+        item_id, request_id = self.item.pk, self.request.pk
+        for month in range(2, 5):
+            LendingRequest.objects.create(
+                item=self.item, borrower=self.stranger,
+                requested_from=f'2030-{month:02}-01', requested_to=f'2030-{month:02}-03',
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.item.delete()
+        # One bulk insert for the requests' tombstones, one for the item's
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "sync_tombstone"')]), 2)
+        deleted = self.sync(token)['deleted']
+        self.assertEqual((deleted['items'], deleted['lending_requests']), ([item_id], [request_id]))
+
+        # The owner is told about all of them
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(len(self.sync(token)['deleted']['lending_requests']), 4)
+
+    def test_user_scans_read_the_users_own_rows(self):
+        until = timezone.now()
+        for source, index in [
+            ('lending_requests', 'lending_part_user_updated_idx'), ('messages', 'msg_part_user_updated_idx'),
+        ]:
+            visible_to, field, _ = SOURCES[source]
+            self.assertIn(index, _after(visible_to(self.borrower), field, None, until).explain())
+        own = Tombstone.objects.filter(user=self.borrower.pk)
+        self.assertIn('tomb_user_deleted_idx', _after(own, 'deleted_at', None, until).explain())
+
+    def test_deleting_a_user_tombstones_each_request_per_participant(self):
+        other_item = Item.objects.create(owner=self.stranger, name="Ladder", description="3m", location="Karen", condition='Good')
+        borrowed = LendingRequest.objects.create(
+            item=other_item, borrower=self.owner, requested_from='2030-02-01', requested_to='2030-02-03',
+        )
+        # The owner's item goes with its requests; the owner's own request on another item too
+        owner_id = self.owner.pk
+        self.owner.delete()
+        tombstones = Tombstone.objects.filter(kind=Tombstone.LENDING_REQUESTS)
+        self.assertEqual(
+            sorted(tombstones.values_list('object_id', 'user')),
+            sorted([
+                (self.request.pk, self.borrower.pk), (self.request.pk, owner_id),
+                (borrowed.pk, owner_id), (borrowed.pk, self.stranger.pk),
+            ]),
+        )
+
+        # Nothing is left over for a later delete of a request on its own
+        later = LendingRequest.objects.create(
+            item=other_item, borrower=self.borrower, requested_from='2030-03-01', requested_to='2030-03-03',
+        )
+        later_id = later.pk
+        later.delete()
+        self.assertTrue(tombstones.filter(object_id=later_id).exists())
+
+    @override_settings(SYNC_BATCH_SIZE=1)
+    def test_large_change_sets_are_paged(self):
+        Item.objects.create(owner=self.owner, name="Ladder", description="3m", location="Karen", condition='Good')
+        first = self.sync()
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['next'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [row['name'] for row in first['items'] + second['items']], ["Drill", "Ladder"],
+        )
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'garbage'}).status_code, 400)
+
+        old = timezone.now() - timedelta(days=60)
+        cursors = {source: (old, 0) for source in ['items', 'lending_requests', 'messages', 'deleted']}
+        token = encode_token(cursors)
+        self.assertEqual(decode_token(token), cursors)
+        self.assertEqual(self.client.get('/api/sync/', {'since': token}).status_code, 410)
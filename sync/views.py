@@ -0,0 +1,29 @@
+# sync/views.py
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .changes import collect_changes
+
+
+class SyncView(APIView):
+    """
+    GET /api/sync/?since=<token>
+
+    Items, lending requests and messages created or changed since `token`,
+    plus the ids of those deleted, for the requesting user. Omit `since` on
+    the first sync to get everything. Keep calling with the returned `next`
+    token while `has_more` is true; a 410 means the token is too old and the
+    client should sync from scratch.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # Only request.user's id is needed: authenticate from the token claims (users/authentication.py)
+    claims_only_user = True
+
+    def get(self, request):
+        changes = collect_changes(
+            request.user,
+            token=request.query_params.get('since'),
+            context={'request': request, 'view': self},
+        )
+        return Response(changes)
@@ -0,0 +1,121 @@
+# users/authentication.py
+"""
+JWT authentication without a users table query on every request.
+
+CachedJWTAuthentication (the default authentication class) validates the
+token like simplejwt's JWTAuthentication, then serves the user from a
+per-process LRU (AUTH_USER_CACHE_SIZE entries, each trusted for
+AUTH_USER_CACHE_TTL seconds) keyed by user id and the user's version token
+from the API cache (nas_project/response_cache.py). Saving or deleting a
+user rotates that token (users/signals.py). With a shared API cache
+(API_CACHE_BACKEND=file or redis) a password change, deactivation or
+profile edit is therefore seen by every process on its next request; with
+the per-process default (locmem), by the process that made it at once and
+by the others within AUTH_USER_CACHE_TTL seconds. A version token that is
+missing (never set, or evicted) is created anew, which is a miss here too:
+every decision rests on a user row read from the database at most
+AUTH_USER_CACHE_TTL seconds ago.
+
+Views that only need the user's id set `claims_only_user = True`. On a
+miss they read just the id and is_active columns (the check this class
+makes), and the user's other fields are loaded from the database only if
+something reads them.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# A module import: response_cache imports DRF's views, which import this module
+from nas_project import response_cache
+
+
+class UserCache:
+    """Thread-safe, size-bounded LRU of User instances with a time to live."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires at, user)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with cached (or claims-only) users; see the module docstring."""
+
+    claims_only = False
+
+    def authenticate(self, request):
+        view = request.parser_context.get('view') if request.parser_context else None
+        self.claims_only = getattr(view, 'claims_only_user', False)
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            raw_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        id_field = self.user_model._meta.get_field(api_settings.USER_ID_FIELD)
+        user_id = id_field.to_python(raw_id)
+
+        version = response_cache.current_versions([response_cache.object_version(self.user_model, user_id)])[0]
+
+        # The password hash is needed to check CHECK_REVOKE_TOKEN tokens
+        claims_only = self.claims_only and not api_settings.CHECK_REVOKE_TOKEN
+        user = user_cache.get((user_id, version)) or (claims_only and user_cache.get((user_id, version, 'claims')))
+        if not user:
+            if claims_only:
+                user = self.get_active_user(id_field, user_id)
+                user_cache.set((user_id, version, 'claims'), user)
+            else:
+                user = super().get_user(validated_token)
+                user_cache.set((user_id, version), user)
+        elif api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            # The cached user passed the other checks when it was loaded, but
+            # this claim is per token
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        # A copy: views may modify request.user, and the cached one is shared
+        return copy.copy(user)
+
+    def get_active_user(self, id_field, user_id):
+        """The user with only its id and is_active loaded, if it may authenticate."""
+        user = self.user_model._default_manager.only(id_field.attname, 'is_active').filter(
+            **{api_settings.USER_ID_FIELD: user_id},
+        ).first()
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,100 @@
+# users/hashing.py
+"""
+Password hashing off the request workers.
+
+A PBKDF2 hash takes hundreds of milliseconds of CPU on purpose. Registration
+and login (users/views.py) are async views that hand it to a small dedicated
+thread pool (hashlib releases the GIL while it hashes, so the threads really
+run in parallel) and await the result, so a burst of sign-ups keeps at most
+PASSWORD_HASHING_WORKERS cores busy and the event loop keeps serving every
+other endpoint meanwhile.
+
+The pool is bounded: once PASSWORD_HASHING_WORKERS hashes are running and
+PASSWORD_HASHING_QUEUE more are waiting, run() raises HashingPoolBusy and
+the views answer 503 with a Retry-After header instead of queueing without
+limit. Registration only hashes in the pool. Login runs all of
+django.contrib.auth.authenticate() there (authenticate_user below), so the
+configured backends and the user_login_failed signal apply as usual; that
+reads the user row, and saves it when the hash is redone, from the pool
+thread, which closes its connection afterwards like a request would.
+
+The hash cost is PASSWORD_HASH_ITERATIONS (PBKDF2PasswordHasher below, first
+in PASSWORD_HASHERS). Hashes made with another iteration count still verify,
+and are rehashed at the new cost on the user's next login.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate, hashers
+from django.db import close_old_connections
+
+
+class HashingPoolBusy(Exception):
+    """Every worker and queue slot is taken; retry after PASSWORD_HASHING_RETRY_AFTER seconds."""
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2-SHA256 hasher with the iteration count from settings."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+class HashingPool:
+    """A bounded thread pool for hashing; created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                self._slots = threading.BoundedSemaphore(
+                    settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE
+                )
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing',
+                )
+
+    def submit(self, func, *args):
+        """Future of func(*args) in the pool, or HashingPoolBusy if it is full."""
+        if self._executor is None:
+            self._start()
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolBusy()
+        future = self._executor.submit(func, *args)
+        # Also released when the caller gave up (client gone) but the hash ran on
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, func, *args):
+        """Await func(*args) in the pool; raises HashingPoolBusy if it is full."""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def shutdown(self):
+        """Stop the workers; the next submit() starts a pool with the current settings."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = self._slots = None
+
+
+pool = HashingPool()
+
+
+def authenticate_user(request, username, password):
+    """
+    authenticate() in the pool: the user, or None. ModelBackend hashes even
+    for an unknown username, and saves a hash made with outdated settings
+    at the new cost.
+    """
+    try:
+        return authenticate(request, username=username, password=password)
+    finally:
+        # Pool threads outlive requests: close the connection as a request's end would
+        close_old_connections()
@@ -0,0 +1,28 @@
+"""
+Delete expired refresh tokens and their blacklist entries (see users/tokens.py).
+
+Usage:
+    python manage.py prune_tokens
+    python manage.py prune_tokens --batch-size 5000
+
+The web process already does this at most every TOKEN_PRUNE_INTERVAL
+seconds; this command is for cron when that is disabled (TOKEN_PRUNE_INTERVAL=0),
+or to catch up on a table that grew before pruning existed. An expired token
+is refused on its expiry date anyway, so its rows are only dead weight.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE,
+                            help="Tokens deleted per transaction.")
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(options['batch_size'])
+        self.stdout.write(f"Deleted {deleted} expired token(s).")
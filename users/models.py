@@ -13,6 +13,9 @@ class User(AbstractUser): # <--- CLASS NAME CHANGED FROM 'User' TO 'CustomUser'
     bio = models.TextField(blank=True, null=True, help_text="A brief bio about the user.")
     location = models.CharField(max_length=100, blank=True, null=True, help_text="User's general location or neighborhood.")
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # {size: {format: storage name}} of the picture's thumbnails (see users/pictures.py);
+    # empty until the uploaded picture has been processed
+    profile_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     # --- New fields added ---
     national_id = models.CharField(
@@ -40,4 +43,11 @@ class User(AbstractUser): # <--- CLASS NAME CHANGED FROM 'User' TO 'CustomUser'
     # as they are inherited from AbstractUser.
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database so signal handlers can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
\ No newline at end of file
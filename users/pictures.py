@@ -0,0 +1,34 @@
+# users/pictures.py
+"""
+Profile picture processing: after an upload commits, the picture is handed
+to the image worker pool (nas_project/thumbnails.py), which stores a cleaned
+original plus 64/128/512 px WebP and JPEG thumbnails and points the user at
+them. The raw upload (with its EXIF data) is deleted afterwards.
+"""
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from nas_project import response_cache, thumbnails
+from .models import User
+
+
+def schedule_profile_picture(user):
+    """Process the user's newly uploaded picture once the upload has committed."""
+    name = user.profile_picture.name
+    if name:
+        transaction.on_commit(lambda: thumbnails.submit(process_profile_picture, user.pk, name))
+
+
+def process_profile_picture(user_id, name):
+    with default_storage.open(name) as source:
+        original, sizes = thumbnails.create_derivatives(source, crop=True)
+
+    # Only if the user hasn't uploaded another picture in the meantime
+    updated = User.objects.filter(pk=user_id, profile_picture=name).update(
+        profile_picture=original, profile_thumbnails=sizes,
+    )
+    if updated:
+        # update() skips post_save: retire the cached profile here
+        response_cache.invalidate(User, user_id)
+    if name != original and (updated or not User.objects.filter(profile_picture=name).exists()):
+        default_storage.delete(name)
@@ -1,16 +1,15 @@
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.db import IntegrityError # Import IntegrityError for robust token creation
+from nas_project.thumbnails import ThumbnailURLsField
+from .pictures import schedule_profile_picture
 
 # Get the custom User model defined in settings.py
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
-    # Field to hold the token after creation (read-only)
-    # Assumes the User model has a related Token object named 'auth_token'
-    auth_token = serializers.CharField(source='auth_token.key', read_only=True)
+    # URLs of the profile picture's thumbnails: {"64": {"webp": ..., "jpeg": ...}, "128": ..., "512": ...}
+    profile_picture_thumbnails = ThumbnailURLsField(source='profile_thumbnails')
     
     class Meta:
         model = User
@@ -23,11 +22,12 @@ class UserSerializer(serializers.ModelSerializer):
             'password', 
             'bio', 
             'location', 
+            'profile_picture',
+            'profile_picture_thumbnails',
             'phone_number',
             'national_id',
             'is_id_verified',
             'is_phone_verified',
-            'auth_token' # Include the token in the response
         )
         # Ensure password is write-only and not displayed
         extra_kwargs = {
@@ -43,28 +43,33 @@ class UserSerializer(serializers.ModelSerializer):
         # Hash the password securely before saving
         # The password field is automatically popped if not using set_password in Model.create()
         password = validated_data.pop('password') 
+        # The registration view hashes it in the hashing pool beforehand and
+        # passes the hash as save(password_hash=...) (see users/hashing.py)
+        password_hash = validated_data.pop('password_hash', None) or make_password(password)
         
-        # Create the user instance
+        # Create the user instance. Clients log in through /api/auth/token/
+        # afterwards (JWT): no DRF Token is created.
         user = User.objects.create(
             # Using create is cleaner than manipulating validated_data and calling super().create
-            password=make_password(password),
+            password=password_hash,
             **validated_data 
         )
-        
-        # Create an authentication token for the new user
-        # This makes the user instantly logged in after registration
-        try:
-            # ✅ FIX: Use Token.objects.create directly.
-            # get_or_create can be unnecessarily complex here if you are sure 
-            # a token doesn't exist yet (which is true right after user creation).
-            # The standard DRF practice is to use create here.
-            Token.objects.create(user=user)
-        except IntegrityError:
-            # Handle the unlikely case where a token somehow already exists (e.g., race condition)
-            pass
-        except AttributeError:
-             # If the Token model still isn't fully loaded, try fetching a pre-existing one 
-             # (Though this shouldn't happen right after user creation)
-             pass 
-             
-        return user
\ No newline at end of file
+
+        schedule_profile_picture(user)
+        return user
+
+    def update(self, instance, validated_data):
+        # A new picture replaces the old thumbnails once it has been processed
+        new_picture = 'profile_picture' in validated_data
+        if new_picture:
+            validated_data['profile_thumbnails'] = {}
+        user = super().update(instance, validated_data)
+        if new_picture:
+            schedule_profile_picture(user)
+        return user
+
+
+class LoginSerializer(serializers.Serializer):
+    """The credentials POSTed to /api/auth/token/ (checked by users.views.LoginView)."""
+    username = serializers.CharField(write_only=True)
+    password = serializers.CharField(write_only=True, trim_whitespace=False, style={'input_type': 'password'})
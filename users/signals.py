@@ -0,0 +1,39 @@
+# users/signals.py
+"""
+Signal handlers that retire cached data about users: API responses showing
+it (nas_project/response_cache.py: profiles; items/signals.py handles owner
+names on items), and the users cached by CachedJWTAuthentication (users/authentication.py), which
+are keyed by the same version.
+
+Also keeps the refresh token blacklist filter current and starts pruning
+expired tokens (users/tokens.py).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from nas_project import response_cache
+from .models import User
+from .tokens import schedule_prune, token_blacklisted
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    response_cache.invalidate(User, instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    response_cache.invalidate(User, instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted_saved(sender, instance, created, **kwargs):
+    if created:
+        token_blacklisted(instance.token.jti)
+
+
+@receiver(post_save, sender=OutstandingToken)
+def token_issued(sender, instance, created, **kwargs):
+    if created:
+        schedule_prune()
@@ -1,3 +1,320 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, BlacklistMixin, RefreshToken
+
+from nas_project.testing import QueryCountAssertionsMixin
+from .authentication import user_cache
+from . import hashing, tokens
+from .tokens import BloomFilter, blacklist_filter, prune_expired_tokens
+
+User = get_user_model()
+
+
+class UserProfileQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+
+    def test_me_detail_query_count(self):
+        # The profile is request.user itself: no query beyond authentication.
+        user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(user)
+        self.assertQueryCount(self.client, '/api/me/', 0)
+
+    def test_me_is_cached_per_user_until_changed(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        alice = User.objects.create_user(username='alice', password='pass12345')
+        bob = User.objects.create_user(username='bob', password='pass12345')
+        self.client.force_authenticate(alice)
+        self.assertEqual(self.client.get('/api/me/').data['username'], 'alice')
+        self.client.force_authenticate(bob)
+        self.assertEqual(self.client.get('/api/me/').data['username'], 'bob')
+
+        self.client.force_authenticate(alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/me/', {'first_name': 'Alice'})
+        self.assertEqual(self.client.get('/api/me/').data['first_name'], 'Alice')
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self, method, url, data=None, status=200):
+        """Number of queries on the users table that serving the request ran."""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, getattr(response, 'data', response))
+        return sum('FROM "users_user"' in query['sql'] for query in context.captured_queries)
+
+    def save(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+    def test_user_row_is_read_once_until_the_user_changes(self):
+        self.assertEqual(self.user_queries('get', '/api/me/'), 1)
+        self.assertEqual(self.user_queries('get', '/api/me/'), 0)
+
+        self.user.set_password('new-pass-123')
+        self.save(self.user)
+        self.assertEqual(self.user_queries('get', '/api/me/'), 1)
+
+        self.user.is_active = False
+        self.save(self.user)
+        # Rejected on the row read back, not on a cache entry that may be gone
+        self.assertEqual(self.user_queries('get', '/api/me/', status=401), 1)
+
+    def test_claims_only_views_read_the_user_row_once(self):
+        self.assertEqual(self.user_queries('get', '/api/messages/'), 1)
+        self.assertEqual(self.user_queries('get', '/api/messages/'), 0)
+        # Fields other than the id and is_active are loaded only when read
+        response = self.client.post('/api/items/', {
+            'owner': self.user.pk, 'name': 'Drill', 'description': 'Cordless', 'condition': 'Good', 'location': 'Karen',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['owner_username'], 'alice')
+
+        self.user.is_active = False
+        self.save(self.user)
+        self.user_queries('get', '/api/messages/', status=401)
+
+    def test_lost_version_token_reloads_the_user(self):
+        self.user_queries('get', '/api/messages/')
+        self.user_queries('get', '/api/me/')
+        # Deactivated where this process's cache doesn't see it, then the
+        # version token is evicted: the user row is read again
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.user_queries('get', '/api/messages/', status=401)
+        self.user_queries('get', '/api/me/', status=401)
+
+
+class RefreshTokenBlacklistTests(APITestCase):
+
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        blacklist_filter.reset()
+        self.addCleanup(blacklist_filter.reset)
+        # Pruning threads are started by test_prune_runs_at_most_once_per_interval only
+        overrides = override_settings(TOKEN_PRUNE_INTERVAL=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+
+    def refresh(self, token, status=200):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/refresh/', {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, status, response.data)
+        return response.data
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for n in range(1000):
+            bloom.add(f'jti-{n}')
+        self.assertTrue(all(f'jti-{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_rotated_tokens_are_refused_and_fresh_ones_skip_the_blacklist_query(self):
+        first = RefreshToken.for_user(self.user)
+        with mock.patch.object(BlacklistMixin, 'check_blacklist', autospec=True,
+                               side_effect=BlacklistMixin.check_blacklist) as check:
+            second = self.refresh(first)['refresh']
+            third = self.refresh(second)['refresh']
+            check.assert_not_called()
+            # The rotated-out token is in the filter, so it is checked, and refused
+            self.refresh(first, status=401)
+            self.assertEqual(check.call_count, 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+        self.refresh(third)
+
+    def test_blacklistings_from_other_processes_are_picked_up(self):
+        token = RefreshToken.for_user(self.user)
+        self.refresh(RefreshToken.for_user(self.user))  # builds the filter
+        # Blacklisted by another process: the row, and a new generation token
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(jti=token['jti']))])
+        caches[settings.API_CACHE_ALIAS].set(tokens.GENERATION_KEY, 'elsewhere')
+        self.refresh(token, status=401)
+
+    def test_logout_blacklists_the_refresh_token(self):
+        token = RefreshToken.for_user(self.user)
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/auth/token/logout/', {'refresh': 'garbage'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        other = User.objects.create_user(username='bob', password='pass12345')
+        response = self.client.post('/api/auth/token/logout/', {'refresh': str(RefreshToken.for_user(other))}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/', {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.client.force_authenticate(None)
+        self.refresh(token, status=401)
+
+    def test_prune_deletes_expired_tokens_in_batches(self):
+        live = RefreshToken.for_user(self.user)
+        for n in range(5):
+            RefreshToken.for_user(self.user).blacklist()
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(prune_expired_tokens(batch_size=2), 5)
+        self.assertEqual(sum(query['sql'].startswith('DELETE FROM "token_blacklist_outstandingtoken"')
+                             for query in context.captured_queries), 3)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    @override_settings(TOKEN_PRUNE_INTERVAL=3600)
+    def test_prune_runs_at_most_once_per_interval(self):
+        with mock.patch.object(tokens, '_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                RefreshToken.for_user(self.user)
+                RefreshToken.for_user(self.user)
+        executor.submit.assert_called_once_with(tokens._prune_in_thread)
+
+
+class PasswordHashingViewsTests(APITransactionTestCase):
+    # Login reads the user from a hashing pool thread, on its own connection,
+    # so the test data must be committed
+
+    def setUp(self):
+        overrides = override_settings(PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASHING_WORKERS=1,
+                                      PASSWORD_HASHING_QUEUE=0, TOKEN_PRUNE_INTERVAL=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # A pool sized by the overrides above, and a fresh one for later tests
+        hashing.pool.shutdown()
+        self.addCleanup(hashing.pool.shutdown)
+
+    def register(self, username='alice', password='pass12345'):
+        return self.client.post('/api/users/', {'username': username, 'password': password}, format='json')
+
+    def login(self, username='alice', password='pass12345'):
+        return self.client.post('/api/auth/token/', {'username': username, 'password': password}, format='json')
+
+    def test_register_and_log_in(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201, response.json())
+        self.assertEqual(response.json()['username'], 'alice')
+        self.assertNotIn('password', response.json())
+        user = User.objects.get(username='alice')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(self.register().status_code, 400)
+
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.json())
+        self.assertEqual(AccessToken(response.json()['access'])['user_id'], str(user.pk))
+        self.assertEqual(self.login(password='wrong').status_code, 401)
+        self.assertEqual(self.login(username='nobody').status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/token/', {'username': 'alice'}, format='json').json(),
+                         {'password': ['This field is required.']})
+
+    def test_login_goes_through_authenticate(self):
+        user = User.objects.create_user(username='alice', password='pass12345')
+        failures = []
+        handler = lambda sender, credentials, **kwargs: failures.append(credentials['username'])
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+
+        self.assertEqual(self.login(password='wrong').status_code, 401)
+        self.assertEqual(failures, ['alice'])
+
+        # ModelBackend refuses inactive users
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertEqual(self.login().status_code, 401)
+
+    def test_login_rehashes_at_the_configured_cost(self):
+        User.objects.create_user(username='alice', password='pass12345')
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(username='alice').password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_busy_pool_answers_503(self):
+        release = threading.Event()
+        hashing.pool.submit(release.wait)  # takes the only slot
+        try:
+            response = self.register()
+        finally:
+            release.set()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.exists())
+
+
+def jpeg_upload(size=(1600, 1200), orientation=None):
+    """A JPEG upload, optionally carrying EXIF orientation and GPS tags."""
+    exif = Image.Exif()
+    exif[0x8825] = {2: (1.0, 17.0, 29.0)}  # GPSInfo: must not survive processing
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('avatar.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ProfilePictureTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, THUMBNAIL_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, picture):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/me/', {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        # force_authenticate() hands the view this same instance: reload it
+        self.user.refresh_from_db()
+        return self.client.get('/api/me/').data
+
+    def test_upload_generates_thumbnails(self):
+        # Orientation 6: stored sideways, displayed rotated 90 degrees
+        data = self.upload(jpeg_upload(size=(1600, 1200), orientation=6))
+
+        thumbnails = data['profile_picture_thumbnails']
+        self.assertEqual(set(thumbnails), {'64', '128', '512'})
+        for size, urls in thumbnails.items():
+            self.assertEqual(set(urls), {'webp', 'jpeg'})
+            name = urls['jpeg'].split('/media/', 1)[1]
+            with Image.open(default_storage.open(name)) as image:
+                self.assertEqual(image.size, (int(size), int(size)))
+                self.assertEqual(len(image.getexif()), 0)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture.name.startswith('thumbs/'))
+        with Image.open(self.user.profile_picture) as original:
+            # Rotated upright and stripped of EXIF (GPS included)
+            self.assertEqual(original.size, (1200, 1600))
+            self.assertEqual(len(original.getexif()), 0)
+        self.assertFalse(default_storage.exists('profile_pics/avatar.jpg'))
+
+    def test_same_picture_is_stored_once(self):
+        first = self.upload(jpeg_upload())['profile_picture_thumbnails']
+        second = self.upload(jpeg_upload())['profile_picture_thumbnails']
+        self.assertTrue(first)
+        self.assertEqual(first, second)
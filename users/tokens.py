@@ -0,0 +1,206 @@
+# users/tokens.py
+"""
+Refresh token blacklist: a fast "is this jti blacklisted?" check, and
+pruning of expired tokens.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION, every refresh
+blacklists the token it was given, and simplejwt checks the blacklist table
+on every refresh. Here, each process keeps a Bloom filter of blacklisted
+jtis (BlacklistFilter) in front of that query: a jti the filter has never
+seen is certainly not blacklisted, so most refreshes skip the database, and
+only possible hits (real ones, and about TOKEN_BLACKLIST_ERROR_RATE of the
+rest) are confirmed with simplejwt's query.
+
+The filter learns about new blacklist entries:
+- at once from the BlacklistedToken post_save handler, in the process that
+  blacklisted the token, and
+- in the other processes, from the database, as soon as the generation
+  token in the shared API cache changes (every blacklisting rotates it), or
+  at the latest after TOKEN_BLACKLIST_SYNC_SECONDS. With a per-process cache
+  backend (locmem), that delay bounds how long another process can still
+  accept a just-blacklisted token.
+
+Expired tokens are deleted in batches by prune_expired_tokens(): from the
+web process, at most every TOKEN_PRUNE_INTERVAL seconds (started from the
+OutstandingToken post_save handler), or by `python manage.py prune_tokens`.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from nas_project import response_cache
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'token_blacklist:generation'
+PRUNE_LOCK_KEY = 'token_blacklist:prune'
+# Blacklistings are re-read with this overlap, so one committed late by a
+# slow transaction is not skipped
+SYNC_OVERLAP = timedelta(seconds=60)
+
+_executor = None
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives, in about
+    10 bits per entry at a 1% error rate. Not thread-safe: see BlacklistFilter.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """The per-process Bloom filter of blacklisted jtis, kept in sync with the table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next check rebuilds the filter from the table."""
+        self.bloom = None
+        self.generation = None
+        self.synced_at = 0.0
+        self.since = None
+
+    def _load(self, since=None):
+        """Blacklisted jtis of unexpired tokens (blacklisted since `since`, if given)."""
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        if since is not None:
+            rows = rows.filter(blacklisted_at__gte=since - SYNC_OVERLAP)
+        return rows.values_list('token__jti', flat=True).iterator(chunk_size=2000)
+
+    def _sync(self):
+        generation = response_cache.get_cache().get(GENERATION_KEY)
+        if (self.bloom is not None and generation == self.generation
+                and time.monotonic() - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_SECONDS):
+            return
+        with self._lock:
+            started = timezone.now()
+            if self.bloom is None or self.bloom.count > settings.TOKEN_BLACKLIST_CAPACITY:
+                # First use, or full (of entries added since, many long expired): start over
+                bloom = BloomFilter(settings.TOKEN_BLACKLIST_CAPACITY, settings.TOKEN_BLACKLIST_ERROR_RATE)
+                for jti in self._load():
+                    bloom.add(jti)
+                self.bloom = bloom
+            else:
+                for jti in self._load(self.since):
+                    self.bloom.add(jti)
+            self.since = started
+            self.generation = generation
+            self.synced_at = time.monotonic()
+
+    def might_be_blacklisted(self, jti):
+        self._sync()
+        return jti in self.bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def token_blacklisted(jti):
+    """BlacklistedToken post_save: this process knows now, the others once it commits."""
+    blacklist_filter.add(jti)
+    transaction.on_commit(lambda: response_cache.get_cache().set(GENERATION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken whose blacklist check asks the Bloom filter first."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_be_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """POST /api/auth/token/refresh/ with FilteredRefreshToken (SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER'])."""
+    token_class = FilteredRefreshToken
+
+
+# -------------------------------------------------------------
+# Pruning
+# -------------------------------------------------------------
+
+def prune_expired_tokens(batch_size=None):
+    """
+    Delete expired outstanding tokens and their blacklist entries, batch_size
+    at a time, each batch in its own short transaction. Returns how many.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = timezone.now()
+    deleted = 0
+    while True:
+        # Expired tokens are the oldest ones: lowest ids first
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lt=now).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def _prune_in_thread():
+    try:
+        count = prune_expired_tokens()
+        if count:
+            logger.info("Pruned %d expired tokens", count)
+    except Exception:
+        logger.exception("Token pruning failed")
+    finally:
+        # Pool threads outlive requests: don't keep a connection per thread open
+        connection.close()
+
+
+def schedule_prune():
+    """
+    Prune in the background if no process has in the last TOKEN_PRUNE_INTERVAL
+    seconds. Called whenever a token is issued, so it needs no scheduler.
+    """
+    interval = settings.TOKEN_PRUNE_INTERVAL
+    # add() is atomic: one process per interval wins (per process with locmem)
+    if not interval or not response_cache.get_cache().add(PRUNE_LOCK_KEY, True, timeout=interval):
+        return
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='token-prune')
+    transaction.on_commit(lambda: _executor.submit(_prune_in_thread))
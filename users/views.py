@@ -1,14 +1,28 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render 
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, permissions, mixins, status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-# Import the necessary components for JWT blacklisting (if implemented)
-# We will use this in the UserLogoutView
-# from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from .serializers import UserSerializer # Import the comprehensive UserSerializer
+from nas_project.response_cache import CachedRetrieveMixin, object_version
+from .hashing import HashingPoolBusy, authenticate_user, pool
+from .serializers import LoginSerializer, UserSerializer # Import the comprehensive UserSerializer
+from .tokens import FilteredRefreshToken
 
 User = get_user_model()
 
@@ -22,25 +36,112 @@ def auth_client_view(request):
 # --- End of New View ---
 
 # -------------------------------------------------------------------------
-# ViewSet for User Registration (POST /api/users/)
+# Registration and login (POST /api/users/, POST /api/auth/token/)
+# Async views: the password hashing runs in the bounded pool of
+# users/hashing.py, so it never blocks a request worker.
 # -------------------------------------------------------------------------
 
-class UserRegistrationViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+class PasswordHashingView(View):
     """
-    Endpoint for user registration. 
+    Base for the public, password hashing endpoints. Plain Django async views
+    (DRF's are sync only) that parse and answer JSON like the DRF views do.
+    """
+    http_method_names = ['post', 'options']
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Like DRF's views: no session login here, so nothing for CSRF to protect
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    @staticmethod
+    def parse(request):
+        """The request body (JSON, form or multipart), parsed by DRF's parsers."""
+        return Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES]).data
+
+    @staticmethod
+    def error(exc):
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+
+    @staticmethod
+    def busy():
+        # Every hashing worker and queue slot is taken: shed the request
+        return JsonResponse(
+            {'detail': "The server is busy; please try again shortly."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(settings.PASSWORD_HASHING_RETRY_AFTER)},
+        )
+
+
+class RegistrationView(PasswordHashingView):
+    """
+    Endpoint for user registration (public).
     Handles POST requests to create a new user account using the UserSerializer.
-    CRITICAL: permissions.AllowAny allows unauthenticated users to register.
     """
-    serializer_class = UserSerializer
-    # This is a public endpoint, so we allow any user to access it.
-    permission_classes = [permissions.AllowAny]
+
+    def validate(self, request):
+        serializer = UserSerializer(data=self.parse(request), context={'request': request})
+        serializer.is_valid()
+        return serializer
+
+    async def post(self, request):
+        try:
+            # Parsing and validation (the username uniqueness query) are sync
+            serializer = await sync_to_async(self.validate)(request)
+        except APIException as exc:
+            return self.error(exc)
+        if serializer.errors:
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            password_hash = await pool.run(make_password, serializer.validated_data['password'])
+        except HashingPoolBusy:
+            return self.busy()
+        await sync_to_async(serializer.save)(password_hash=password_hash)
+        data = await sync_to_async(lambda: serializer.data)()
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+
+class LoginView(PasswordHashingView):
+    """
+    Endpoint for login: POST username and password, get an access and a
+    refresh token, like simplejwt's TokenObtainPairView (same responses).
+    """
+
+    def issue_tokens(self, user):
+        refresh = RefreshToken.for_user(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+    async def post(self, request):
+        try:
+            serializer = LoginSerializer(data=await sync_to_async(self.parse)(request))
+        except APIException as exc:
+            return self.error(exc)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        username, password = serializer.validated_data['username'], serializer.validated_data['password']
+
+        try:
+            user = await pool.run(authenticate_user, request, username, password)
+        except HashingPoolBusy:
+            return self.busy()
+
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            return JsonResponse(
+                {'detail': "No active account found with the given credentials"},
+                status=status.HTTP_401_UNAUTHORIZED,
+                headers={'WWW-Authenticate': 'Bearer realm="api"'},
+            )
+        return JsonResponse(await sync_to_async(self.issue_tokens)(user))
 
 
 # -------------------------------------------------------------------------
 # ViewSet for User Profile Management (GET/PUT/PATCH /api/users/me/ or similar)
 # -------------------------------------------------------------------------
 
-class UserProfileViewSet(mixins.RetrieveModelMixin, 
+class UserProfileViewSet(CachedRetrieveMixin,
+                         mixins.RetrieveModelMixin, 
                          mixins.UpdateModelMixin, 
                          viewsets.GenericViewSet):
     """
@@ -61,6 +162,12 @@ class UserProfileViewSet(mixins.RetrieveModelMixin,
         # Ensure a user can only retrieve/update their own profile
         return self.request.user
 
+    # The cached profile is the requester's own, retired whenever they change
+    cache_per_user = True
+
+    def get_cache_dependencies(self):
+        return [object_version(User, self.request.user.pk)]
+
 # -------------------------------------------------------------------------
 # View for User Logout (POST /api/auth/token/logout/)
 # This handles the server-side part of logging out by blacklisting tokens.
@@ -76,23 +183,20 @@ class UserLogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        # NOTE: This implementation requires 'rest_framework_simplejwt.token_blacklist'
-        # to be added to INSTALLED_APPS in settings.py and migration run.
-        
-        # This part is currently commented out until you configure token blacklisting.
-        """
         try:
-            # Get the refresh token from the request data
-            refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
-            # Blacklist the token, effectively logging the user out instantly
-            token.blacklist()
-            return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
-        except Exception:
+            # Parsing also checks the signature, expiry and the blacklist
+            # (through the same filter as POST /api/auth/token/refresh/)
+            token = FilteredRefreshToken(request.data["refresh"])
+        except (KeyError, TypeError, TokenError):
             # Catch errors like missing token or invalid token
             return Response({"detail": "Invalid or missing refresh token."}, status=status.HTTP_400_BAD_REQUEST)
-        """
-        
-        # Simple success response if blacklisting is not configured, instructing client to discard tokens
-        return Response({"detail": "Logout signal received. Client must discard tokens."}, 
-                        status=status.HTTP_200_OK)
+
+        # Users can only log themselves out
+        if str(token.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+            return Response({"detail": "This refresh token belongs to another user."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        # Blacklist the token, effectively logging the user out instantly; the
+        # access token stays valid until it expires (ACCESS_TOKEN_LIFETIME)
+        token.blacklist()
+        return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)